@@ -1,24 +1,68 @@
+import asyncio
+import hashlib
 import os
 
+from concurrent.futures import Future
+
+from functools import cached_property
+from typing import Optional
+
 import pulumi
 import pulumi_aws as aws
-import pulumi_docker as docker
 
-from checksumdir import dirhash
-from pulumi_aws.lambda_ import Function
+from pulumi_aws.lambda_ import Alias, Function
 from pulumi_aws.cognito import UserPoolClient
 from pulumi import ResourceOptions, StackReference
 
 from utils.abstracts import CreateResourceBlock
 from utils.config import Config
+from infrastructure.core.base_image import PipelineBaseImage
+from infrastructure.core.image_builder import (
+    ImageBuild,
+    RegistryCredentials,
+    get_image_build_scheduler,
+    platform_tag,
+    registry_cache,
+)
+from infrastructure.core.image_registry import ImageRegistry, authorization_tokens
+from infrastructure.core.models.definition import Function as FunctionDefinition
+from infrastructure.core.models.definition import (
+    DEFAULT_COMPUTE_PROFILE,
+    ComputeProfile,
+    PackageTypes,
+    ProvisionedConcurrency,
+)
+from infrastructure.core.zip_package import (
+    ZipPackage,
+    get_zip_package_builder,
+    hash_package_inputs,
+)
 from infrastructure.universal.ecr import CreateEcrResource
 from infrastructure.providers.rapid_client import RapidClient
+from utils.constants import (
+    BUILD_CACHE_REPOSITORY_NAME,
+    DEFAULT_LAMBDA_RUNTIME,
+    DOCKER_IGNORE_FILE,
+    IMAGE_PLATFORMS,
+    LAMBDA_ALIAS_NAME,
+    LAMBDA_HANDLER,
+)
+from utils.filesystem import create_build_context
+from utils.hashing import get_hash_manifest, load_ignore_patterns
 
 
 class CreatePipelineLambdaFunction(CreateResourceBlock):
     class Output(CreateResourceBlock.Output):
         lambda_function: Function
         name: str
+        alias: Optional[Alias] = None
+
+        @property
+        def invocation_arn(self) -> pulumi.Output[str]:
+            # The alias when one is published, otherwise $LATEST
+            if self.alias is not None:
+                return self.alias.arn
+            return self.lambda_function.arn
 
     def __init__(
         self,
@@ -30,6 +74,10 @@ class CreatePipelineLambdaFunction(CreateResourceBlock):
         function_name: str,
         code_path: str,
         rapid_client: UserPoolClient | RapidClient | None,
+        image_registry: ImageRegistry | None = None,
+        base_image: PipelineBaseImage | None = None,
+        function: FunctionDefinition | None = None,
+        compute_profile: ComputeProfile | None = None,
     ) -> None:
         super().__init__(config, aws_provider, environment)
         self.project = self.config.project
@@ -38,58 +86,394 @@ class CreatePipelineLambdaFunction(CreateResourceBlock):
         self.function_name = function_name
         self.code_path = code_path
         self.rapid_client = rapid_client
+        self.image_registry = image_registry or ImageRegistry()
+        self.base_image = base_image
+        self.function = function
+        self.compute_profile = compute_profile or DEFAULT_COMPUTE_PROFILE
 
     def authenticate_to_ecr_repo(self) -> aws.ecr.GetAuthorizationTokenResult:
         ecr_repo_id_output = self.universal_stack_reference.require_output(
             CreateEcrResource.create_repository_id_export_key(self.function_name)
         )
         return ecr_repo_id_output.apply(
-            lambda id: aws.ecr.get_authorization_token(registry_id=id)
+            lambda id: authorization_tokens.get(
+                id, self.config.region, self.aws_provider
+            )
         )
 
     def apply(self) -> Output:
-        registry_info = self.authenticate_to_ecr_repo()
-        security_group = self.create_lambda_security_group()
+        if self.package_type == PackageTypes.ZIP:
+            security_group = self.create_lambda_security_group()
+            package, layer_package = self.build_zip_package()
+            layers = (
+                [self.create_dependency_layer(layer_package).arn]
+                if layer_package is not None
+                else None
+            )
+            _lambda = self.create_lambda(security_group, package=package, layers=layers)
+        else:
+            registry_info = self.authenticate_to_ecr_repo()
+            security_group = self.create_lambda_security_group()
 
-        image = self.universal_stack_reference.require_output(
-            CreateEcrResource.create_repository_url_export_key(self.function_name)
-        ).apply(lambda url: self.apply_docker_image_build_and_push(registry_info, url))
+            image = self.apply_docker_image_build_and_push(
+                registry_info, self.repository_url()
+            )
 
-        _lambda = self.create_lambda(security_group, image)
+            _lambda = self.create_lambda(security_group, image)
+
+        alias = None
+        if self.provisioned_concurrency is not None:
+            alias = self.create_alias(_lambda)
+            self.create_provisioned_concurrency(alias, self.provisioned_concurrency)
         lambda_folder_name = self.code_path.split("/")[-1]
-        return self.Output(lambda_function=_lambda, name=lambda_folder_name)
+        return self.Output(
+            lambda_function=_lambda, name=lambda_folder_name, alias=alias
+        )
 
-    def apply_docker_image_build_and_push(
-        self, registry_info: aws.ecr.GetAuthorizationTokenResult, url: str
-    ) -> docker.Image:
-        code_hash = dirhash(
-            os.path.join(self.config.universal.source_code_path, self.code_path)
-        )
-        image = f"{url}:{code_hash}"
-
-        return docker.Image(
-            resource_name=f"{self.function_name}-image",
-            build=docker.DockerBuildArgs(
-                dockerfile=f"{self.config.universal.source_code_path}/Dockerfile",
-                platform="linux/amd64",
-                args={
-                    "CODE_PATH": f"./src/{self.code_path}",
-                    "BUILDKIT_INLINE_CACHE": "1",
-                },
-                builder_version="BuilderBuildKit",
-                context=self.config.universal.config_repo_path,
-                cache_from=docker.CacheFromArgs(images=[image]),
-            ),
-            image_name=image,
-            skip_push=False,
-            registry=docker.RegistryArgs(
-                server=url,
-                password=registry_info.password,
-                username=registry_info.user_name,
+    def repository_url(self) -> pulumi.Output[str]:
+        return self.universal_stack_reference.require_output(
+            CreateEcrResource.create_repository_url_export_key(self.function_name)
+        )
+
+    @property
+    def package_type(self) -> PackageTypes:
+        if self.function is None:
+            return PackageTypes.IMAGE
+        return self.function.package_type
+
+    @property
+    def provisioned_concurrency(self) -> ProvisionedConcurrency | None:
+        if self.function is None:
+            return None
+        return self.function.provisioned_concurrency
+
+    @property
+    def runtime(self) -> str:
+        if self.function is None:
+            return DEFAULT_LAMBDA_RUNTIME
+        return self.function.runtime
+
+    @property
+    def function_path(self) -> str:
+        return os.path.join(self.config.universal.source_code_path, self.code_path)
+
+    @property
+    def requirement_files(self) -> list[str]:
+        # Global and pipeline level requirements
+        return [
+            path
+            for path in [
+                os.path.join(
+                    self.config.universal.config_repo_path, "requirements.txt"
+                ),
+                os.path.join(os.path.dirname(self.function_path), "requirements.txt"),
+            ]
+            if os.path.isfile(path)
+        ]
+
+    def build_cache_url(self) -> pulumi.Output[str] | None:
+        if not self.config.universal.registry_build_cache:
+            return None
+        return self.universal_stack_reference.require_output(
+            CreateEcrResource.create_repository_url_export_key(
+                BUILD_CACHE_REPOSITORY_NAME
+            )
+        )
+
+    @property
+    def platform(self) -> str:
+        # A multi-arch image runs on either architecture, so it is built once and
+        # reused when a function moves between them
+        if self.config.universal.multi_arch_images:
+            return ",".join(IMAGE_PLATFORMS.values())
+        return IMAGE_PLATFORMS[self.compute_profile.architecture]
+
+    @property
+    def cache_scope(self) -> str:
+        if self.function is not None and self.function.cache_scope is not None:
+            scope = self.function.cache_scope
+        else:
+            scope = self.function_name
+        return f"{scope}-{platform_tag(self.platform)}"
+
+    @cached_property
+    def image_source(self) -> tuple[list[str], str]:
+        # The build context files and the content hash used to tag the image
+        files = self.collect_build_context_files()
+        inputs = [self.compute_code_hash(files), self.platform]
+        if self.base_image is not None:
+            # A new base image means the function has to be rebuilt on top of it
+            inputs.append(self.base_image.code_hash(self.platform))
+        return files, hashlib.sha256("\0".join(inputs).encode()).hexdigest()
+
+    def collect_build_context_files(self) -> list[str]:
+        # Everything that ends up in the image: the function code, the Dockerfile,
+        # the global and pipeline level requirements and any declared shared files
+        return self.collect_function_files(
+            [
+                os.path.join(self.config.universal.source_code_path, "Dockerfile"),
+                os.path.join(
+                    self.config.universal.config_repo_path, "requirements.txt"
+                ),
+                os.path.join(os.path.dirname(self.function_path), "requirements.txt"),
+            ]
+        )
+
+    def collect_function_files(self, files: list[str] | None = None) -> list[str]:
+        # The function code and any declared shared files, plus the given files
+        config_repo_path = self.config.universal.config_repo_path
+        shared_paths = [
+            os.path.join(config_repo_path, path)
+            for path in self.config.universal.shared_build_files
+        ]
+        return get_hash_manifest(
+            self.config.universal.hash_manifest_path
+        ).collect_files(
+            root=config_repo_path,
+            directories=[
+                self.function_path,
+                *[path for path in shared_paths if os.path.isdir(path)],
+            ],
+            files=[
+                *(files or []),
+                *[path for path in shared_paths if not os.path.isdir(path)],
+            ],
+            ignore_patterns=load_ignore_patterns(
+                os.path.join(config_repo_path, DOCKER_IGNORE_FILE)
             ),
-            opts=ResourceOptions(self.aws_provider),
         )
 
+    def compute_code_hash(self, files: list[str] | None = None) -> str:
+        return get_hash_manifest(self.config.universal.hash_manifest_path).digest_files(
+            self.config.universal.config_repo_path,
+            files if files is not None else self.collect_build_context_files(),
+        )
+
+    def compute_context_digest(self, files: list[str]) -> str:
+        # Content digest of the build context used to share builds between
+        # functions. Function files are named relative to the function folder, which
+        # the Dockerfile copies through CODE_PATH, so identical functions in
+        # different folders have the same digest.
+        config_repo_path = self.config.universal.config_repo_path
+        entries = [
+            (
+                path,
+                os.path.join(
+                    "<function>", os.path.relpath(path, self.function_path)
+                ).replace(os.sep, "/")
+                if path.startswith(self.function_path + os.sep)
+                else os.path.relpath(path, config_repo_path).replace(os.sep, "/"),
+            )
+            for path in files
+        ]
+        return get_hash_manifest(
+            self.config.universal.hash_manifest_path
+        ).digest_entries(entries)
+
+    def build_zip_package(self) -> tuple[ZipPackage, ZipPackage | None]:
+        # Returns the function package and, when dependencies are split into a
+        # layer, the layer package. Both are named after a hash of their inputs.
+        config_repo_path = self.config.universal.config_repo_path
+        manifest = get_hash_manifest(self.config.universal.hash_manifest_path)
+        builder = get_zip_package_builder(self.config.universal.artifact_path)
+
+        requirement_files = self.requirement_files
+        architecture = self.compute_profile.architecture
+        dependency_hash = hash_package_inputs(
+            self.runtime,
+            architecture,
+            manifest.digest_files(config_repo_path, requirement_files),
+        )
+        layer_package = None
+        if self.function.dependency_layer and requirement_files:
+            layer_package = builder.build(
+                f"{self.function_name}-dependencies",
+                dependency_hash,
+                [],
+                requirement_files,
+                self.runtime,
+                architecture,
+                prefix="python/",
+            )
+            requirement_files = []
+
+        files = self.collect_function_files()
+        code_hash = hash_package_inputs(
+            self.runtime,
+            architecture,
+            manifest.digest_files(config_repo_path, files),
+            *([dependency_hash] if requirement_files else []),
+        )
+        # Function code sits at the root of the archive like in the image, shared
+        # files keep their path relative to the config repo
+        entries = [
+            (
+                path,
+                os.path.relpath(
+                    path,
+                    self.function_path
+                    if path.startswith(self.function_path + os.sep)
+                    else config_repo_path,
+                ).replace(os.sep, "/"),
+            )
+            for path in files
+        ]
+        package = builder.build(
+            self.function_name,
+            code_hash,
+            entries,
+            requirement_files,
+            self.runtime,
+            architecture,
+        )
+        return package, layer_package
+
+    def create_dependency_layer(self, package: ZipPackage) -> aws.lambda_.LayerVersion:
+        name = f"{self.project}-{self.environment}-{self.function_name}-dependencies"
+        return aws.lambda_.LayerVersion(
+            resource_name=name,
+            layer_name=name,
+            code=pulumi.FileArchive(package.path),
+            source_code_hash=package.source_code_hash,
+            compatible_runtimes=[self.runtime],
+            compatible_architectures=[self.compute_profile.architecture],
+            opts=ResourceOptions(provider=self.aws_provider),
+        )
+
+    def create_function_build_context(self, files: list[str]) -> str:
+        return create_build_context(
+            self.config.universal.config_repo_path,
+            files,
+            os.path.join(self.config.universal.build_context_path, self.function_name),
+        )
+
+    def apply_docker_image_build_and_push(
+        self,
+        registry_info: pulumi.Output[aws.ecr.GetAuthorizationTokenResult],
+        url: pulumi.Input[str],
+    ) -> pulumi.Output[str]:
+        files, code_hash = self.image_source
+        # Wait on any batched lookup of existing images so the check below is
+        # answered from the registry cache
+        base_image_url = (
+            self.base_image.repository_url() if self.base_image is not None else None
+        )
+        image_uri = pulumi.Output.all(
+            url,
+            registry_info,
+            base_image_url,
+            self.build_cache_url(),
+            self.image_registry.prefetched,
+        ).apply(
+            lambda args: self.resolve_image(
+                args[0], args[1], code_hash, files, args[2], args[3]
+            )
+        )
+        # Only the registry credentials are secret, not the resulting image uri
+        return pulumi.Output.unsecret(image_uri)
+
+    async def resolve_image(self, *args) -> str:
+        # Registry lookups, hashing and writing the build context block, so they
+        # run off Pulumi's event loop like the builds themselves
+        image = await asyncio.to_thread(self.schedule_image_build, *args)
+        if isinstance(image, Future):
+            return await asyncio.wrap_future(image)
+        return image
+
+    def schedule_image_build(
+        self,
+        url: str,
+        registry_info: aws.ecr.GetAuthorizationTokenResult,
+        code_hash: str,
+        files: list[str],
+        base_image_url: str | None = None,
+        build_cache_url: str | None = None,
+    ) -> Future | str:
+        image_name = f"{url}:{code_hash}"
+        # An image built from identical code is never rebuilt. When promoting it,
+        # e.g. from another environment, it is pinned by its digest.
+        digest = self.image_registry.resolve_image_digest(url, code_hash)
+        if digest is not None:
+            if self.config.universal.promote_images:
+                pulumi.log.info(f"Promoting existing image {image_name} ({digest})")
+                return self.deployable_image(f"{url}@{digest}", url, registry_info)
+            pulumi.log.info(f"Skipping build of existing image {image_name}")
+            return self.deployable_image(image_name, url, registry_info)
+
+        # Nothing is built or pushed during a preview
+        if pulumi.runtime.is_dry_run():
+            return image_name
+
+        build_args = {
+            "CODE_PATH": f"./src/{self.code_path}",
+            "BUILDKIT_INLINE_CACHE": "1",
+        }
+        base_image_build = None
+        if self.base_image is not None:
+            build_args["BASE_IMAGE"] = self.base_image.image_name(
+                base_image_url, self.platform
+            )
+            base_image_build = self.base_image.submit(
+                base_image_url, registry_info, self.platform, build_cache_url
+            )
+
+        # The inline cache of the last pushed image only covers the final stage.
+        # A registry cache keeps every layer and survives ephemeral CI runners.
+        cache_from, cache_to = [image_name], []
+        if build_cache_url is not None:
+            cache_import, cache_export = registry_cache(
+                build_cache_url, self.cache_scope
+            )
+            cache_from.append(cache_import)
+            cache_to.append(cache_export)
+
+        build = ImageBuild(
+            image_name=image_name,
+            dockerfile=f"{self.config.universal.source_code_path}/Dockerfile",
+            context=self.create_function_build_context(files),
+            context_digest=self.compute_context_digest(files),
+            platform=self.platform,
+            registry=self.registry_credentials(url, registry_info),
+            build_args=build_args,
+            context_path_args=["CODE_PATH"],
+            cache_from=cache_from,
+            cache_to=cache_to,
+            builder=self.config.universal.image_builder,
+        )
+        scheduler = get_image_build_scheduler(self.config.universal.image_build_workers)
+        return self.deployable_image(
+            scheduler.submit(build, after=base_image_build), url, registry_info
+        )
+
+    def registry_credentials(
+        self, url: str, registry_info: aws.ecr.GetAuthorizationTokenResult
+    ) -> RegistryCredentials:
+        return RegistryCredentials(
+            server=url.split("/")[0],
+            username=registry_info.user_name,
+            password=registry_info.password,
+        )
+
+    def deployable_image(
+        self,
+        image: Future | str,
+        url: str,
+        registry_info: aws.ecr.GetAuthorizationTokenResult,
+    ) -> Future | str:
+        # Lambda does not accept multi-arch image indexes, it is given the digest of
+        # the manifest for the function's architecture instead. A preview keeps the
+        # tag, as resolving it needs Docker and the pushed image.
+        if self.config.universal.multi_arch_images and not pulumi.runtime.is_dry_run():
+            scheduler = get_image_build_scheduler(
+                self.config.universal.image_build_workers
+            )
+            image = scheduler.submit_platform_image(
+                image,
+                self.registry_credentials(url, registry_info),
+                IMAGE_PLATFORMS[self.compute_profile.architecture],
+            )
+        return image
+
     def create_lambda_security_group(self):
         name = f"{self.project}-{self.environment}-{self.function_name}-sg"
         return aws.ec2.SecurityGroup(
@@ -108,16 +492,39 @@ class CreatePipelineLambdaFunction(CreateResourceBlock):
             opts=ResourceOptions(provider=self.aws_provider),
         )
 
-    def create_lambda(self, security_group, image: docker.Image):
+    def create_lambda(
+        self,
+        security_group,
+        image_uri: pulumi.Input[str] | None = None,
+        package: ZipPackage | None = None,
+        layers: list[pulumi.Input[str]] | None = None,
+    ):
         name = f"{self.project}-{self.environment}-{self.function_name}"
+        if package is not None:
+            code_args = dict(
+                runtime=self.runtime,
+                package_type="Zip",
+                handler=LAMBDA_HANDLER,
+                code=pulumi.FileArchive(package.path),
+                source_code_hash=package.source_code_hash,
+                layers=layers,
+            )
+        else:
+            code_args = dict(runtime=None, package_type="Image", image_uri=image_uri)
         return aws.lambda_.Function(
             resource_name=name,
             name=name,
             role=self.lambda_role,
-            runtime=None,
-            timeout=600,
-            package_type="Image",
-            image_uri=image.base_image_name,
+            timeout=self.compute_profile.timeout,
+            memory_size=self.compute_profile.memory_size,
+            ephemeral_storage=aws.lambda_.FunctionEphemeralStorageArgs(
+                size=self.compute_profile.ephemeral_storage
+            ),
+            architectures=[self.compute_profile.architecture],
+            reserved_concurrent_executions=self.compute_profile.reserved_concurrency,
+            # Provisioned concurrency needs a published version behind an alias
+            publish=self.provisioned_concurrency is not None,
+            **code_args,
             vpc_config=aws.lambda_.FunctionVpcConfigArgs(
                 security_group_ids=[security_group.id],
                 subnet_ids=self.config.private_subnet_ids,
@@ -128,6 +535,63 @@ class CreatePipelineLambdaFunction(CreateResourceBlock):
             opts=ResourceOptions(provider=self.aws_provider),
         )
 
+    def create_alias(self, _lambda: Function) -> Alias:
+        name = f"{self.project}-{self.environment}-{self.function_name}-{LAMBDA_ALIAS_NAME}"
+        return aws.lambda_.Alias(
+            resource_name=name,
+            name=LAMBDA_ALIAS_NAME,
+            function_name=_lambda.name,
+            function_version=_lambda.version,
+            opts=ResourceOptions(provider=self.aws_provider),
+        )
+
+    def create_provisioned_concurrency(
+        self, alias: Alias, provisioned_concurrency: ProvisionedConcurrency
+    ):
+        name = f"{self.project}-{self.environment}-{self.function_name}"
+        concurrent_executions = provisioned_concurrency.concurrent_executions
+        schedule = provisioned_concurrency.schedule
+        if schedule is None:
+            return aws.lambda_.ProvisionedConcurrencyConfig(
+                resource_name=f"{name}-provisioned-concurrency",
+                function_name=alias.function_name,
+                qualifier=alias.name,
+                provisioned_concurrent_executions=concurrent_executions,
+                opts=ResourceOptions(provider=self.aws_provider),
+            )
+
+        # Scheduled capacity is managed by Application Auto Scaling, scaling the
+        # alias up to the configured capacity at the start and back to zero at the end
+        target = aws.appautoscaling.Target(
+            resource_name=f"{name}-provisioned-concurrency",
+            service_namespace="lambda",
+            scalable_dimension="lambda:function:ProvisionedConcurrency",
+            resource_id=pulumi.Output.concat(
+                "function:", alias.function_name, ":", alias.name
+            ),
+            min_capacity=0,
+            max_capacity=concurrent_executions,
+            opts=ResourceOptions(provider=self.aws_provider),
+        )
+        for action, expression, capacity in [
+            ("warm", schedule.start, concurrent_executions),
+            ("cool", schedule.end, 0),
+        ]:
+            aws.appautoscaling.ScheduledAction(
+                resource_name=f"{name}-{action}",
+                name=f"{name}-{action}",
+                service_namespace=target.service_namespace,
+                scalable_dimension=target.scalable_dimension,
+                resource_id=target.resource_id,
+                schedule=expression,
+                timezone=schedule.timezone,
+                scalable_target_action=aws.appautoscaling.ScheduledActionScalableTargetActionArgs(
+                    min_capacity=capacity, max_capacity=capacity
+                ),
+                opts=ResourceOptions(provider=self.aws_provider),
+            )
+        return target
+
     def create_rapid_environment_variables(self) -> dict:
         if self.rapid_client is None:
             return {}
@@ -0,0 +1,192 @@
+import hashlib
+import os
+import threading
+
+from concurrent.futures import Future
+from functools import cached_property
+from typing import Optional
+
+import pulumi
+import pulumi_aws as aws
+
+from pulumi import StackReference
+
+from infrastructure.core.image_builder import (
+    ImageBuild,
+    RegistryCredentials,
+    get_image_build_scheduler,
+    platform_tag,
+    registry_cache,
+)
+from infrastructure.core.image_registry import ImageRegistry
+from infrastructure.universal.ecr import CreateEcrResource
+from utils.config import Config
+from utils.constants import (
+    BASE_IMAGE_DOCKERFILE,
+    BASE_IMAGE_REPOSITORY_NAME,
+    DEFAULT_BASE_IMAGE_DOCKERFILE,
+    DEFAULT_BASE_IMAGE_DOCKERFILE_NAME,
+)
+from utils.filesystem import create_build_context
+from utils.hashing import get_hash_manifest
+
+
+class PipelineBaseImage:
+    """
+    Image holding a pipeline's global and pipeline level requirements. It is built
+    once per pipeline and the function images are built on top of it.
+    """
+
+    def __init__(
+        self,
+        config: Config,
+        universal_stack_reference: StackReference,
+        layer: str,
+        pipeline_name: str,
+        image_registry: ImageRegistry,
+    ) -> None:
+        self.config = config
+        self.universal_stack_reference = universal_stack_reference
+        self.layer = layer
+        self.pipeline_name = pipeline_name
+        self.image_registry = image_registry
+        # Submitted builds by platform, shared by every function of the pipeline
+        self._builds: dict[str, Optional[Future]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def pipeline_path(self) -> str:
+        return os.path.join(
+            self.config.universal.source_code_path, self.layer, self.pipeline_name
+        )
+
+    @property
+    def dockerfile(self) -> str:
+        # Projects can supply their own base Dockerfile next to the function one
+        dockerfile = os.path.join(
+            self.config.universal.source_code_path, BASE_IMAGE_DOCKERFILE
+        )
+        return (
+            dockerfile if os.path.isfile(dockerfile) else DEFAULT_BASE_IMAGE_DOCKERFILE
+        )
+
+    @cached_property
+    def requirement_files(self) -> list[str]:
+        return [
+            path
+            for path in [
+                os.path.join(
+                    self.config.universal.config_repo_path, "requirements.txt"
+                ),
+                os.path.join(self.pipeline_path, "requirements.txt"),
+            ]
+            if os.path.isfile(path)
+        ]
+
+    @cached_property
+    def requirements_hash(self) -> str:
+        manifest = get_hash_manifest(self.config.universal.hash_manifest_path)
+        config_repo_path = self.config.universal.config_repo_path
+        entries = [
+            (path, os.path.relpath(path, config_repo_path).replace(os.sep, "/"))
+            for path in self.requirement_files
+        ]
+        # The default Dockerfile is named independently of where dorc is installed,
+        # so the tag is the same on every machine
+        entries.append(
+            (
+                self.dockerfile,
+                DEFAULT_BASE_IMAGE_DOCKERFILE_NAME
+                if self.dockerfile == DEFAULT_BASE_IMAGE_DOCKERFILE
+                else os.path.relpath(self.dockerfile, config_repo_path).replace(
+                    os.sep, "/"
+                ),
+            )
+        )
+        return manifest.digest_entries(entries)
+
+    def code_hash(self, platform: str) -> str:
+        # One base image per platform, so functions on different architectures
+        # never share a tag
+        return hashlib.sha256(
+            f"{self.requirements_hash}\0{platform}".encode()
+        ).hexdigest()
+
+    def repository_url(self) -> pulumi.Output[str]:
+        return self.universal_stack_reference.require_output(
+            CreateEcrResource.create_repository_url_export_key(
+                BASE_IMAGE_REPOSITORY_NAME
+            )
+        )
+
+    def image_name(self, url: str, platform: str) -> str:
+        return f"{url}:{self.code_hash(platform)}"
+
+    def name(self, platform: str) -> str:
+        return f"{self.layer}-{self.pipeline_name}-base-{platform_tag(platform)}"
+
+    def submit(
+        self,
+        url: str,
+        registry_info: aws.ecr.GetAuthorizationTokenResult,
+        platform: str,
+        build_cache_url: Optional[str] = None,
+    ) -> Optional[Future]:
+        # Returns the pending build to wait on, or None when the image already exists.
+        # The build context is only created by the first submission, as later ones
+        # would replace it while the build is reading it.
+        with self._lock:
+            if platform not in self._builds:
+                self._builds[platform] = self.submit_build(
+                    url, registry_info, platform, build_cache_url
+                )
+            return self._builds[platform]
+
+    def submit_build(
+        self,
+        url: str,
+        registry_info: aws.ecr.GetAuthorizationTokenResult,
+        platform: str,
+        build_cache_url: Optional[str] = None,
+    ) -> Optional[Future]:
+        code_hash = self.code_hash(platform)
+        image_name = self.image_name(url, platform)
+        if self.image_registry.resolve_image_digest(url, code_hash) is not None:
+            return None
+
+        context = create_build_context(
+            self.config.universal.config_repo_path,
+            self.requirement_files,
+            os.path.join(self.config.universal.build_context_path, self.name(platform)),
+        )
+        cache_from, cache_to = [image_name], []
+        if build_cache_url is not None:
+            cache_import, cache_export = registry_cache(
+                build_cache_url, self.name(platform)
+            )
+            cache_from.append(cache_import)
+            cache_to.append(cache_export)
+
+        build = ImageBuild(
+            image_name=image_name,
+            dockerfile=self.dockerfile,
+            context=context,
+            context_digest=code_hash,
+            platform=platform,
+            registry=RegistryCredentials(
+                server=url.split("/")[0],
+                username=registry_info.user_name,
+                password=registry_info.password,
+            ),
+            build_args={
+                "PIPELINE_PATH": os.path.relpath(
+                    self.pipeline_path, self.config.universal.config_repo_path
+                ),
+                "BUILDKIT_INLINE_CACHE": "1",
+            },
+            cache_from=cache_from,
+            cache_to=cache_to,
+            builder=self.config.universal.image_builder,
+        )
+        scheduler = get_image_build_scheduler(self.config.universal.image_build_workers)
+        return scheduler.submit(build)
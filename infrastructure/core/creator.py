@@ -1,10 +1,8 @@
-import glob
 import os
 import re
 
 import pulumi
 
-from pulumi_aws.lambda_ import Function
 from pulumi_aws.cognito import UserPoolClient
 from pydantic import ValidationError
 
@@ -14,22 +12,34 @@ from infrastructure.core.event_bridge import (
 )
 from infrastructure.core.rapid_client import CreateRapidClient, create_rapid_permissions
 from infrastructure.core._lambda import CreatePipelineLambdaFunction
+from infrastructure.core.base_image import PipelineBaseImage
+from infrastructure.core.image_registry import ImageRegistry
 from infrastructure.core.state_machine import CreatePipelineStateMachine
-from infrastructure.core.models.definition import PipelineDefinition, rAPIdTrigger
+from infrastructure.core.trigger_dispatcher import CreateTriggerDispatcher
+from infrastructure.core.models.definition import (
+    Function,
+    PackageTypes,
+    PipelineDefinition,
+    rAPIdTrigger,
+)
 from infrastructure.core.validators import validate_rapid_trigger
 from infrastructure.providers.rapid_client import RapidClient
 from utils.abstracts import CreateInfrastructureBlock
 from utils.config import Config, LayerConfig
 from utils.constants import (
     LAMBDA_ROLE_ARN,
-    LAMBDA_HANDLER_FILE,
     STATE_FUNCTION_ROLE_ARN,
     CLOUDEVENT_STATE_MACHINE_TRIGGER_ROLE_ARN,
+    TRIGGER_DISPATCHER_ROLE_ARN,
 )
 from utils.exceptions import (
     InvalidPipelineDefinitionException,
 )
-from utils.filesystem import extract_lambda_name_from_filepath, path_to_name
+from utils.filesystem import (
+    extract_lambda_name_from_filepath,
+    find_lambda_paths,
+    path_to_name,
+)
 
 
 class FileStructure:
@@ -81,6 +91,18 @@ class CreatePipeline(CreateInfrastructureBlock):
 
         self.created_lambdas = {}
         self.file_structure = FileStructure(self.fetch_lambda_paths())
+        self.image_registry = ImageRegistry()
+        self.base_image = (
+            PipelineBaseImage(
+                self.config,
+                self.universal_stack_reference,
+                self.file_structure.layer,
+                self.file_structure.pipeline_name,
+                self.image_registry,
+            )
+            if self.config.universal.shared_base_image
+            else None
+        )
 
         validate_rapid_trigger(self.pipeline_definition, self.config.rAPId_config)
 
@@ -104,6 +126,9 @@ class CreatePipeline(CreateInfrastructureBlock):
             CLOUDEVENT_STATE_MACHINE_TRIGGER_ROLE_ARN
         )
 
+    def get_trigger_dispatcher_role_arn(self):
+        return self.infra_stack_reference.require_output(TRIGGER_DISPATCHER_ROLE_ARN)
+
     def create_new_rapid_client_or_fetch_details(self) -> UserPoolClient | RapidClient:
         trigger = self.pipeline_definition.trigger
         client_key = trigger.client_key
@@ -131,42 +156,49 @@ class CreatePipeline(CreateInfrastructureBlock):
         ):
             rapid_client_details = self.create_new_rapid_client_or_fetch_details()
 
-        lambda_paths = self.lambda_function_paths()
-        lambda_paths.apply(
-            lambda names: [
-                self.apply_lambda_function(name, rapid_client_details).apply()
-                for name in names
-            ]
-        ).apply(
-            lambda outputs: {
-                output.name: output.lambda_function.arn for output in outputs
-            }
-        ).apply(
-            lambda lambda_map: self.apply_state_machine(lambda_map).apply()
-        ).apply(
-            lambda state_machine_outputs: self.apply_state_machine_trigger(
-                state_machine_outputs
+        # Declare every resource up front so previews show the full plan and the
+        # engine can create the independent functions concurrently. Only the
+        # ARNs are wired through as outputs.
+        lambda_function_blocks = [
+            self.apply_lambda_function(lambda_path, rapid_client_details)
+            for lambda_path in self.file_structure.lambda_paths
+        ]
+        # Check which images already exist for all functions in a single pass
+        image_blocks = [
+            block
+            for block in lambda_function_blocks
+            if block.package_type == PackageTypes.IMAGE
+        ]
+        images = [
+            (block.repository_url(), block.image_source[1]) for block in image_blocks
+        ]
+        if self.base_image is not None:
+            images.extend(
+                (self.base_image.repository_url(), self.base_image.code_hash(platform))
+                for platform in sorted({block.platform for block in image_blocks})
             )
-            if self.pipeline_definition.trigger is not None
-            else None
-        )
+        self.image_registry.prefetch(images)
+        lambda_function_outputs = [block.apply() for block in lambda_function_blocks]
+        lambda_name_to_arn_map = {
+            output.name: output.invocation_arn for output in lambda_function_outputs
+        }
+        state_machine = self.apply_state_machine(lambda_name_to_arn_map)
+        state_machine.exec()
+        state_machine.export()
+        state_machine_outputs = state_machine.outputs
 
-    def fetch_lambda_paths(self) -> list[str]:
-        initial = self.pipeline_definition.file_path.strip("__main__.py")
-        path_to_search = os.path.join(initial, "*", LAMBDA_HANDLER_FILE)
-        return [
-            path.split(f"/{self.config.source_code_folder}/")[-1]
-            for path in glob.glob(path_to_search)
-        ]
+        if self.pipeline_definition.trigger is not None:
+            self.apply_state_machine_trigger(state_machine_outputs)
 
-    def lambda_function_paths(self):
-        return pulumi.Output.from_input(
-            [lambda_path for lambda_path in self.file_structure.lambda_paths]
+    def fetch_lambda_paths(self) -> list[str]:
+        return find_lambda_paths(
+            self.pipeline_definition.file_path, self.config.source_code_folder
         )
 
     def apply_lambda_function(
         self, lambda_path: str, rapid_client: UserPoolClient
     ) -> CreatePipelineLambdaFunction:
+        function = self.get_function_definition(lambda_path)
         return CreatePipelineLambdaFunction(
             config=self.config,
             aws_provider=self.aws_provider,
@@ -176,9 +208,24 @@ class CreatePipeline(CreateInfrastructureBlock):
             function_name=extract_lambda_name_from_filepath(lambda_path),
             code_path=os.path.dirname(lambda_path),
             rapid_client=rapid_client,
+            image_registry=self.image_registry,
+            base_image=self.base_image,
+            function=function,
+            compute_profile=self.pipeline_definition.compute_profile(function),
+        )
+
+    def get_function_definition(self, lambda_path: str) -> Function | None:
+        function_name = os.path.basename(os.path.dirname(lambda_path))
+        return next(
+            (
+                function
+                for function in self.pipeline_definition.all_functions
+                if function.name == function_name
+            ),
+            None,
         )
 
-    def apply_state_machine(self, lambdas: list[Function]):
+    def apply_state_machine(self, lambdas: dict[str, pulumi.Output[str]]):
         return CreatePipelineStateMachine(
             self.config,
             self.aws_provider,
@@ -193,18 +240,43 @@ class CreatePipeline(CreateInfrastructureBlock):
         self, state_machine_outputs: CreatePipelineStateMachine.Output
     ):
         self.cloudevent_bridge_rule.exec()
+        rule = self.cloudevent_bridge_rule.outputs.cloudwatch_event_rule
+        target_arn = state_machine_outputs.state_machine.arn
+        role_arn = self.cloudevent_trigger_role_arn
+        if self.pipeline_definition.is_trigger_queued:
+            # Events are queued and started by the dispatcher instead
+            trigger_dispatcher = self.apply_trigger_dispatcher(
+                rule.arn, state_machine_outputs
+            )
+            target_arn, role_arn = trigger_dispatcher.outputs.queue.arn, None
         cloudevent_bridge_target = CreateEventBridgeTarget(
             self.config,
             self.aws_provider,
             self.environment,
             self.file_structure.pipeline_name,
             self.pipeline_definition,
-            self.cloudevent_bridge_rule.outputs.cloudwatch_event_rule.name,
-            self.cloudevent_trigger_role_arn,
-            state_machine_outputs.state_machine.arn,
+            rule.name,
+            role_arn,
+            target_arn,
         )
         cloudevent_bridge_target.exec()
 
+    def apply_trigger_dispatcher(
+        self, rule_arn, state_machine_outputs: CreatePipelineStateMachine.Output
+    ) -> CreateTriggerDispatcher:
+        trigger_dispatcher = CreateTriggerDispatcher(
+            self.config,
+            self.aws_provider,
+            self.environment,
+            self.file_structure.pipeline_name,
+            self.pipeline_definition,
+            rule_arn,
+            self.get_trigger_dispatcher_role_arn(),
+            state_machine_outputs.state_machine.arn,
+        )
+        trigger_dispatcher.exec()
+        return trigger_dispatcher
+
     def generate_pipeline_name_from_directory(self):
         path = self.pipeline_definition.file_path
         matcher = f"{self.config.config_repo_path}/src"
@@ -78,13 +78,15 @@ class CreateEventBridgeTarget(CreateResourceBlock):
         pipeline_definition: PipelineDefinition,
         event_bridge_rule_name: str,
         cloudevent_trigger_role_arn,
-        state_machine_arn,
+        target_arn,
     ) -> None:
         super().__init__(config, aws_provider, environment)
         self.pipeline_name = pipeline_name
         self.pipeline_definition = pipeline_definition
         self.event_bridge_rule_name = event_bridge_rule_name
-        self.state_machine_arn = state_machine_arn
+        # The state machine, or the trigger queue of a pipeline with an
+        # execution limit
+        self.target_arn = target_arn
         self.cloudevent_trigger_role_arn = cloudevent_trigger_role_arn
         self.project = self.config.project
 
@@ -93,7 +95,7 @@ class CreateEventBridgeTarget(CreateResourceBlock):
         cloudwatch_event_target = aws.cloudwatch.EventTarget(
             resource_name=name,
             rule=self.event_bridge_rule_name,
-            arn=self.state_machine_arn,
+            arn=self.target_arn,
             role_arn=self.cloudevent_trigger_role_arn,
             opts=ResourceOptions(provider=self.aws_provider),
         )
@@ -0,0 +1,350 @@
+import atexit
+import json
+import subprocess  # nosec B404
+import threading
+import time
+
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Optional
+
+import pulumi
+
+from pydantic import BaseModel  # pylint: disable=no-name-in-module
+
+from utils.exceptions import ImageBuildException
+
+DEFAULT_IMAGE_BUILD_WORKERS = 4
+
+
+def run_docker_command(arguments: list[str], stdin: Optional[str] = None) -> str:
+    try:
+        return subprocess.run(  # nosec B603 B607
+            ["docker", *arguments],
+            input=stdin,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout
+    except subprocess.CalledProcessError as exception:
+        raise ImageBuildException(
+            f"docker {arguments[0]} failed: {exception.stderr}"
+        ) from exception
+
+
+def chain_future(source: Future, target: Future) -> None:
+    source.add_done_callback(
+        lambda completed: target.set_exception(completed.exception())
+        if completed.exception() is not None
+        else target.set_result(completed.result())
+    )
+
+
+def platform_tag(platform: str) -> str:
+    # linux/amd64,linux/arm64 -> amd64-arm64, usable in tags and folder names
+    return "-".join(item.split("/")[-1] for item in platform.split(","))
+
+
+def registry_cache(repository_url: str, scope: str) -> tuple[str, str]:
+    # BuildKit --cache-from and --cache-to specs for a cache tag in an ECR
+    # repository. mode=max also exports the layers of intermediate stages and ECR
+    # only accepts the cache as an OCI image manifest.
+    ref = f"type=registry,ref={repository_url}:{scope}"
+    return ref, f"{ref},mode=max,image-manifest=true,oci-mediatypes=true"
+
+
+class RegistryCredentials(BaseModel):
+    server: str
+    username: str
+    password: str
+
+
+class ImageBuild(BaseModel):
+    image_name: str
+    dockerfile: str
+    context: str
+    platform: str
+    registry: RegistryCredentials
+    context_digest: Optional[str] = None
+    build_args: dict[str, str] = {}
+    # Build args locating files within the context, e.g. CODE_PATH. Their files
+    # are covered by context_digest, so they are left out of the deduplication key.
+    context_path_args: list[str] = []
+    cache_from: list[str] = []
+    cache_to: list[str] = []
+    builder: Optional[str] = None
+
+    @property
+    def is_multi_platform(self) -> bool:
+        return "," in self.platform
+
+    def deduplication_key(self) -> str:
+        # Everything that determines the built image, the target name excluded, so
+        # identical contexts are only built once and then tagged for each repo.
+        # A content digest of the context identifies it better than its path.
+        if self.context_digest is None:
+            return json.dumps(
+                {
+                    "context": self.context,
+                    **self.dict(include={"dockerfile", "platform", "build_args"}),
+                },
+                sort_keys=True,
+            )
+        return json.dumps(
+            {
+                "context": self.context_digest,
+                "platform": self.platform,
+                "build_args": {
+                    key: value
+                    for key, value in self.build_args.items()
+                    if key not in self.context_path_args
+                },
+            },
+            sort_keys=True,
+        )
+
+
+class ImageBuildTiming(BaseModel):
+    image_name: str
+    build_seconds: float
+    push_seconds: float
+    deduplicated: bool = False
+
+
+class ImageBuildScheduler:
+    """
+    Builds and pushes the images for a program run on a bounded pool of workers.
+    Builds and pushes run on separate pools so one image can be pushed while the
+    next one is being built.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = DEFAULT_IMAGE_BUILD_WORKERS,
+        runner: Callable[
+            [list[str], Optional[str]], Optional[str]
+        ] = run_docker_command,
+    ) -> None:
+        self.runner = runner
+        self._build_executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="dorc-image-build"
+        )
+        self._push_executor = ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="dorc-image-push"
+        )
+        self._lock = threading.Lock()
+        self._builds: dict[str, Future] = {}
+        self._pushes: dict[str, Future] = {}
+        self._logins: dict[str, Future] = {}
+        self._build_seconds: dict[str, float] = {}
+        self._timings: dict[str, ImageBuildTiming] = {}
+
+    @property
+    def timings(self) -> list[ImageBuildTiming]:
+        with self._lock:
+            return list(self._timings.values())
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._build_executor.shutdown(wait=wait)
+        self._push_executor.shutdown(wait=wait)
+
+    def submit(self, build: ImageBuild, after: Optional[Future] = None) -> Future:
+        # Builds that depend on another image, e.g. a shared base image, only start
+        # once that image has been pushed
+        with self._lock:
+            if build.image_name in self._pushes:
+                return self._pushes[build.image_name]
+
+            key = build.deduplication_key()
+            build_future = self._builds.get(key)
+            if build_future is None:
+                build_future = self.start_build(build, after)
+                self._builds[key] = build_future
+
+            push_future = Future()
+            self._pushes[build.image_name] = push_future
+
+        build_future.add_done_callback(
+            lambda completed: self.schedule_push(completed, build, push_future)
+        )
+        return push_future
+
+    def start_build(self, build: ImageBuild, after: Optional[Future]) -> Future:
+        if after is None:
+            return self._build_executor.submit(self.build, build)
+
+        build_future = Future()
+
+        def start(dependency: Future):
+            if dependency.exception() is not None:
+                build_future.set_exception(dependency.exception())
+            else:
+                chain_future(
+                    self._build_executor.submit(self.build, build), build_future
+                )
+
+        after.add_done_callback(start)
+        return build_future
+
+    def schedule_push(
+        self, build_future: Future, build: ImageBuild, push_future: Future
+    ) -> None:
+        if build_future.exception() is not None:
+            push_future.set_exception(build_future.exception())
+            return
+
+        chain_future(
+            self._push_executor.submit(self.push, build_future.result(), build),
+            push_future,
+        )
+
+    def login(self, registry: RegistryCredentials) -> None:
+        # Log in once per registry, concurrent callers wait on the first attempt
+        with self._lock:
+            login_future = self._logins.get(registry.server)
+            is_first = login_future is None
+            if is_first:
+                login_future = Future()
+                self._logins[registry.server] = login_future
+
+        if is_first:
+            try:
+                self.runner(
+                    [
+                        "login",
+                        "--username",
+                        registry.username,
+                        "--password-stdin",
+                        registry.server,
+                    ],
+                    registry.password,
+                )
+                login_future.set_result(None)
+            except Exception as exception:
+                login_future.set_exception(exception)
+        login_future.result()
+
+    def build(self, build: ImageBuild) -> str:
+        self.login(build.registry)
+        arguments = ["buildx", "build"]
+        if build.builder is not None:
+            arguments.extend(["--builder", build.builder])
+        arguments += [
+            "--platform",
+            build.platform,
+            "--file",
+            build.dockerfile,
+            "--tag",
+            build.image_name,
+            # Multi-platform images can't be loaded into the local image store,
+            # they are pushed as a manifest list straight from the builder
+            "--push" if build.is_multi_platform else "--load",
+            # Attestations would turn every image into an index, Lambda only runs
+            # plain image manifests
+            "--provenance=false",
+        ]
+        for key, value in build.build_args.items():
+            arguments.extend(["--build-arg", f"{key}={value}"])
+        for image in build.cache_from:
+            arguments.extend(["--cache-from", image])
+        for cache in build.cache_to:
+            arguments.extend(["--cache-to", cache])
+        arguments.append(build.context)
+
+        start = time.monotonic()
+        self.runner(arguments, None)
+        with self._lock:
+            self._build_seconds[build.image_name] = time.monotonic() - start
+        return build.image_name
+
+    def push(self, built_image: str, build: ImageBuild) -> str:
+        deduplicated = built_image != build.image_name
+        self.login(build.registry)
+        start = time.monotonic()
+        if build.is_multi_platform:
+            # Already pushed by the build, an identical build is copied remotely
+            if deduplicated:
+                self.runner(
+                    [
+                        "buildx",
+                        "imagetools",
+                        "create",
+                        "--tag",
+                        build.image_name,
+                        built_image,
+                    ],
+                    None,
+                )
+        else:
+            if deduplicated:
+                self.runner(["tag", built_image, build.image_name], None)
+            self.runner(["push", build.image_name], None)
+
+        with self._lock:
+            timing = ImageBuildTiming(
+                image_name=build.image_name,
+                build_seconds=0.0 if deduplicated else self._build_seconds[built_image],
+                push_seconds=time.monotonic() - start,
+                deduplicated=deduplicated,
+            )
+            self._timings[build.image_name] = timing
+        pulumi.log.info(
+            f"Image {timing.image_name} built in {timing.build_seconds:.1f}s "
+            f"and pushed in {timing.push_seconds:.1f}s"
+            + (" (reused identical build)" if deduplicated else "")
+        )
+        return build.image_name
+
+    def submit_platform_image(
+        self, image: Future | str, registry: RegistryCredentials, platform: str
+    ) -> Future:
+        # Resolves a multi-platform image, once pushed, to its manifest for platform
+        resolved = Future()
+
+        def resolve(pushed: Future):
+            if pushed.exception() is not None:
+                resolved.set_exception(pushed.exception())
+                return
+            chain_future(
+                self._push_executor.submit(
+                    self.platform_image, pushed.result(), registry, platform
+                ),
+                resolved,
+            )
+
+        if isinstance(image, str):
+            pushed = Future()
+            pushed.set_result(image)
+            image = pushed
+        image.add_done_callback(resolve)
+        return resolved
+
+    def platform_image(
+        self, image_name: str, registry: RegistryCredentials, platform: str
+    ) -> str:
+        # Lambda does not accept image indexes, so the function is deployed from
+        # the digest of the index's manifest for its own platform
+        self.login(registry)
+        index = json.loads(
+            self.runner(["buildx", "imagetools", "inspect", "--raw", image_name], None)
+        )
+        operating_system, architecture = platform.split("/")
+        for manifest in index.get("manifests", []):
+            manifest_platform = manifest.get("platform", {})
+            if (
+                manifest_platform.get("os") == operating_system
+                and manifest_platform.get("architecture") == architecture
+            ):
+                repository = image_name.split("@")[0].rsplit(":", 1)[0]
+                return f"{repository}@{manifest['digest']}"
+        raise ImageBuildException(f"Image {image_name} has no {platform} manifest")
+
+
+@lru_cache(maxsize=None)
+def get_image_build_scheduler(
+    max_workers: int = DEFAULT_IMAGE_BUILD_WORKERS,
+) -> ImageBuildScheduler:
+    # Shared by every function in the program run so the worker bound is global
+    scheduler = ImageBuildScheduler(max_workers)
+    atexit.register(scheduler.shutdown)
+    return scheduler
@@ -0,0 +1,145 @@
+import asyncio
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+import pulumi
+import pulumi_aws as aws
+
+from botocore.exceptions import ClientError
+
+from utils.aws_clients import aws_clients
+
+
+def parse_repository_url(url: str) -> tuple[str, str, str]:
+    # <registry id>.dkr.ecr.<region>.amazonaws.com/<repository name>
+    registry, repository_name = url.split("/", 1)
+    registry_id, _, _, region = registry.split(".")[:4]
+    return registry_id, region, repository_name
+
+
+class ImageRegistry:
+    """
+    Looks up which content-hash tags already exist in ECR. Lookups are cached for
+    the program run and can be batched across a pipeline's repositories up front
+    with prefetch, so each function only has to consult the cache.
+    """
+
+    def __init__(self, ecr_client=None, max_workers: int = 8) -> None:
+        self.ecr_client = ecr_client
+        self.max_workers = max_workers
+        self.prefetched: Optional[pulumi.Output] = None
+        self._lock = threading.Lock()
+        self._digests: dict[tuple[str, str], Optional[str]] = {}
+
+    def client(self, region: str):
+        if self.ecr_client is None:
+            return aws_clients.get("ecr", region)
+        return self.ecr_client
+
+    def fetch_repository_digests(
+        self, repository_url: str, tags: list[str]
+    ) -> dict[tuple[str, str], Optional[str]]:
+        registry_id, region, repository_name = parse_repository_url(repository_url)
+        digests = {(repository_url, tag): None for tag in tags}
+        # BatchGetImage reports missing tags as failures instead of raising
+        try:
+            response = self.client(region).batch_get_image(
+                registryId=registry_id,
+                repositoryName=repository_name,
+                imageIds=[{"imageTag": tag} for tag in tags],
+            )
+        except ClientError as exception:
+            # A missing repository simply holds no images yet
+            if exception.response["Error"]["Code"] != "RepositoryNotFoundException":
+                raise
+            return digests
+        for image in response["images"]:
+            image_id = image["imageId"]
+            digests[(repository_url, image_id["imageTag"])] = image_id["imageDigest"]
+        return digests
+
+    def find_existing_images(
+        self, images: list[tuple[str, str]]
+    ) -> dict[tuple[str, str], Optional[str]]:
+        with self._lock:
+            missing = [image for image in images if image not in self._digests]
+
+        tags_by_repository: dict[str, list[str]] = {}
+        for repository_url, tag in missing:
+            tags_by_repository.setdefault(repository_url, []).append(tag)
+
+        # One request per repository, all repositories queried concurrently
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            results = list(
+                executor.map(
+                    lambda item: self.fetch_repository_digests(*item),
+                    tags_by_repository.items(),
+                )
+            )
+        with self._lock:
+            for digests in results:
+                self._digests.update(digests)
+            return {image: self._digests[image] for image in images}
+
+    def prefetch(self, images: list[tuple[pulumi.Input[str], str]]) -> pulumi.Output:
+        tags = [tag for _, tag in images]
+        self.prefetched = pulumi.Output.all(*[url for url, _ in images]).apply(
+            lambda urls: asyncio.to_thread(
+                self.find_existing_images, list(zip(urls, tags))
+            )
+        )
+        return self.prefetched
+
+    def resolve_image_digest(self, repository_url: str, tag: str) -> Optional[str]:
+        return self.find_existing_images([(repository_url, tag)])[(repository_url, tag)]
+
+
+def fetch_authorization_token(
+    registry_id: str, provider: Optional[aws.Provider] = None
+) -> aws.ecr.GetAuthorizationTokenResult:
+    return aws.ecr.get_authorization_token(
+        registry_id=registry_id, opts=pulumi.InvokeOptions(provider=provider)
+    )
+
+
+class AuthorizationTokenCache:
+    """
+    ECR authorization tokens memoized per registry and region for the program run.
+    A token is fetched again once it is within expiry_margin of expiring.
+    """
+
+    def __init__(
+        self,
+        fetch: Callable[..., aws.ecr.GetAuthorizationTokenResult] = (
+            fetch_authorization_token
+        ),
+        expiry_margin: timedelta = timedelta(minutes=5),
+    ) -> None:
+        self.fetch = fetch
+        self.expiry_margin = expiry_margin
+        self._lock = threading.Lock()
+        self._tokens: dict[tuple[str, str], aws.ecr.GetAuthorizationTokenResult] = {}
+
+    def is_expired(self, token: aws.ecr.GetAuthorizationTokenResult) -> bool:
+        if not token.expires_at:
+            return False
+        expires_at = datetime.fromisoformat(token.expires_at)
+        return datetime.now(timezone.utc) >= expires_at - self.expiry_margin
+
+    def get(
+        self, registry_id: str, region: str, provider: Optional[aws.Provider] = None
+    ) -> aws.ecr.GetAuthorizationTokenResult:
+        key = (registry_id, region)
+        with self._lock:
+            token = self._tokens.get(key)
+            if token is None or self.is_expired(token):
+                token = self.fetch(registry_id, provider)
+                self._tokens[key] = token
+            return token
+
+
+# Shared by every function in the program run, they all live in the same registry
+authorization_tokens = AuthorizationTokenCache()
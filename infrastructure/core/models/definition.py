@@ -1,17 +1,67 @@
 import json
+import re
 
 from enum import StrEnum
 from typing import Optional
 
-from pydantic import BaseModel, validator  # pylint: disable=no-name-in-module
+from pydantic import (  # pylint: disable=no-name-in-module
+    BaseModel,
+    Field,
+    StrictBool,
+    StrictFloat,
+    StrictInt,
+    StrictStr,
+    root_validator,
+    validator,
+)
 
 from infrastructure.core.models.event_bridge import EventBridge, S3EventBridgeModel
+from utils.constants import (
+    DEFAULT_LAMBDA_EPHEMERAL_STORAGE,
+    DEFAULT_LAMBDA_MEMORY_SIZE,
+    DEFAULT_LAMBDA_RUNTIME,
+    DEFAULT_LAMBDA_TIMEOUT,
+    DEFAULT_RETRY_BACKOFF_RATE,
+    DEFAULT_RETRY_ERRORS,
+    DEFAULT_RETRY_INTERVAL_SECONDS,
+    DEFAULT_RETRY_MAX_ATTEMPTS,
+    DEFAULT_RETRY_MAX_DELAY_SECONDS,
+    LOG_RETENTION_DAYS,
+)
+
+
+class TriggerBatching(BaseModel):
+    # Events are collected until batch_size arrive or window_seconds pass
+    batch_size: int = Field(ge=1, le=10000)
+    window_seconds: Optional[int] = Field(0, ge=0, le=300)
+
+    @root_validator(skip_on_failure=True)
+    def check_window_for_large_batches(cls, values):  # pylint: disable=no-self-argument
+        # SQS only delivers more than 10 messages at once when it can wait for them
+        if values["batch_size"] > 10 and not values["window_seconds"]:
+            raise ValueError("Batches of more than 10 events need a window")
+        return values
+
+
+class TriggerCoalescing(BaseModel):
+    # Only the first event for a key within the window starts an execution. The
+    # key is made of dotted paths into the S3 event's detail.
+    window_seconds: int = Field(ge=1, le=86400)
+    key: Optional[list[str]] = Field(["bucket.name", "object.key"], min_items=1)
+
+    @validator("key", each_item=True)
+    def check_key_path(cls, path: str):  # pylint: disable=no-self-argument
+        if not re.fullmatch(r"[A-Za-z0-9_-]+(\.[A-Za-z0-9_-]+)*", path):
+            raise ValueError(f"{path} is not a dotted path, e.g. object.key")
+        return path
 
 
 class rAPIdTrigger(BaseModel):
     domain: str
     name: str
     client_key: Optional[str]
+    batching: Optional[TriggerBatching] = None
+    coalescing: Optional[TriggerCoalescing] = None
 
     def create_s3_path_prefix(self, layer: str) -> str:
         return f"data/{layer}/{self.domain.lower()}/{self.name}/"
@@ -33,6 +83,8 @@ class S3Trigger(BaseModel):
     name: str
     bucket_name: str
     key_prefix: str
+    batching: Optional[TriggerBatching] = None
+    coalescing: Optional[TriggerCoalescing] = None
 
     def event_pattern(self):
         event_bridge_model = EventBridge(
@@ -63,31 +115,585 @@ class NextFunctionTypes(StrEnum):
     PIPELINE = "Pipeline"
 
 
+class ChainModes(StrEnum):
+    # Wait for the chained pipeline to finish
+    SYNC = "sync"
+    # Only start the chained pipeline
+    ASYNC = "async"
+
+
 class NextFunction(BaseModel):
     name: str
     type: Optional[NextFunctionTypes] = NextFunctionTypes.FUNCTION
+    # Pulumi stack of a chained pipeline, whose exported state machine ARN is
+    # used instead of looking the pipeline up by name. {environment} is replaced
+    # with the environment being deployed.
+    stack: Optional[str] = None
+    mode: ChainModes = ChainModes.SYNC
+    # Step run once the chained pipeline has finished, or has started when async
+    next_function: Optional[str] = None
+    # Input of the chained pipeline, each field selected by a JSONPath
+    input: Optional[dict[str, str]] = None
+
+    @validator("input")
+    def check_input_paths(
+        cls, input: Optional[dict[str, str]]
+    ):  # pylint: disable=no-self-argument,redefined-builtin
+        for field, path in (input or {}).items():
+            if not path.startswith("$"):
+                raise ValueError(f"Input field {field} must be a JSONPath")
+        return input
+
+    @root_validator(skip_on_failure=True)
+    def check_chaining_options_are_for_pipeline(
+        cls, values
+    ):  # pylint: disable=no-self-argument
+        if values["type"] == NextFunctionTypes.PIPELINE:
+            return values
+        if values["stack"] is not None:
+            raise ValueError("Only a chained pipeline can be found by its stack")
+        if (
+            values["mode"] != ChainModes.SYNC
+            or values["next_function"] is not None
+            or values["input"] is not None
+        ):
+            raise ValueError(
+                "Only a chained pipeline can set a mode, next_function or input"
+            )
+        return values
+
+
+class PackageTypes(StrEnum):
+    IMAGE = "Image"
+    ZIP = "Zip"
+
+
+class Architectures(StrEnum):
+    X86_64 = "x86_64"
+    ARM64 = "arm64"
+
+
+class ComputeProfile(BaseModel):
+    # Unset values fall back to the pipeline's profile and then to the defaults
+    memory_size: Optional[int] = Field(None, ge=128, le=10240)
+    ephemeral_storage: Optional[int] = Field(None, ge=512, le=10240)
+    timeout: Optional[int] = Field(None, ge=1, le=900)
+    architecture: Optional[Architectures] = None
+    # Concurrency set aside for the function, which also caps it
+    reserved_concurrency: Optional[int] = Field(None, ge=0)
+
+    def override(self, profile: Optional["ComputeProfile"]) -> "ComputeProfile":
+        if profile is None:
+            return self
+        return self.copy(update=profile.dict(exclude_none=True))
+
+
+DEFAULT_COMPUTE_PROFILE = ComputeProfile(
+    memory_size=DEFAULT_LAMBDA_MEMORY_SIZE,
+    ephemeral_storage=DEFAULT_LAMBDA_EPHEMERAL_STORAGE,
+    timeout=DEFAULT_LAMBDA_TIMEOUT,
+    architecture=Architectures.X86_64,
+)
+
+
+class WarmSchedule(BaseModel):
+    # Application Auto Scaling schedule expressions, e.g. cron(0 8 ? * MON-FRI *)
+    start: str
+    end: str
+    timezone: Optional[str] = None
+
+    @validator("start", "end")
+    def check_schedule_expression(
+        cls, expression: str
+    ):  # pylint: disable=no-self-argument
+        if not re.fullmatch(r"(cron|rate|at)\(.+\)", expression):
+            raise ValueError(
+                f"{expression} is not a cron(...), rate(...) or at(...) expression"
+            )
+        return expression
+
+
+class ProvisionedConcurrency(BaseModel):
+    concurrent_executions: int = Field(ge=1)
+    # Only keep the capacity warm between the schedule's start and end
+    schedule: Optional[WarmSchedule] = None
+
+
+class RetryPolicy(BaseModel):
+    # Waits interval_seconds before the first retry, multiplied by backoff_rate for
+    # each further attempt up to max_delay_seconds. Jitter randomises each wait.
+    errors: list[str] = Field(["States.ALL"], min_items=1)
+    interval_seconds: int = Field(DEFAULT_RETRY_INTERVAL_SECONDS, ge=1)
+    max_attempts: int = Field(DEFAULT_RETRY_MAX_ATTEMPTS, ge=0)
+    backoff_rate: float = Field(DEFAULT_RETRY_BACKOFF_RATE, ge=1.0)
+    max_delay_seconds: Optional[int] = Field(DEFAULT_RETRY_MAX_DELAY_SECONDS, ge=1)
+    jitter: bool = True
+
+
+class CatchPolicy(BaseModel):
+    # Errors left after retrying are routed to next_function, which receives the
+    # step input with the error at result_path
+    errors: list[str] = Field(["States.ALL"], min_items=1)
+    next_function: str
+    result_path: Optional[str] = "$.error"
 
 
 class Function(BaseModel):
     name: str
     next_function: Optional[str | NextFunction] = None
+    cache_scope: Optional[str] = None
+    package_type: Optional[PackageTypes] = PackageTypes.IMAGE
+    runtime: Optional[str] = DEFAULT_LAMBDA_RUNTIME
+    dependency_layer: Optional[bool] = False
+    compute: Optional[ComputeProfile] = None
+    provisioned_concurrency: Optional[ProvisionedConcurrency] = None
+    # None retries Lambda service and throttling errors, an empty list never retries
+    retry: Optional[list[RetryPolicy]] = None
+    catch: Optional[list[CatchPolicy]] = None
+    timeout_seconds: Optional[int] = Field(None, ge=1)
+    heartbeat_seconds: Optional[int] = Field(None, ge=1)
+
+    @validator("cache_scope")
+    def check_cache_scope_is_image_tag(
+        cls, cache_scope: Optional[str]
+    ):  # pylint: disable=no-self-argument
+        # The scope is used as the tag of the function's build cache in ECR
+        if cache_scope is not None and not re.fullmatch(
+            r"[A-Za-z0-9_][A-Za-z0-9_.-]{0,127}", cache_scope
+        ):
+            raise ValueError(
+                f"Cache scope {cache_scope} is not a valid image tag, use up to 128 "
+                "letters, digits, underscores, periods and dashes"
+            )
+        return cache_scope
+
+    @validator("runtime")
+    def check_runtime_is_python(
+        cls, runtime: Optional[str]
+    ):  # pylint: disable=no-self-argument
+        if runtime is not None and not re.fullmatch(r"python3\.\d+", runtime):
+            raise ValueError(f"Runtime {runtime} is not a supported Python runtime")
+        return runtime
+
+    @root_validator(skip_on_failure=True)
+    def check_dependency_layer_is_zip(cls, values):  # pylint: disable=no-self-argument
+        if values["dependency_layer"] and values["package_type"] != PackageTypes.ZIP:
+            raise ValueError(
+                f"Function {values['name']} can only use a dependency layer when "
+                "packaged as a zip"
+            )
+        return values
+
+    @root_validator(skip_on_failure=True)
+    def check_heartbeat_within_timeout(cls, values):  # pylint: disable=no-self-argument
+        heartbeat, timeout = values["heartbeat_seconds"], values["timeout_seconds"]
+        if heartbeat is not None and timeout is not None and heartbeat >= timeout:
+            raise ValueError(
+                f"Function {values['name']} needs a heartbeat shorter than its timeout"
+            )
+        return values
+
+    @property
+    def retry_policies(self) -> list[RetryPolicy]:
+        if self.retry is None:
+            return [RetryPolicy(errors=DEFAULT_RETRY_ERRORS)]
+        return self.retry
+
+
+def step_exits(step) -> list[str]:
+    # Names of the steps a step hands over to once it has succeeded
+    if isinstance(step, Choice):
+        exits = [rule.next_function for rule in step.choices] + [step.default]
+    elif not isinstance(step.next_function, NextFunction):
+        exits = [step.next_function]
+    elif step.next_function.type == NextFunctionTypes.FUNCTION:
+        exits = [step.next_function.name]
+    else:
+        exits = [step.next_function.next_function]
+    return [name for name in exits if name is not None]
+
+
+def check_steps_are_reachable(steps: list) -> None:
+    # Steps form a chain from the first one, which only a choice can branch into
+    # several chains that each end the pipeline. Error handlers start their own.
+    if not steps:
+        return
+    names = {step.name: step for step in steps}
+    for step in steps:
+        for name in step_exits(step):
+            if name not in names:
+                raise ValueError(
+                    f"Step {step.name} leads to {name}, which is not a step of its "
+                    "chain"
+                )
+    reached, queue = set(), [steps[0].name]
+    while queue:
+        name = queue.pop()
+        if name in reached or name not in names:
+            continue
+        reached.add(name)
+        queue.extend(step_exits(names[name]))
+        if isinstance(names[name], Function):
+            queue.extend(policy.next_function for policy in names[name].catch or [])
+    unreachable = [step.name for step in steps if step.name not in reached]
+    if unreachable:
+        raise ValueError(
+            f"Steps {unreachable} are never run, each step must follow on from "
+            f"{steps[0].name}"
+        )
+
+
+def check_catch_targets_exist(steps: list) -> None:
+    # A catcher can only hand over to a step of its own chain, states inside a
+    # parallel branch cannot reach the steps around it
+    names = {step.name for step in steps}
+    for step in steps:
+        if not isinstance(step, Function):
+            continue
+        for policy in step.catch or []:
+            if policy.next_function not in names:
+                raise ValueError(
+                    f"Function {step.name} catches errors with "
+                    f"{policy.next_function}, which is not a step of its chain"
+                )
+
+
+class Parallel(BaseModel):
+    """
+    Runs branches of functions at the same time. The next function receives a list
+    holding the output of each branch, in the order of the branches.
+    """
+
+    name: str
+    branches: list[list[Function]] = Field(min_items=1)
+    next_function: Optional[str] = None
+
+    @validator("branches", each_item=True)
+    def check_branch_is_a_chain(
+        cls, branch: list[Function]
+    ):  # pylint: disable=no-self-argument
+        if not branch:
+            raise ValueError("A parallel branch needs at least one function")
+        check_catch_targets_exist(branch)
+        check_steps_are_reachable(branch)
+        return branch
+
+    @property
+    def functions(self) -> list[Function]:
+        return [function for branch in self.branches for function in branch]
+
+
+class MapModes(StrEnum):
+    INLINE = "Inline"
+    DISTRIBUTED = "Distributed"
+
+
+class ItemBatcher(BaseModel):
+    max_items_per_batch: Optional[int] = Field(None, ge=1)
+    max_input_bytes_per_batch: Optional[int] = Field(None, ge=1, le=262144)
+
+    @root_validator(skip_on_failure=True)
+    def check_a_limit_is_set(cls, values):  # pylint: disable=no-self-argument
+        if values["max_items_per_batch"] is None and (
+            values["max_input_bytes_per_batch"] is None
+        ):
+            raise ValueError("An item batcher needs a maximum item count or size")
+        return values
+
+
+class S3ItemReader(BaseModel):
+    # Lists the objects under key_prefix, or reads the objects named in an S3
+    # Inventory manifest
+    bucket_name: str
+    key_prefix: Optional[str] = None
+    manifest_key: Optional[str] = None
+    max_items: Optional[int] = Field(None, ge=1)
+
+    @root_validator(skip_on_failure=True)
+    def check_one_source(cls, values):  # pylint: disable=no-self-argument
+        if (values["key_prefix"] is None) == (values["manifest_key"] is None):
+            raise ValueError("Set exactly one of key_prefix or manifest_key")
+        return values
+
+
+class S3ResultWriter(BaseModel):
+    # Results of the child executions are written under key_prefix and the step
+    # only outputs where they were written
+    bucket_name: str
+    key_prefix: str
+
+
+class Map(BaseModel):
+    """
+    Runs a function once for each item of the step's input, or of the objects
+    read from S3 in distributed mode. The next function receives the list of
+    results.
+    """
+
+    name: str
+    function: Function
+    mode: Optional[MapModes] = MapModes.INLINE
+    items_path: Optional[str] = None
+    item_reader: Optional[S3ItemReader] = None
+    item_batcher: Optional[ItemBatcher] = None
+    max_concurrency: Optional[int] = Field(None, ge=0)
+    result_writer: Optional[S3ResultWriter] = None
+    # The next function receives the step's input instead of the results
+    discard_results: Optional[bool] = False
+    next_function: Optional[str] = None
+
+    @validator("function")
+    def check_function_is_single_step(
+        cls, function: Function
+    ):  # pylint: disable=no-self-argument
+        if function.next_function is not None or function.catch:
+            raise ValueError(
+                f"Function {function.name} runs alone for each item and cannot "
+                "have a next function or catch errors"
+            )
+        return function
+
+    @root_validator(skip_on_failure=True)
+    def check_distributed_options(cls, values):  # pylint: disable=no-self-argument
+        for option in ["item_reader", "item_batcher", "result_writer"]:
+            if values[option] is not None and values["mode"] != MapModes.DISTRIBUTED:
+                raise ValueError(f"{option} is only available in distributed mode")
+        if values["item_reader"] is not None and values["items_path"] is not None:
+            raise ValueError("Items are either read from S3 or taken from the input")
+        return values
+
+    @property
+    def functions(self) -> list[Function]:
+        return [self.function]
+
+
+class ChoiceOperators(StrEnum):
+    EQUALS = "equals"
+    NOT_EQUALS = "not_equals"
+    GREATER_THAN = "greater_than"
+    GREATER_THAN_EQUALS = "greater_than_equals"
+    LESS_THAN = "less_than"
+    LESS_THAN_EQUALS = "less_than_equals"
+    MATCHES = "matches"
+    IS_PRESENT = "is_present"
+    IS_NULL = "is_null"
+
+
+class ChoiceRule(BaseModel):
+    # The field of the previous output at variable is compared with value. Without
+    # a next function a matching rule ends the pipeline successfully.
+    variable: str
+    operator: ChoiceOperators
+    value: Optional[StrictBool | StrictInt | StrictFloat | StrictStr] = None
+    next_function: Optional[str] = None
+
+    @validator("variable")
+    def check_variable_is_a_path(
+        cls, variable: str
+    ):  # pylint: disable=no-self-argument
+        if not variable.startswith("$"):
+            raise ValueError("The variable of a choice rule must be a JSONPath")
+        return variable
+
+    @root_validator(skip_on_failure=True)
+    def check_value_fits_operator(cls, values):  # pylint: disable=no-self-argument
+        operator, value = values["operator"], values["value"]
+        if operator in [ChoiceOperators.IS_PRESENT, ChoiceOperators.IS_NULL]:
+            if value is None:
+                values["value"] = True
+            elif not isinstance(value, bool):
+                raise ValueError(f"The {operator} operator takes true or false")
+        elif value is None:
+            raise ValueError(f"The {operator} operator needs a value")
+        elif operator == ChoiceOperators.MATCHES and not isinstance(value, str):
+            raise ValueError("The matches operator takes a string pattern")
+        elif operator not in [
+            ChoiceOperators.EQUALS,
+            ChoiceOperators.NOT_EQUALS,
+        ] and isinstance(value, bool):
+            raise ValueError(f"The {operator} operator cannot compare booleans")
+        return values
+
+
+class Choice(BaseModel):
+    """
+    Routes on the previous function's output to the next function of the first
+    matching rule, or to default when none match. A rule or default without a
+    next function ends the pipeline successfully, skipping the remaining steps.
+    """
+
+    name: str
+    choices: list[ChoiceRule] = Field(min_items=1)
+    default: Optional[str] = None
+
+    @property
+    def succeed_state_name(self) -> str:
+        return f"{self.name}-succeed"
+
+    @property
+    def functions(self) -> list[Function]:
+        return []
+
+
+class WorkflowTypes(StrEnum):
+    STANDARD = "STANDARD"
+    EXPRESS = "EXPRESS"
+
+
+class LogLevels(StrEnum):
+    ALL = "ALL"
+    ERROR = "ERROR"
+    FATAL = "FATAL"
+    OFF = "OFF"
+
+
+class StateMachineLogging(BaseModel):
+    level: Optional[LogLevels] = LogLevels.ALL
+    include_execution_data: Optional[bool] = True
+    retention_days: Optional[int] = 30
+
+    @validator("retention_days")
+    def check_retention_days(
+        cls, retention_days: Optional[int]
+    ):  # pylint: disable=no-self-argument
+        if retention_days is not None and retention_days not in LOG_RETENTION_DAYS:
+            raise ValueError(
+                f"Log retention of {retention_days} days is not supported by "
+                "CloudWatch Logs"
+            )
+        return retention_days
+
+
+def flatten_functions(
+    steps: list[Parallel | Map | Choice | Function],
+) -> list[Function]:
+    functions = []
+    for step in steps:
+        functions.extend(step.functions if not isinstance(step, Function) else [step])
+    return functions
 
 
 class PipelineDefinition(BaseModel):
     file_path: str
     description: Optional[str] = ""
-    functions: list[Function]
+    # Steps are told apart by their required fields, anything else is a Function
+    functions: list[Parallel | Map | Choice | Function]
     trigger: Optional[S3Trigger | CronTrigger | rAPIdTrigger] = None
+    compute: Optional[ComputeProfile] = None
+    # Executions over the limit wait in the trigger queue until others finish
+    max_concurrent_executions: Optional[int] = Field(None, ge=1)
+    workflow_type: Optional[WorkflowTypes] = WorkflowTypes.STANDARD
+    logging: Optional[StateMachineLogging] = None
 
     @validator("functions")
-    def check_for_only_one_termination(
-        cls, functions: list[Function]
+    def check_steps_are_reachable(
+        cls, functions: list[Parallel | Map | Choice | Function]
     ):  # pylint: disable=no-self-argument
-        termination_steps = sum(
-            1 for function in functions if function.next_function is None
-        )
-        if termination_steps > 1:
+        check_steps_are_reachable(functions)
+        return functions
+
+    @validator("functions")
+    def check_catch_targets_exist(
+        cls, functions: list[Parallel | Map | Choice | Function]
+    ):  # pylint: disable=no-self-argument
+        check_catch_targets_exist(functions)
+        return functions
+
+    @validator("functions")
+    def check_step_names_are_unique(
+        cls, functions: list[Parallel | Map | Choice | Function]
+    ):  # pylint: disable=no-self-argument
+        names = [step.name for step in functions]
+        for step in functions:
+            if isinstance(step, Choice):
+                names.append(step.succeed_state_name)
+            if not isinstance(step, Function):
+                names.extend(function.name for function in step.functions)
+        duplicates = sorted({name for name in names if names.count(name) > 1})
+        if duplicates:
+            raise ValueError(f"Step names must be unique, found {duplicates}")
+        return functions
+
+    @root_validator(skip_on_failure=True)
+    def check_provisioned_concurrency_is_reserved(
+        cls, values
+    ):  # pylint: disable=no-self-argument
+        for function in flatten_functions(values["functions"]):
+            if function.provisioned_concurrency is None:
+                continue
+            reserved_concurrency = (
+                DEFAULT_COMPUTE_PROFILE.override(values["compute"])
+                .override(function.compute)
+                .reserved_concurrency
+            )
+            provisioned = function.provisioned_concurrency.concurrent_executions
+            if reserved_concurrency is not None and provisioned > reserved_concurrency:
+                raise ValueError(
+                    f"Function {function.name} provisions {provisioned} concurrent "
+                    f"executions but only reserves {reserved_concurrency}"
+                )
+        return values
+
+    @root_validator(skip_on_failure=True)
+    def check_express_workflow(cls, values):  # pylint: disable=no-self-argument
+        if values["workflow_type"] != WorkflowTypes.EXPRESS:
+            return values
+        for function in flatten_functions(values["functions"]):
+            next_function = function.next_function
+            if (
+                isinstance(next_function, NextFunction)
+                and next_function.type == NextFunctionTypes.PIPELINE
+                and next_function.mode == ChainModes.SYNC
+            ):
+                raise ValueError(
+                    f"Function {function.name} waits for pipeline "
+                    f"{next_function.name}, which express workflows cannot do"
+                )
+        for step in values["functions"]:
+            if isinstance(step, Map) and step.mode == MapModes.DISTRIBUTED:
+                raise ValueError(
+                    f"Map {step.name} is distributed, which express workflows "
+                    "cannot run"
+                )
+        # The dispatcher counts running executions, which express workflows
+        # do not record
+        if values["max_concurrent_executions"] is not None:
             raise ValueError(
-                "Pipeline definition can only contain one termination step"
+                "Express workflows cannot limit their concurrent executions"
             )
-        return functions
+        return values
+
+    @property
+    def trigger_batching(self) -> Optional[TriggerBatching]:
+        return getattr(self.trigger, "batching", None)
+
+    @property
+    def trigger_coalescing(self) -> Optional[TriggerCoalescing]:
+        return getattr(self.trigger, "coalescing", None)
+
+    @property
+    def is_trigger_queued(self) -> bool:
+        # Trigger events go through the dispatcher's queue to be limited, batched
+        # or coalesced
+        return (
+            self.max_concurrent_executions is not None
+            or self.trigger_batching is not None
+            or self.trigger_coalescing is not None
+        )
+
+    @property
+    def logging_configuration(self) -> Optional[StateMachineLogging]:
+        # Express workflows keep no execution history, so they always log
+        if self.logging is None and self.workflow_type == WorkflowTypes.EXPRESS:
+            return StateMachineLogging()
+        return self.logging
+
+    @property
+    def all_functions(self) -> list[Function]:
+        # Every function of the pipeline, including those run by other steps
+        return flatten_functions(self.functions)
+
+    def compute_profile(self, function: Optional[Function]) -> ComputeProfile:
+        return DEFAULT_COMPUTE_PROFILE.override(self.compute).override(
+            function.compute if function is not None else None
+        )
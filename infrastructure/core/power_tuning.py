@@ -0,0 +1,354 @@
+import argparse
+import ast
+import base64
+import json
+import os
+import re
+import time
+
+from enum import StrEnum
+from typing import Optional
+
+from pydantic import BaseModel  # pylint: disable=no-name-in-module
+
+from utils.aws_clients import aws_clients
+from utils.constants import (
+    DEFAULT_POWER_TUNING_MEMORY_SIZES,
+    LAMBDA_PRICE_PER_GB_SECOND,
+    LAMBDA_PRICE_PER_REQUEST,
+    SAMPLE_EVENT_FILE,
+)
+from utils.exceptions import PowerTuningException
+from utils.filesystem import extract_lambda_name_from_filepath, find_lambda_paths
+
+BILLED_DURATION_PATTERN = re.compile(r"Billed Duration: (\d+(?:\.\d+)?) ms")
+DEFINITION_MODULE = "infrastructure.core.models.definition"
+
+
+class TuningStrategies(StrEnum):
+    COST = "cost"
+    SPEED = "speed"
+    BALANCED = "balanced"
+
+
+class PowerTuningResult(BaseModel):
+    memory_size: int
+    # Averages over the measured invocations
+    duration_ms: float
+    cost: float
+
+
+class PowerTuner:
+    """
+    Measures a deployed function's billed duration and cost at each memory size by
+    invoking it with a sample event. The function's memory is restored afterwards.
+    """
+
+    def __init__(
+        self, lambda_client, invocations: int = 5, poll_interval: float = 1.0
+    ) -> None:
+        self.lambda_client = lambda_client
+        self.invocations = invocations
+        self.poll_interval = poll_interval
+
+    def wait_for_update(self, function_name: str) -> dict:
+        while True:
+            configuration = self.lambda_client.get_function_configuration(
+                FunctionName=function_name
+            )
+            if configuration.get("LastUpdateStatus", "Successful") != "InProgress":
+                return configuration
+            time.sleep(self.poll_interval)
+
+    def set_memory_size(self, function_name: str, memory_size: int) -> None:
+        self.lambda_client.update_function_configuration(
+            FunctionName=function_name, MemorySize=memory_size
+        )
+        self.wait_for_update(function_name)
+
+    def invoke(self, function_name: str, event: dict) -> float:
+        response = self.lambda_client.invoke(
+            FunctionName=function_name,
+            InvocationType="RequestResponse",
+            LogType="Tail",
+            Payload=json.dumps(event).encode(),
+        )
+        if "FunctionError" in response:
+            raise PowerTuningException(
+                f"Function {function_name} failed on the sample event: "
+                f"{response['FunctionError']}"
+            )
+        log = base64.b64decode(response["LogResult"]).decode()
+        match = BILLED_DURATION_PATTERN.search(log)
+        if match is None:
+            raise PowerTuningException(
+                f"No billed duration reported by function {function_name}"
+            )
+        return float(match.group(1))
+
+    def measure(
+        self, function_name: str, event: dict, memory_size: int, architecture: str
+    ) -> PowerTuningResult:
+        self.set_memory_size(function_name, memory_size)
+        # The first invocation after a configuration change is a cold start
+        self.invoke(function_name, event)
+        durations = [self.invoke(function_name, event) for _ in range(self.invocations)]
+        duration_ms = sum(durations) / len(durations)
+        return PowerTuningResult(
+            memory_size=memory_size,
+            duration_ms=duration_ms,
+            cost=calculate_cost(memory_size, duration_ms, architecture),
+        )
+
+    def tune(
+        self, function_name: str, event: dict, memory_sizes: list[int]
+    ) -> list[PowerTuningResult]:
+        configuration = self.wait_for_update(function_name)
+        architecture = configuration.get("Architectures", ["x86_64"])[0]
+        try:
+            return [
+                self.measure(function_name, event, memory_size, architecture)
+                for memory_size in memory_sizes
+            ]
+        finally:
+            self.set_memory_size(function_name, configuration["MemorySize"])
+
+
+def calculate_cost(memory_size: int, duration_ms: float, architecture: str) -> float:
+    gb_seconds = memory_size / 1024 * duration_ms / 1000
+    return gb_seconds * LAMBDA_PRICE_PER_GB_SECOND[architecture] + (
+        LAMBDA_PRICE_PER_REQUEST
+    )
+
+
+def recommend(
+    results: list[PowerTuningResult],
+    strategy: TuningStrategies = TuningStrategies.COST,
+) -> PowerTuningResult:
+    match strategy:
+        case TuningStrategies.COST:
+            return min(results, key=lambda result: (result.cost, result.duration_ms))
+        case TuningStrategies.SPEED:
+            return min(results, key=lambda result: (result.duration_ms, result.cost))
+        case TuningStrategies.BALANCED:
+            cheapest = min(result.cost for result in results)
+            fastest = min(result.duration_ms for result in results)
+            return min(
+                results,
+                key=lambda result: result.cost / cheapest
+                + result.duration_ms / fastest,
+            )
+
+
+def format_report(
+    function_name: str,
+    results: list[PowerTuningResult],
+    recommended: PowerTuningResult,
+) -> str:
+    lines = [
+        function_name,
+        f"{'Memory (MB)':>12} {'Duration (ms)':>14} {'Cost ($)':>14}",
+    ]
+    for result in results:
+        marker = " <- recommended" if result == recommended else ""
+        lines.append(
+            f"{result.memory_size:>12} {result.duration_ms:>14.1f} "
+            f"{result.cost:>14.10f}{marker}"
+        )
+    return "\n".join(lines)
+
+
+def is_call_to(node: ast.AST, name: str) -> bool:
+    if not isinstance(node, ast.Call):
+        return False
+    function = node.func
+    return (isinstance(function, ast.Name) and function.id == name) or (
+        isinstance(function, ast.Attribute) and function.attr == name
+    )
+
+
+def get_keyword(call: ast.Call, name: str) -> Optional[ast.keyword]:
+    return next((keyword for keyword in call.keywords if keyword.arg == name), None)
+
+
+def get_function_name(call: ast.Call) -> Optional[str]:
+    name = get_keyword(call, "name")
+    node = name.value if name is not None else next(iter(call.args), None)
+    if isinstance(node, ast.Constant) and isinstance(node.value, str):
+        return node.value
+    return None
+
+
+def write_memory_recommendations(
+    file_path: str, recommendations: dict[str, int]
+) -> list[str]:
+    """
+    Sets compute=ComputeProfile(memory_size=...) on the Function definitions in a
+    pipeline's __main__.py, keeping any other compute settings. Returns the names
+    of the functions that were updated.
+    """
+    with open(file_path, "rb") as file:
+        source = file.read()
+    tree = ast.parse(source)
+    line_starts = [0]
+    for line in source.splitlines(keepends=True):
+        line_starts.append(line_starts[-1] + len(line))
+
+    def start(node: ast.AST) -> int:
+        return line_starts[node.lineno - 1] + node.col_offset
+
+    def end(node: ast.AST) -> int:
+        return line_starts[node.end_lineno - 1] + node.end_col_offset
+
+    def last_argument_end(call: ast.Call) -> int:
+        return max(end(node) for node in [*call.args, *call.keywords])
+
+    edits: list[tuple[int, int, str]] = []
+    updated = []
+    for call in [node for node in ast.walk(tree) if is_call_to(node, "Function")]:
+        function_name = get_function_name(call)
+        if function_name not in recommendations:
+            continue
+        memory_size = recommendations[function_name]
+        profile = f"ComputeProfile(memory_size={memory_size})"
+        compute = get_keyword(call, "compute")
+        if compute is None:
+            position = last_argument_end(call)
+            edits.append((position, position, f", compute={profile}"))
+        elif is_call_to(compute.value, "ComputeProfile"):
+            memory = get_keyword(compute.value, "memory_size")
+            if memory is not None:
+                edits.append((start(memory.value), end(memory.value), str(memory_size)))
+            elif compute.value.args or compute.value.keywords:
+                position = last_argument_end(compute.value)
+                edits.append((position, position, f", memory_size={memory_size}"))
+            else:
+                position = end(compute.value) - 1
+                edits.append((position, position, f"memory_size={memory_size}"))
+        elif isinstance(compute.value, ast.Constant) and compute.value.value is None:
+            edits.append((start(compute.value), end(compute.value), profile))
+        else:
+            # The profile is built elsewhere, e.g. shared through a variable
+            continue
+        updated.append(function_name)
+
+    imported = any(
+        isinstance(node, ast.ImportFrom)
+        and any(alias.name == "ComputeProfile" for alias in node.names)
+        for node in ast.walk(tree)
+    )
+    if updated and not imported:
+        definition_import = next(
+            (
+                node
+                for node in tree.body
+                if isinstance(node, ast.ImportFrom) and node.module == DEFINITION_MODULE
+            ),
+            None,
+        )
+        import_line = f"from {DEFINITION_MODULE} import ComputeProfile"
+        if definition_import is not None:
+            position = end(definition_import)
+            edits.append((position, position, f"\n{import_line}"))
+        else:
+            edits.append((0, 0, f"{import_line}\n"))
+
+    for edit_start, edit_end, text in sorted(edits, reverse=True):
+        source = source[:edit_start] + text.encode() + source[edit_end:]
+    with open(file_path, "wb") as file:
+        file.write(source)
+    return updated
+
+
+def load_sample_event(function_path: str, default_event_path: Optional[str]) -> dict:
+    # A function's own recorded event takes precedence over the shared one
+    for path in [os.path.join(function_path, SAMPLE_EVENT_FILE), default_event_path]:
+        if path is not None and os.path.isfile(path):
+            with open(path) as file:
+                return json.load(file)
+    return {}
+
+
+def tune_pipeline(
+    tuner: PowerTuner,
+    pipeline_file_path: str,
+    source_code_folder: str,
+    project: str,
+    environment: str,
+    memory_sizes: list[int],
+    strategy: TuningStrategies = TuningStrategies.COST,
+    default_event_path: Optional[str] = None,
+) -> dict[str, PowerTuningResult]:
+    recommendations = {}
+    pipeline_path = os.path.dirname(pipeline_file_path)
+    for lambda_path in find_lambda_paths(pipeline_file_path, source_code_folder):
+        function_folder = os.path.basename(os.path.dirname(lambda_path))
+        function_name = (
+            f"{project}-{environment}-{extract_lambda_name_from_filepath(lambda_path)}"
+        )
+        event = load_sample_event(
+            os.path.join(pipeline_path, function_folder), default_event_path
+        )
+        results = tuner.tune(function_name, event, memory_sizes)
+        recommendations[function_folder] = recommend(results, strategy)
+        print(format_report(function_name, results, recommendations[function_folder]))
+    return recommendations
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Tune the memory size of a deployed pipeline's functions"
+    )
+    parser.add_argument("--layer", required=True)
+    parser.add_argument("--instance", required=True)
+    parser.add_argument("--env", required=True)
+    parser.add_argument("--project", required=True)
+    parser.add_argument("--region", default=None)
+    parser.add_argument("--source-code-folder", default="src")
+    parser.add_argument(
+        "--memory-sizes",
+        default=",".join(str(size) for size in DEFAULT_POWER_TUNING_MEMORY_SIZES),
+        help="Comma separated memory sizes in MB",
+    )
+    parser.add_argument("--invocations", type=int, default=5)
+    parser.add_argument(
+        "--strategy",
+        choices=[strategy.value for strategy in TuningStrategies],
+        default=TuningStrategies.COST,
+    )
+    parser.add_argument("--event", default=None, help="Fallback sample event file")
+    parser.add_argument(
+        "--no-write",
+        action="store_true",
+        help="Only report, do not update the pipeline definition",
+    )
+    args = parser.parse_args()
+
+    pipeline_file_path = os.path.join(
+        os.environ["CONFIG_REPO_PATH"],
+        args.source_code_folder,
+        args.layer,
+        args.instance,
+        "__main__.py",
+    )
+    tuner = PowerTuner(aws_clients.get("lambda", args.region), args.invocations)
+    recommendations = tune_pipeline(
+        tuner,
+        pipeline_file_path,
+        args.source_code_folder,
+        args.project,
+        args.env,
+        [int(size) for size in args.memory_sizes.split(",")],
+        TuningStrategies(args.strategy),
+        args.event,
+    )
+    if not args.no_write:
+        updated = write_memory_recommendations(
+            pipeline_file_path,
+            {name: result.memory_size for name, result in recommendations.items()},
+        )
+        print(f"Updated memory size of {', '.join(updated) or 'no functions'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,27 +1,47 @@
-import boto3
 import json
 
+from functools import cached_property
+
 import pulumi
 import pulumi_aws as aws
 
 from pulumi import ResourceOptions
+from typing import Optional
+
 from pulumi_aws import Provider
+from pulumi_aws.cloudwatch import LogGroup
+from pulumi_aws.iam import RolePolicy
 from pulumi_aws.sfn import StateMachine
 
 from infrastructure.core.models.definition import (
+    ChainModes,
+    Choice,
+    ChoiceOperators,
+    ChoiceRule,
+    Function,
     PipelineDefinition,
     NextFunction,
     NextFunctionTypes,
+    Map,
+    MapModes,
+    Parallel,
+    RetryPolicy,
+    S3ItemReader,
+    S3ResultWriter,
 )
 
 from utils.abstracts import CreateResourceBlock
+from utils.aws_clients import aws_clients
 from utils.config import Config
+from utils.constants import STATE_MACHINE_ARN
 from utils.exceptions import PipelineDoesNotExistException
 
 
 class CreatePipelineStateMachine(CreateResourceBlock):
     class Output(CreateResourceBlock.Output):
         state_machine: StateMachine
+        log_group: Optional[LogGroup] = None
+        item_access_policy: Optional[RolePolicy] = None
 
     def __init__(
         self,
@@ -32,7 +52,7 @@ class CreatePipelineStateMachine(CreateResourceBlock):
         pipeline_definition: PipelineDefinition,
         lambda_name_to_arn_map: dict,
         state_machine_role,
-        step_functions_client=boto3.client("stepfunctions"),
+        step_functions_client=None,
     ) -> None:
         super().__init__(config, aws_provider, environment)
         self.pipeline_name = pipeline_name
@@ -40,27 +60,164 @@ class CreatePipelineStateMachine(CreateResourceBlock):
         self.lambda_name_to_arn_map = lambda_name_to_arn_map
         self.state_machine_role = state_machine_role
         self.project = self.config.project
-        self.step_functions_client = step_functions_client
+        self._step_functions_client = step_functions_client
+        self.pipeline_name_to_arn_map = {}
+
+    @property
+    def step_functions_client(self):
+        # Only pipelines chained by name need to call Step Functions
+        if self._step_functions_client is None:
+            self._step_functions_client = aws_clients.get(
+                "stepfunctions", self.config.region
+            )
+        return self._step_functions_client
 
     def apply(self) -> Output:
-        state_machine_definition = pulumi.Output.from_input(
-            self.lambda_name_to_arn_map
-        ).apply(lambda arns: self.create_state_machine_definition(arns))
+        state_machine_definition = pulumi.Output.all(
+            self.lambda_name_to_arn_map, self.fetch_pipeline_arns_from_stacks()
+        ).apply(lambda arns: self.create_state_machine_definition(*arns))
         name = f"{self.project}-{self.environment}-{self.pipeline_name}"
+        logging = self.pipeline_definition.logging_configuration
+        log_group = self.create_log_group(name) if logging is not None else None
+        item_access_policy = self.create_item_access_policy(name)
         state_machine = aws.sfn.StateMachine(
             resource_name=name,
             name=name,
+            type=self.pipeline_definition.workflow_type,
             role_arn=self.state_machine_role,
             definition=state_machine_definition,
+            logging_configuration=(
+                aws.sfn.StateMachineLoggingConfigurationArgs(
+                    level=logging.level,
+                    include_execution_data=logging.include_execution_data,
+                    log_destination=log_group.arn.apply(lambda arn: f"{arn}:*"),
+                )
+                if logging is not None
+                else None
+            ),
+            opts=ResourceOptions(
+                provider=self.aws_provider,
+                depends_on=[item_access_policy] if item_access_policy else None,
+            ),
+        )
+
+        return self.Output(
+            state_machine=state_machine,
+            log_group=log_group,
+            item_access_policy=item_access_policy,
+        )
+
+    def create_log_group(self, name: str) -> LogGroup:
+        # The vendedlogs prefix keeps the log resource policy within its size limit
+        return aws.cloudwatch.LogGroup(
+            resource_name=f"{name}-logs",
+            name=f"/aws/vendedlogs/states/{name}",
+            retention_in_days=self.pipeline_definition.logging_configuration.retention_days,
+            opts=ResourceOptions(provider=self.aws_provider),
+        )
+
+    def create_item_access_policy(self, name: str) -> Optional[RolePolicy]:
+        # Distributed maps read their items from and write their results to S3 as
+        # the state machine role, which is shared by every pipeline so access is
+        # granted per pipeline here
+        statements = self.item_access_statements()
+        if not statements:
+            return None
+        return aws.iam.RolePolicy(
+            resource_name=f"{name}-item-access",
+            name=f"{name}-item-access",
+            role=pulumi.Output.from_input(self.state_machine_role).apply(
+                lambda arn: arn.split("/")[-1]
+            ),
+            policy=json.dumps({"Version": "2012-10-17", "Statement": statements}),
             opts=ResourceOptions(provider=self.aws_provider),
         )
 
-        return self.Output(state_machine=state_machine)
+    def item_access_statements(self) -> list[dict]:
+        statements = []
+        for step in self.pipeline_definition.functions:
+            if not isinstance(step, Map):
+                continue
+            writer = step.result_writer
+            if writer is not None:
+                statements.append(
+                    {
+                        "Effect": "Allow",
+                        "Action": [
+                            "s3:PutObject",
+                            "s3:GetObject",
+                            "s3:ListMultipartUploadParts",
+                            "s3:AbortMultipartUpload",
+                        ],
+                        "Resource": (
+                            f"arn:aws:s3:::{writer.bucket_name}/{writer.key_prefix}*"
+                        ),
+                    }
+                )
+            reader = step.item_reader
+            if reader is None:
+                continue
+            if reader.manifest_key is not None:
+                # The manifest names inventory files stored next to it
+                statements.append(
+                    {
+                        "Effect": "Allow",
+                        "Action": ["s3:GetObject"],
+                        "Resource": f"arn:aws:s3:::{reader.bucket_name}/*",
+                    }
+                )
+            else:
+                statements.append(
+                    {
+                        "Effect": "Allow",
+                        "Action": ["s3:ListBucket"],
+                        "Resource": f"arn:aws:s3:::{reader.bucket_name}",
+                        "Condition": {
+                            "StringLike": {"s3:prefix": f"{reader.key_prefix}*"}
+                        },
+                    }
+                )
+        return statements
+
+    def create_state_machine_definition(
+        self, name_to_arn_map: dict, pipeline_name_to_arn_map: Optional[dict] = None
+    ):
+        # ARNs of chained pipelines exported by their stacks
+        self.pipeline_name_to_arn_map = pipeline_name_to_arn_map or {}
+        states_map = self.create_states(
+            self.pipeline_definition.functions, name_to_arn_map
+        )
+
+        start_function_name = self.pipeline_definition.functions[0].name
 
-    def create_state_machine_definition(self, name_to_arn_map: dict):
+        return f"""{{
+            "Comment": "{self.pipeline_definition.description}",
+            "StartAt": "{start_function_name}",
+            "States": {json.dumps(states_map)}
+        }}"""
+
+    def create_states(
+        self, steps: list[Parallel | Map | Choice | Function], name_to_arn_map: dict
+    ) -> dict:
         states_map = {}
 
-        for pipeline in self.pipeline_definition.functions:
+        for pipeline in steps:
+            if isinstance(pipeline, Parallel):
+                states_map[pipeline.name] = self.create_parallel_state(
+                    pipeline, name_to_arn_map
+                )
+                continue
+
+            if isinstance(pipeline, Map):
+                states_map[pipeline.name] = self.create_map_state(
+                    pipeline, name_to_arn_map
+                )
+                continue
+
+            if isinstance(pipeline, Choice):
+                states_map.update(self.create_choice_states(pipeline))
+                continue
+
             # TODO: When defining a state function as the next trigger we don't need a function name
             # handle this case within the model and within this code
             next_function = pipeline.next_function
@@ -77,22 +234,203 @@ class CreatePipelineStateMachine(CreateResourceBlock):
 
                 elif next_function_type == NextFunctionTypes.PIPELINE:
                     # This function wants to call another state machine
-                    _map = self.create_pipeline_next_trigger_state(next_function_name)
+                    _map = self.create_pipeline_next_trigger_state(next_function)
+                    _map.update(self.create_task_policies(pipeline, lambda_task=False))
+                    states_map[pipeline.name] = _map
+                    continue
             else:
                 # Create a simple lambda function next trigger
                 _map = self.create_lambda_next_trigger_state(
                     name_to_arn_map[pipeline.name], next_function
                 )
 
+            _map.update(self.create_task_policies(pipeline))
             states_map[pipeline.name] = _map
 
-        start_function_name = self.pipeline_definition.functions[0].name
+        return states_map
 
-        return f"""{{
-            "Comment": "{self.pipeline_definition.description}",
-            "StartAt": "{start_function_name}",
-            "States": {json.dumps(states_map)}
-        }}"""
+    def create_task_policies(self, function: Function, lambda_task: bool = True):
+        # The default retries only cover Lambda errors
+        retry_policies = function.retry_policies if lambda_task else function.retry
+        policies = {}
+        if retry_policies:
+            policies["Retry"] = [
+                self.create_retrier(policy) for policy in retry_policies
+            ]
+        if function.catch:
+            policies["Catch"] = [
+                {
+                    "ErrorEquals": policy.errors,
+                    "Next": policy.next_function,
+                    "ResultPath": policy.result_path,
+                }
+                for policy in function.catch
+            ]
+        if function.timeout_seconds is not None:
+            policies["TimeoutSeconds"] = function.timeout_seconds
+        if function.heartbeat_seconds is not None:
+            policies["HeartbeatSeconds"] = function.heartbeat_seconds
+        return policies
+
+    def create_retrier(self, policy: RetryPolicy) -> dict:
+        retrier = {
+            "ErrorEquals": policy.errors,
+            "IntervalSeconds": policy.interval_seconds,
+            "MaxAttempts": policy.max_attempts,
+            "BackoffRate": policy.backoff_rate,
+            "JitterStrategy": "FULL" if policy.jitter else "NONE",
+        }
+        if policy.max_delay_seconds is not None:
+            retrier["MaxDelaySeconds"] = policy.max_delay_seconds
+        return retrier
+
+    def create_parallel_state(self, parallel: Parallel, name_to_arn_map: dict):
+        # Each branch is a chain of functions compiled like the pipeline itself
+        _map = {
+            "Type": "Parallel",
+            "Branches": [
+                {
+                    "StartAt": branch[0].name,
+                    "States": self.create_states(branch, name_to_arn_map),
+                }
+                for branch in parallel.branches
+            ],
+        }
+
+        if parallel.next_function is None:
+            _map["End"] = True
+        else:
+            _map["Next"] = parallel.next_function
+
+        return _map
+
+    def create_choice_states(self, choice: Choice) -> dict:
+        succeed_state = choice.succeed_state_name
+        _map = {
+            "Type": "Choice",
+            "Choices": [
+                {
+                    **self.create_choice_condition(rule),
+                    "Next": rule.next_function or succeed_state,
+                }
+                for rule in choice.choices
+            ],
+            "Default": choice.default or succeed_state,
+        }
+        states_map = {choice.name: _map}
+
+        exits = [rule.next_function for rule in choice.choices] + [choice.default]
+        if None in exits:
+            states_map[succeed_state] = {"Type": "Succeed"}
+
+        return states_map
+
+    def create_choice_condition(self, rule: ChoiceRule) -> dict:
+        if rule.operator == ChoiceOperators.IS_PRESENT:
+            return {"Variable": rule.variable, "IsPresent": rule.value}
+        if rule.operator == ChoiceOperators.IS_NULL:
+            return {"Variable": rule.variable, "IsNull": rule.value}
+        if rule.operator == ChoiceOperators.MATCHES:
+            return {"Variable": rule.variable, "StringMatches": rule.value}
+
+        if isinstance(rule.value, bool):
+            value_type = "Boolean"
+        elif isinstance(rule.value, str):
+            value_type = "String"
+        else:
+            value_type = "Numeric"
+        comparison = {
+            ChoiceOperators.EQUALS: "Equals",
+            ChoiceOperators.NOT_EQUALS: "Equals",
+            ChoiceOperators.GREATER_THAN: "GreaterThan",
+            ChoiceOperators.GREATER_THAN_EQUALS: "GreaterThanEquals",
+            ChoiceOperators.LESS_THAN: "LessThan",
+            ChoiceOperators.LESS_THAN_EQUALS: "LessThanEquals",
+        }[rule.operator]
+        condition = {"Variable": rule.variable, f"{value_type}{comparison}": rule.value}
+
+        if rule.operator == ChoiceOperators.NOT_EQUALS:
+            return {"Not": condition}
+        return condition
+
+    def create_map_state(self, map_step: Map, name_to_arn_map: dict):
+        function = map_step.function
+        processor_config = {"Mode": map_step.mode.upper()}
+        if map_step.mode == MapModes.DISTRIBUTED:
+            # Items run as child workflow executions
+            processor_config["ExecutionType"] = "STANDARD"
+
+        _map = {
+            "Type": "Map",
+            "ItemProcessor": {
+                "ProcessorConfig": processor_config,
+                "StartAt": function.name,
+                "States": self.create_states([function], name_to_arn_map),
+            },
+        }
+        if map_step.items_path is not None:
+            _map["ItemsPath"] = map_step.items_path
+        if map_step.item_reader is not None:
+            _map["ItemReader"] = self.create_item_reader(map_step.item_reader)
+        if map_step.item_batcher is not None:
+            _map["ItemBatcher"] = {
+                key: value
+                for key, value in {
+                    "MaxItemsPerBatch": map_step.item_batcher.max_items_per_batch,
+                    "MaxInputBytesPerBatch": (
+                        map_step.item_batcher.max_input_bytes_per_batch
+                    ),
+                }.items()
+                if value is not None
+            }
+        if map_step.max_concurrency is not None:
+            _map["MaxConcurrency"] = map_step.max_concurrency
+        if map_step.result_writer is not None:
+            _map["ResultWriter"] = self.create_result_writer(map_step.result_writer)
+        if map_step.discard_results:
+            # Collected results are limited to 256 KiB, like any state output
+            _map["ResultPath"] = None
+
+        if map_step.next_function is None:
+            _map["End"] = True
+        else:
+            _map["Next"] = map_step.next_function
+
+        return _map
+
+    def create_item_reader(self, item_reader: S3ItemReader):
+        reader_config = {}
+        if item_reader.manifest_key is not None:
+            reader = {
+                "Resource": "arn:aws:states:::s3:getObject",
+                "Parameters": {
+                    "Bucket": item_reader.bucket_name,
+                    "Key": item_reader.manifest_key,
+                },
+            }
+            reader_config["InputType"] = "MANIFEST"
+        else:
+            reader = {
+                "Resource": "arn:aws:states:::s3:listObjectsV2",
+                "Parameters": {
+                    "Bucket": item_reader.bucket_name,
+                    "Prefix": item_reader.key_prefix,
+                },
+            }
+        if item_reader.max_items is not None:
+            reader_config["MaxItems"] = item_reader.max_items
+        if reader_config:
+            reader["ReaderConfig"] = reader_config
+        return reader
+
+    def create_result_writer(self, result_writer: S3ResultWriter):
+        return {
+            "Resource": "arn:aws:states:::s3:putObject",
+            "Parameters": {
+                "Bucket": result_writer.bucket_name,
+                "Prefix": result_writer.key_prefix,
+            },
+        }
 
     def create_lambda_next_trigger_state(
         self, arn: str, next_function_name: str | None
@@ -106,24 +444,79 @@ class CreatePipelineStateMachine(CreateResourceBlock):
 
         return _map
 
+    @cached_property
+    def state_machine_arns(self) -> dict[str, str]:
+        # A single paginated listing resolves every chained pipeline by name
+        arns, arguments = {}, {}
+        while True:
+            response = self.step_functions_client.list_state_machines(**arguments)
+            arns.update(
+                (sfn["name"], sfn["stateMachineArn"])
+                for sfn in response["stateMachines"]
+            )
+            if not response.get("nextToken"):
+                return arns
+            arguments = {"nextToken": response["nextToken"]}
+
     def fetch_step_function_arn_from_name(self, name: str) -> str:
-        response = self.step_functions_client.list_state_machines()["stateMachines"]
-        for sfn in response:
-            if sfn["name"] == name:
-                arn = sfn["stateMachineArn"]
-                return arn
+        if name in self.pipeline_name_to_arn_map:
+            return self.pipeline_name_to_arn_map[name]
+        if name in self.state_machine_arns:
+            return self.state_machine_arns[name]
         raise PipelineDoesNotExistException(f"Could not find pipeline {name}")
 
-    def create_pipeline_next_trigger_state(self, next_function: str):
-        next_function_arn = self.fetch_step_function_arn_from_name(next_function)
-        _map = {
-            "Type": "Task",
-            "Resource": "arn:aws:states:::states:startExecution.sync:2",
-            "Parameters": {"StateMachineArn": next_function_arn},
-            "End": True,
-        }
+    def fetch_pipeline_arns_from_stacks(self) -> dict[str, pulumi.Output[str]]:
+        stack_references = {}
+        arns = {}
+        for function in self.pipeline_definition.all_functions:
+            next_function = function.next_function
+            if not isinstance(next_function, NextFunction) or not next_function.stack:
+                continue
+            stack = next_function.stack.replace("{environment}", self.environment)
+            if stack not in stack_references:
+                stack_references[stack] = pulumi.StackReference(stack)
+            arns[next_function.name] = stack_references[stack].require_output(
+                STATE_MACHINE_ARN
+            )
+        return arns
+
+    def create_pipeline_next_trigger_state(self, next_function: NextFunction):
+        next_function_arn = self.fetch_step_function_arn_from_name(next_function.name)
+        parameters = {"StateMachineArn": next_function_arn}
+        if next_function.input is not None:
+            parameters["Input"] = {
+                f"{field}.$": path for field, path in next_function.input.items()
+            }
+            # Links the child execution to this one in the console
+            parameters["Input"][
+                "AWS_STEP_FUNCTIONS_STARTED_BY_EXECUTION_ID.$"
+            ] = "$$.Execution.Id"
+
+        if next_function.mode == ChainModes.ASYNC:
+            _map = {
+                "Type": "Task",
+                "Resource": "arn:aws:states:::states:startExecution",
+                "Parameters": parameters,
+                # The next step receives this step's input, not the execution ARN
+                "ResultPath": None,
+            }
+        else:
+            _map = {
+                "Type": "Task",
+                "Resource": "arn:aws:states:::states:startExecution.sync:2",
+                "Parameters": parameters,
+            }
+            if next_function.next_function is not None:
+                # The next step receives the chained pipeline's output
+                _map["OutputPath"] = "$.Output"
+
+        if next_function.next_function is None:
+            _map["End"] = True
+        else:
+            _map["Next"] = next_function.next_function
 
         return _map
 
     def export(self):
-        pass
+        # Lets chained pipelines reference this one through a stack reference
+        pulumi.export(STATE_MACHINE_ARN, self.outputs.state_machine.arn)
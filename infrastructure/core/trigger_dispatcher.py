@@ -0,0 +1,202 @@
+import json
+
+from typing import Optional
+
+import pulumi
+import pulumi_aws as aws
+
+from pulumi import ResourceOptions
+from pulumi_aws import Provider
+from pulumi_aws.dynamodb import Table
+from pulumi_aws.lambda_ import EventSourceMapping, Function
+from pulumi_aws.sqs import Queue, QueuePolicy
+
+from infrastructure.core.models.definition import (
+    PipelineDefinition,
+    TriggerBatching,
+    TriggerCoalescing,
+)
+from utils.abstracts import CreateResourceBlock
+from utils.config import Config
+from utils.constants import (
+    DEFAULT_LAMBDA_RUNTIME,
+    DISPATCHER_SOURCE_FILE,
+    DISPATCHER_TIMEOUT,
+    LAMBDA_HANDLER,
+    TRIGGER_QUEUE_RETENTION_PERIOD,
+    TRIGGER_QUEUE_VISIBILITY_TIMEOUT,
+)
+
+
+class CreateTriggerDispatcher(CreateResourceBlock):
+    """
+    Queues a pipeline's trigger events and starts executions from the queue, one
+    per batch of events when the trigger is batched, and only while fewer than
+    the pipeline's max_concurrent_executions are running when it is set. A
+    coalesced trigger also gets a table of claimed event keys.
+    """
+
+    class Output(CreateResourceBlock.Output):
+        queue: Queue
+        queue_policy: QueuePolicy
+        dispatcher: Function
+        event_source_mapping: EventSourceMapping
+        claims_table: Optional[Table] = None
+
+    def __init__(
+        self,
+        config: Config,
+        aws_provider: Provider,
+        environment: str,
+        pipeline_name: str,
+        pipeline_definition: PipelineDefinition,
+        event_bridge_rule_arn,
+        dispatcher_role_arn,
+        state_machine_arn,
+    ) -> None:
+        super().__init__(config, aws_provider, environment)
+        self.pipeline_name = pipeline_name
+        self.pipeline_definition = pipeline_definition
+        self.event_bridge_rule_arn = event_bridge_rule_arn
+        self.dispatcher_role_arn = dispatcher_role_arn
+        self.state_machine_arn = state_machine_arn
+        self.project = self.config.project
+
+    @property
+    def name(self) -> str:
+        return f"{self.project}-{self.environment}-{self.pipeline_name}"
+
+    @property
+    def batching(self) -> Optional[TriggerBatching]:
+        return self.pipeline_definition.trigger_batching
+
+    @property
+    def coalescing(self) -> Optional[TriggerCoalescing]:
+        return self.pipeline_definition.trigger_coalescing
+
+    @property
+    def max_concurrent_executions(self) -> Optional[int]:
+        return self.pipeline_definition.max_concurrent_executions
+
+    def apply(self) -> Output:
+        queue = self.create_queue()
+        queue_policy = self.create_queue_policy(queue)
+        claims_table = (
+            self.create_claims_table() if self.coalescing is not None else None
+        )
+        dispatcher = self.create_dispatcher(claims_table)
+        event_source_mapping = self.create_event_source_mapping(queue, dispatcher)
+        return self.Output(
+            queue=queue,
+            queue_policy=queue_policy,
+            dispatcher=dispatcher,
+            event_source_mapping=event_source_mapping,
+            claims_table=claims_table,
+        )
+
+    def create_queue(self) -> Queue:
+        # No dead letter queue, events over the limit are received repeatedly
+        # while they wait and must not be moved aside
+        name = f"{self.name}-trigger-queue"
+        return aws.sqs.Queue(
+            resource_name=name,
+            name=name,
+            # Messages stay in flight while the batching window fills
+            visibility_timeout_seconds=TRIGGER_QUEUE_VISIBILITY_TIMEOUT
+            + (self.batching.window_seconds if self.batching is not None else 0),
+            message_retention_seconds=TRIGGER_QUEUE_RETENTION_PERIOD,
+            opts=ResourceOptions(provider=self.aws_provider),
+        )
+
+    def create_queue_policy(self, queue: Queue) -> QueuePolicy:
+        name = f"{self.name}-trigger-queue-policy"
+        policy = pulumi.Output.all(queue.arn, self.event_bridge_rule_arn).apply(
+            lambda args: json.dumps(
+                {
+                    "Version": "2012-10-17",
+                    "Statement": [
+                        {
+                            "Effect": "Allow",
+                            "Principal": {"Service": "events.amazonaws.com"},
+                            "Action": "sqs:SendMessage",
+                            "Resource": args[0],
+                            "Condition": {"ArnEquals": {"aws:SourceArn": args[1]}},
+                        }
+                    ],
+                }
+            )
+        )
+        return aws.sqs.QueuePolicy(
+            resource_name=name,
+            queue_url=queue.url,
+            policy=policy,
+            opts=ResourceOptions(provider=self.aws_provider),
+        )
+
+    def create_claims_table(self) -> Table:
+        # Expired claims are ignored by the dispatcher, TTL only tidies them away
+        name = f"{self.name}-trigger-claims"
+        return aws.dynamodb.Table(
+            resource_name=name,
+            name=name,
+            billing_mode="PAY_PER_REQUEST",
+            hash_key="pk",
+            attributes=[aws.dynamodb.TableAttributeArgs(name="pk", type="S")],
+            ttl=aws.dynamodb.TableTtlArgs(attribute_name="expires_at", enabled=True),
+            opts=ResourceOptions(provider=self.aws_provider),
+        )
+
+    def create_dispatcher(self, claims_table: Optional[Table] = None) -> Function:
+        name = f"{self.name}-dispatcher"
+        return aws.lambda_.Function(
+            resource_name=name,
+            name=name,
+            role=self.dispatcher_role_arn,
+            runtime=DEFAULT_LAMBDA_RUNTIME,
+            handler=LAMBDA_HANDLER,
+            code=pulumi.AssetArchive(
+                {"lambda.py": pulumi.FileAsset(DISPATCHER_SOURCE_FILE)}
+            ),
+            timeout=DISPATCHER_TIMEOUT,
+            # A single instance so admission checks never race each other
+            reserved_concurrent_executions=(
+                1 if self.max_concurrent_executions is not None else None
+            ),
+            environment={"variables": self.create_environment_variables(claims_table)},
+            opts=ResourceOptions(provider=self.aws_provider),
+        )
+
+    def create_environment_variables(
+        self, claims_table: Optional[Table] = None
+    ) -> dict:
+        variables = {"STATE_MACHINE_ARN": self.state_machine_arn}
+        if self.max_concurrent_executions is not None:
+            variables["MAX_CONCURRENT_EXECUTIONS"] = str(self.max_concurrent_executions)
+        if self.batching is not None:
+            variables["BATCH_EVENTS"] = "true"
+        if claims_table is not None:
+            variables["COALESCING_TABLE"] = claims_table.name
+            variables["COALESCING_KEY"] = ",".join(self.coalescing.key)
+            variables["COALESCING_WINDOW"] = str(self.coalescing.window_seconds)
+            variables["COALESCING_LEASE"] = str(DISPATCHER_TIMEOUT)
+        return variables
+
+    def create_event_source_mapping(
+        self, queue: Queue, dispatcher: Function
+    ) -> EventSourceMapping:
+        name = f"{self.name}-dispatcher-source"
+        return aws.lambda_.EventSourceMapping(
+            resource_name=name,
+            event_source_arn=queue.arn,
+            function_name=dispatcher.arn,
+            batch_size=self.batching.batch_size if self.batching is not None else 10,
+            maximum_batching_window_in_seconds=(
+                self.batching.window_seconds if self.batching is not None else None
+            ),
+            # Only the events over the limit return to the queue
+            function_response_types=["ReportBatchItemFailures"],
+            opts=ResourceOptions(provider=self.aws_provider),
+        )
+
+    def export(self):
+        pass
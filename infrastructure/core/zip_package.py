@@ -0,0 +1,147 @@
+import base64
+import hashlib
+import os
+import subprocess  # nosec B404
+import sys
+import tempfile
+import threading
+import zipfile
+
+from functools import lru_cache
+from typing import Callable, Optional
+
+from pydantic import BaseModel  # pylint: disable=no-name-in-module
+
+from utils.constants import DEFAULT_LAMBDA_RUNTIME
+from utils.exceptions import PackageBuildException
+from utils.hashing import file_digest
+
+# Fixed timestamp so identical content always produces an identical archive
+ZIP_ENTRY_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+
+
+def run_pip_command(arguments: list[str]) -> None:
+    try:
+        subprocess.run(  # nosec B603
+            [sys.executable, "-m", "pip", *arguments],
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+    except subprocess.CalledProcessError as exception:
+        raise PackageBuildException(
+            f"pip {arguments[0]} failed: {exception.stderr}"
+        ) from exception
+
+
+def write_zip(entries: list[tuple[str, str]], destination: str) -> None:
+    # entries are (source path, name in the archive) pairs
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    temporary_path = f"{destination}.tmp"
+    with zipfile.ZipFile(temporary_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        for path, name in sorted(entries, key=lambda entry: entry[1]):
+            info = zipfile.ZipInfo(name, date_time=ZIP_ENTRY_DATE_TIME)
+            info.compress_type = zipfile.ZIP_DEFLATED
+            mode = 0o755 if os.access(path, os.X_OK) else 0o644
+            info.external_attr = (0o100000 | mode) << 16
+            with open(path, "rb") as file:
+                archive.writestr(info, file.read())
+    os.replace(temporary_path, destination)
+
+
+def list_directory(directory: str, prefix: str = "") -> list[tuple[str, str]]:
+    entries = []
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = [folder for folder in dirs if folder != "__pycache__"]
+        for file in files:
+            path = os.path.join(root, file)
+            name = os.path.relpath(path, directory).replace(os.sep, "/")
+            entries.append((path, f"{prefix}{name}"))
+    return entries
+
+
+def hash_package_inputs(*values: str) -> str:
+    return hashlib.sha256("\0".join(values).encode()).hexdigest()
+
+
+class ZipPackage(BaseModel):
+    path: str
+    code_hash: str
+
+    @property
+    def source_code_hash(self) -> str:
+        # The format Lambda reports for deployed code, used to detect changes
+        return base64.b64encode(bytes.fromhex(file_digest(self.path))).decode()
+
+
+class ZipPackageBuilder:
+    """
+    Builds the zip artifacts of zip packaged functions and their dependency layers.
+    Artifacts are named after a hash of their content and reused while one with
+    the same hash exists, e.g. when deploying the same code to another environment.
+    """
+
+    def __init__(
+        self,
+        artifact_path: str,
+        runner: Callable[[list[str]], None] = run_pip_command,
+    ) -> None:
+        self.artifact_path = artifact_path
+        self.runner = runner
+        self._lock = threading.Lock()
+
+    def build(
+        self,
+        name: str,
+        code_hash: str,
+        entries: list[tuple[str, str]],
+        requirement_files: Optional[list[str]] = None,
+        runtime: str = DEFAULT_LAMBDA_RUNTIME,
+        architecture: str = "x86_64",
+        prefix: str = "",
+    ) -> ZipPackage:
+        package = ZipPackage(
+            path=os.path.join(self.artifact_path, f"{name}-{code_hash}.zip"),
+            code_hash=code_hash,
+        )
+        with self._lock:
+            if os.path.isfile(package.path):
+                return package
+
+            with tempfile.TemporaryDirectory() as target:
+                for requirements in requirement_files or []:
+                    self.install_requirements(
+                        requirements, target, runtime, architecture
+                    )
+                write_zip([*list_directory(target, prefix), *entries], package.path)
+        return package
+
+    def install_requirements(
+        self, requirements: str, target: str, runtime: str, architecture: str
+    ) -> None:
+        # Only wheels built for the Lambda platform can be installed
+        platform = "aarch64" if architecture == "arm64" else architecture
+        self.runner(
+            [
+                "install",
+                "--requirement",
+                requirements,
+                "--target",
+                target,
+                "--platform",
+                f"manylinux2014_{platform}",
+                "--implementation",
+                "cp",
+                "--python-version",
+                runtime.removeprefix("python"),
+                "--only-binary=:all:",
+                "--upgrade",
+                "--quiet",
+            ]
+        )
+
+
+@lru_cache(maxsize=None)
+def get_zip_package_builder(artifact_path: str) -> ZipPackageBuilder:
+    # Shared by every function in the program run so artifacts are built once
+    return ZipPackageBuilder(artifact_path)
@@ -11,6 +11,7 @@ from utils.constants import (
     STATE_FUNCTION_ROLE_ARN,
     LAMBDA_ROLE_ARN,
     CLOUDEVENT_STATE_MACHINE_TRIGGER_ROLE_ARN,
+    TRIGGER_DISPATCHER_ROLE_ARN,
 )
 
 
@@ -19,6 +20,7 @@ class CreateIamResource(CreateResourceBlock):
         lambda_function_role: Role
         state_function_role: Role
         cloudevent_state_machine_trigger_role: Role
+        trigger_dispatcher_role: Role
 
         additional_lambda_role_policy: Optional[RolePolicyAttachment]
         additional_state_function_role_policy: Optional[RolePolicyAttachment]
@@ -46,10 +48,14 @@ class CreateIamResource(CreateResourceBlock):
             cloudevent_state_machine_trigger_role.id
         )
 
+        trigger_dispatcher_role = self.create_trigger_dispatcher_role()
+        self.create_trigger_dispatcher_role_policy(trigger_dispatcher_role.id)
+
         output = self.Output(
             lambda_function_role=lambda_function_role,
             state_function_role=state_function_role,
             cloudevent_state_machine_trigger_role=cloudevent_state_machine_trigger_role,
+            trigger_dispatcher_role=trigger_dispatcher_role,
         )
 
         if self.config.additional_lambda_role_policy_arn is not None:
@@ -81,6 +87,9 @@ class CreateIamResource(CreateResourceBlock):
             CLOUDEVENT_STATE_MACHINE_TRIGGER_ROLE_ARN,
             self.outputs.cloudevent_state_machine_trigger_role.arn,
         )
+        pulumi.export(
+            TRIGGER_DISPATCHER_ROLE_ARN, self.outputs.trigger_dispatcher_role.arn
+        )
 
     def create_lambda_function_role(self):
         name = f"{self.project}-{self.environment}-lambda-role"
@@ -182,6 +191,20 @@ class CreateIamResource(CreateResourceBlock):
                             "events:DescribeRule"
                         ],
                         "Resource": "*"
+                    },
+                    {
+                        "Effect": "Allow",
+                        "Action": [
+                            "logs:CreateLogDelivery",
+                            "logs:GetLogDelivery",
+                            "logs:UpdateLogDelivery",
+                            "logs:DeleteLogDelivery",
+                            "logs:ListLogDeliveries",
+                            "logs:PutResourcePolicy",
+                            "logs:DescribeResourcePolicies",
+                            "logs:DescribeLogGroups"
+                        ],
+                        "Resource": "*"
                     }
                 ]
             }""",
@@ -230,6 +253,75 @@ class CreateIamResource(CreateResourceBlock):
             opts=ResourceOptions(provider=self.aws_provider),
         )
 
+    def create_trigger_dispatcher_role(self):
+        name = f"{self.project}-{self.environment}-trigger-dispatcher-role"
+        return aws.iam.Role(
+            resource_name=name,
+            name=name,
+            assume_role_policy="""{
+                "Version": "2012-10-17",
+                "Statement": [
+                    {
+                        "Action": "sts:AssumeRole",
+                        "Principal": {
+                            "Service": "lambda.amazonaws.com"
+                        },
+                        "Effect": "Allow",
+                        "Sid": ""
+                    }
+                ]
+            }""",
+            opts=ResourceOptions(provider=self.aws_provider),
+        )
+
+    def create_trigger_dispatcher_role_policy(self, trigger_dispatcher_role_id):
+        name = f"{self.project}-{self.environment}-trigger-dispatcher-policy"
+        return aws.iam.RolePolicy(
+            resource_name=name,
+            name=name,
+            role=trigger_dispatcher_role_id,
+            policy="""{
+                "Version": "2012-10-17",
+                "Statement": [
+                    {
+                        "Effect": "Allow",
+                        "Action": [
+                            "logs:CreateLogGroup",
+                            "logs:CreateLogStream",
+                            "logs:PutLogEvents"
+                        ],
+                        "Resource": "arn:aws:logs:*:*:*"
+                    },
+                    {
+                        "Effect": "Allow",
+                        "Action": [
+                            "sqs:ReceiveMessage",
+                            "sqs:DeleteMessage",
+                            "sqs:GetQueueAttributes"
+                        ],
+                        "Resource": "*"
+                    },
+                    {
+                        "Effect": "Allow",
+                        "Action": [
+                            "states:ListExecutions",
+                            "states:StartExecution"
+                        ],
+                        "Resource": "*"
+                    },
+                    {
+                        "Effect": "Allow",
+                        "Action": [
+                            "dynamodb:PutItem",
+                            "dynamodb:DeleteItem"
+                        ],
+                        "Resource": "*"
+                    }
+                ]
+            }""",
+            opts=ResourceOptions(provider=self.aws_provider),
+        )
+
     def apply_additional_lambda_role_policy(self, lambda_function_role: Role):
         name = f"{self.project}-{self.environment}-additional-lambda-attachment"
         policy_arn = self.to_output(self.config.additional_lambda_role_policy_arn)
@@ -4,7 +4,11 @@ from glob import glob
 from infrastructure.universal.ecr import CreateEcrResource
 from utils.abstracts import CreateInfrastructureBlock
 from utils.config import UniversalConfig
-from utils.constants import LAMBDA_HANDLER_FILE
+from utils.constants import (
+    BASE_IMAGE_REPOSITORY_NAME,
+    BUILD_CACHE_REPOSITORY_NAME,
+    LAMBDA_HANDLER_FILE,
+)
 from utils.filesystem import extract_lambda_name_from_filepath
 
 
@@ -12,9 +16,13 @@ class CreateUniversal(CreateInfrastructureBlock):
     def __init__(self, config: UniversalConfig) -> None:
         super().__init__(config, skip_environment_check=True)
         self.repo_list = self.retrieve_repo_list_from_folders()
+        if self.config.shared_base_image:
+            self.repo_list.append(BASE_IMAGE_REPOSITORY_NAME)
+        if self.config.registry_build_cache:
+            self.repo_list.append(BUILD_CACHE_REPOSITORY_NAME)
 
     def retrieve_repo_list_from_folders(self) -> list[str]:
-        return [
+        return sorted(
             extract_lambda_name_from_filepath(
                 path.replace(self.config.source_code_path, "")
             )
@@ -23,7 +31,7 @@ class CreateUniversal(CreateInfrastructureBlock):
                     self.config.source_code_path, "*", "*", "*", LAMBDA_HANDLER_FILE
                 )
             )
-        ]
+        )
 
     def apply(self):
         for repo in self.repo_list:
@@ -0,0 +1,229 @@
+"""
+Trigger dispatcher deployed by dorc in front of a pipeline's state machine.
+
+Trigger events are queued in SQS and this function starts the pipeline's
+executions from the queue. With BATCH_EVENTS set, each batch of S3 events starts
+a single execution receiving the bucket and the list of object keys.
+
+With MAX_CONCURRENT_EXECUTIONS set, executions are only started while fewer than
+that many are running. Events over the limit are reported back as failed batch
+items, so SQS makes them visible again after the visibility timeout and they
+wait in the queue instead of being dropped.
+
+With COALESCING_TABLE set, only the first event for a coalescing key within
+COALESCING_WINDOW seconds is dispatched and its duplicates are dropped. A key is
+first claimed for COALESCING_LEASE seconds and only held for the full window once
+its execution has started, so a dispatcher stopped in between cannot hold back
+the redelivered event.
+"""
+import hashlib
+import json
+import os
+import time
+
+from typing import Callable
+
+import boto3
+
+# Step Functions rejects execution input over 256 KiB, leave room for the envelope
+MAX_EXECUTION_INPUT_BYTES = 256 * 1024 - 1024
+
+
+def count_running_executions(client, state_machine_arn: str, limit: int) -> int:
+    # Counting stops at the limit, a pipeline at capacity needs no exact figure
+    count, next_token = 0, None
+    while True:
+        arguments = {"nextToken": next_token} if next_token else {}
+        response = client.list_executions(
+            stateMachineArn=state_machine_arn,
+            statusFilter="RUNNING",
+            maxResults=min(limit, 1000),
+            **arguments,
+        )
+        count += len(response["executions"])
+        next_token = response.get("nextToken")
+        if count >= limit or next_token is None:
+            return count
+
+
+class DynamoDBClaimStore:
+    """
+    Claims coalescing keys in a DynamoDB table. The conditional write only
+    succeeds when the key is unclaimed or its claim has expired, so concurrent
+    dispatchers can never both claim the same key.
+    """
+
+    def __init__(self, client, table_name: str) -> None:
+        self.client = client
+        self.table_name = table_name
+
+    def claim(self, key: str, now: int, expires_at: int) -> bool:
+        try:
+            self.client.put_item(
+                TableName=self.table_name,
+                Item={"pk": {"S": key}, "expires_at": {"N": str(expires_at)}},
+                ConditionExpression="attribute_not_exists(pk) OR expires_at <= :now",
+                ExpressionAttributeValues={":now": {"N": str(now)}},
+            )
+        except self.client.exceptions.ConditionalCheckFailedException:
+            return False
+        return True
+
+    def extend(self, key: str, expires_at: int) -> None:
+        self.client.put_item(
+            TableName=self.table_name,
+            Item={"pk": {"S": key}, "expires_at": {"N": str(expires_at)}},
+        )
+
+    def release(self, key: str) -> None:
+        self.client.delete_item(TableName=self.table_name, Key={"pk": {"S": key}})
+
+
+class Coalescer:
+    def __init__(
+        self,
+        store,
+        key_paths: list[str],
+        window_seconds: int,
+        lease_seconds: int,
+        clock: Callable[[], float] = time.time,
+    ) -> None:
+        self.store = store
+        self.key_paths = key_paths
+        self.window_seconds = window_seconds
+        self.lease_seconds = lease_seconds
+        self.clock = clock
+
+    def key(self, record: dict) -> str:
+        # Dotted paths into the event detail, e.g. object.key
+        detail = json.loads(record["body"])["detail"]
+        values = []
+        for path in self.key_paths:
+            value = detail
+            for field in path.split("."):
+                value = value.get(field) if isinstance(value, dict) else None
+            values.append(json.dumps(value))
+        return hashlib.sha256("\0".join(values).encode()).hexdigest()
+
+    def claim(self, record: dict) -> bool:
+        now = int(self.clock())
+        return self.store.claim(self.key(record), now, now + self.lease_seconds)
+
+    def extend(self, record: dict) -> None:
+        now = int(self.clock())
+        self.store.extend(self.key(record), now + self.window_seconds)
+
+    def release(self, record: dict) -> None:
+        self.store.release(self.key(record))
+
+
+def object_key(record: dict) -> str:
+    return json.loads(record["body"])["detail"]["object"]["key"]
+
+
+def group_records(records: list, batch_events: bool) -> list[list]:
+    # One execution per event, or per batch of events split to fit the input limit
+    if not batch_events:
+        return [[record] for record in records]
+    groups, size = [[]], 0
+    for record in records:
+        key_size = len(json.dumps(object_key(record))) + 2
+        if groups[-1] and size + key_size > MAX_EXECUTION_INPUT_BYTES:
+            groups.append([])
+            size = 0
+        groups[-1].append(record)
+        size += key_size
+    return [group for group in groups if group]
+
+
+def execution_input(group: list, batch_events: bool) -> str:
+    if not batch_events:
+        return group[0]["body"]
+    events = [json.loads(record["body"]) for record in group]
+    return json.dumps(
+        {
+            "bucket": events[0]["detail"]["bucket"]["name"],
+            "keys": [event["detail"]["object"]["key"] for event in events],
+        }
+    )
+
+
+def execution_name(group: list) -> str:
+    # Naming the execution after its messages makes redelivery idempotent
+    if len(group) == 1:
+        return group[0]["messageId"]
+    message_ids = "\0".join(record["messageId"] for record in group)
+    return hashlib.sha256(message_ids.encode()).hexdigest()
+
+
+def dispatch(
+    client,
+    state_machine_arn: str,
+    records: list,
+    max_concurrent_executions: int | None = None,
+    batch_events: bool = False,
+    coalescer: Coalescer | None = None,
+) -> list[dict]:
+    available = None
+    if max_concurrent_executions is not None:
+        available = max_concurrent_executions - count_running_executions(
+            client, state_machine_arn, max_concurrent_executions
+        )
+    failures = []
+    for group in group_records(records, batch_events):
+        if available is not None and available <= 0:
+            failures.extend({"itemIdentifier": record["messageId"]} for record in group)
+            continue
+        if coalescer is not None:
+            # Duplicates are dropped, which deletes them from the queue
+            group = [record for record in group if coalescer.claim(record)]
+            if not group:
+                continue
+        try:
+            client.start_execution(
+                stateMachineArn=state_machine_arn,
+                name=execution_name(group),
+                input=execution_input(group, batch_events),
+            )
+        except client.exceptions.ExecutionAlreadyExists:
+            started = False
+        except Exception:
+            # Let the retried events claim their keys again
+            if coalescer is not None:
+                for record in group:
+                    coalescer.release(record)
+            raise
+        else:
+            started = True
+        if coalescer is not None:
+            # The execution exists, hold its keys for the whole window
+            for record in group:
+                coalescer.extend(record)
+        if started and available is not None:
+            available -= 1
+    return failures
+
+
+def create_coalescer() -> Coalescer | None:
+    table_name = os.environ.get("COALESCING_TABLE")
+    if not table_name:
+        return None
+    return Coalescer(
+        DynamoDBClaimStore(boto3.client("dynamodb"), table_name),
+        os.environ["COALESCING_KEY"].split(","),
+        int(os.environ["COALESCING_WINDOW"]),
+        int(os.environ["COALESCING_LEASE"]),
+    )
+
+
+def handler(event, context):
+    max_concurrent_executions = os.environ.get("MAX_CONCURRENT_EXECUTIONS")
+    failures = dispatch(
+        boto3.client("stepfunctions"),
+        os.environ["STATE_MACHINE_ARN"],
+        event["Records"],
+        int(max_concurrent_executions) if max_concurrent_executions else None,
+        os.environ.get("BATCH_EVENTS") == "true",
+        create_coalescer(),
+    )
+    return {"batchItemFailures": failures}
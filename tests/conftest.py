@@ -5,6 +5,13 @@ import os
 import json
 
 from utils.config import UniversalConfig, Config, LayerConfig
+from utils.constants import (
+    LAMBDA_ROLE_ARN,
+    STATE_FUNCTION_ROLE_ARN,
+    CLOUDEVENT_STATE_MACHINE_TRIGGER_ROLE_ARN,
+    TRIGGER_DISPATCHER_ROLE_ARN,
+    STATE_MACHINE_ARN,
+)
 from infrastructure.core.models.definition import (
     PipelineDefinition,
     CronTrigger,
@@ -13,9 +20,19 @@ from infrastructure.core.models.definition import (
 from pulumi.runtime.mocks import MockCallArgs, MockResourceArgs
 from typing import List, Tuple
 
+MOCK_STACK_OUTPUTS = {
+    LAMBDA_ROLE_ARN: "mock:lambda:role:arn",
+    STATE_FUNCTION_ROLE_ARN: "mock:state-function:role:arn",
+    CLOUDEVENT_STATE_MACHINE_TRIGGER_ROLE_ARN: "mock:cloudevent:role:arn",
+    TRIGGER_DISPATCHER_ROLE_ARN: "mock:trigger-dispatcher:role:arn",
+    STATE_MACHINE_ARN: "mock:state-machine:arn",
+}
+
 
 class PulumiMocks(pulumi.runtime.Mocks):
     def new_resource(self, args: MockResourceArgs):
+        if args.typ == "pulumi:pulumi:StackReference":
+            return args.name, {**args.inputs, "outputs": MOCK_STACK_OUTPUTS}
         return args.name, args.inputs
 
     def call(self, args: MockCallArgs) -> Tuple[dict, List[Tuple[str, str]] | None]:
@@ -35,8 +52,12 @@ def mock_pulumi_config():
 
 
 @pytest.fixture
-def universal_config(monkeypatch) -> UniversalConfig:
+def universal_config(monkeypatch, tmp_path) -> UniversalConfig:
     monkeypatch.setenv("CONFIG_REPO_PATH", "./tests/mock_config_repo_src")
+    # Keep the hash manifest cache out of the mock config repo
+    monkeypatch.setattr(
+        "utils.config.HASH_MANIFEST_FILE", str(tmp_path / "hash-manifest.json")
+    )
     monkeypatch.setenv("UNIVERSAL_STACK_NAME", "universal")
     return UniversalConfig(
         region="eu-west-2",
@@ -1,7 +1,38 @@
 import pytest
 import json
 
-from infrastructure.core.models.definition import S3Trigger, CronTrigger, rAPIdTrigger
+from pydantic import ValidationError
+
+from infrastructure.core.models.definition import (
+    Architectures,
+    CatchPolicy,
+    ChainModes,
+    Choice,
+    ChoiceOperators,
+    ChoiceRule,
+    ComputeProfile,
+    CronTrigger,
+    Function,
+    ItemBatcher,
+    Map,
+    MapModes,
+    NextFunction,
+    NextFunctionTypes,
+    PackageTypes,
+    Parallel,
+    PipelineDefinition,
+    ProvisionedConcurrency,
+    RetryPolicy,
+    S3ItemReader,
+    S3ResultWriter,
+    S3Trigger,
+    StateMachineLogging,
+    TriggerBatching,
+    TriggerCoalescing,
+    WarmSchedule,
+    WorkflowTypes,
+    rAPIdTrigger,
+)
 
 
 class TestRapidTrigger:
@@ -81,3 +112,669 @@ class TestCronTrigger:
     def test_schedule_expression(self, cron_trigger):
         schedule_expression = cron_trigger.schedule_expression()
         assert schedule_expression == "cron(0/5 * * * ? *)"
+
+
+class TestFunction:
+    def test_cache_scope_defaults_to_none(self):
+        assert Function(name="function").cache_scope is None
+
+    @pytest.mark.parametrize("cache_scope", ["transforms", "layer-pipeline_1.0"])
+    def test_valid_cache_scope(self, cache_scope):
+        assert Function(name="function", cache_scope=cache_scope).cache_scope == (
+            cache_scope
+        )
+
+    @pytest.mark.parametrize("cache_scope", ["", "-scope", "scope/1", "a" * 129])
+    def test_invalid_cache_scope(self, cache_scope):
+        with pytest.raises(ValidationError):
+            Function(name="function", cache_scope=cache_scope)
+
+    def test_package_type_defaults_to_image(self):
+        function = Function(name="function")
+        assert function.package_type == PackageTypes.IMAGE
+        assert function.runtime == "python3.11"
+        assert not function.dependency_layer
+
+    def test_dependency_layer_requires_zip_package(self):
+        with pytest.raises(ValidationError):
+            Function(name="function", dependency_layer=True)
+        assert Function(
+            name="function", package_type=PackageTypes.ZIP, dependency_layer=True
+        ).dependency_layer
+
+    def test_invalid_runtime(self):
+        with pytest.raises(ValidationError):
+            Function(name="function", package_type="Zip", runtime="nodejs18.x")
+
+    def test_lambda_errors_retried_by_default(self):
+        (policy,) = Function(name="function").retry_policies
+        assert "Lambda.TooManyRequestsException" in policy.errors
+        assert policy.jitter
+        assert Function(name="function", retry=[]).retry_policies == []
+
+    def test_heartbeat_must_be_shorter_than_timeout(self):
+        with pytest.raises(ValidationError, match="heartbeat"):
+            Function(name="function", timeout_seconds=30, heartbeat_seconds=30)
+
+    @pytest.mark.parametrize(
+        "policy",
+        [{"backoff_rate": 0.5}, {"interval_seconds": 0}, {"errors": []}],
+    )
+    def test_invalid_retry_policy(self, policy):
+        with pytest.raises(ValidationError):
+            RetryPolicy(**policy)
+
+    def test_error_handler_ends_the_pipeline_on_its_own(self):
+        definition = PipelineDefinition(
+            file_path="__main__.py",
+            functions=[
+                Function(
+                    name="extract",
+                    next_function="load",
+                    catch=[CatchPolicy(next_function="report-failure")],
+                ),
+                Function(name="load"),
+                Function(name="report-failure"),
+            ],
+        )
+        assert [function.name for function in definition.all_functions] == [
+            "extract",
+            "load",
+            "report-failure",
+        ]
+
+    def test_error_handler_must_be_a_step(self):
+        with pytest.raises(ValidationError, match="report-failure"):
+            PipelineDefinition(
+                file_path="__main__.py",
+                functions=[
+                    Function(
+                        name="extract",
+                        catch=[CatchPolicy(next_function="report-failure")],
+                    ),
+                ],
+            )
+
+    def test_error_handler_must_be_in_the_same_branch(self):
+        with pytest.raises(ValidationError, match="not a step of its chain"):
+            Parallel(
+                name="transforms",
+                branches=[
+                    [
+                        Function(
+                            name="clean",
+                            catch=[CatchPolicy(next_function="report-failure")],
+                        )
+                    ],
+                    [Function(name="report-failure")],
+                ],
+            )
+
+
+class TestNextFunction:
+    def test_pipeline_can_be_found_by_stack(self):
+        next_function = NextFunction(
+            name="downstream",
+            type=NextFunctionTypes.PIPELINE,
+            stack="org/downstream/{environment}",
+        )
+        assert next_function.stack == "org/downstream/{environment}"
+
+    def test_function_cannot_be_found_by_stack(self):
+        with pytest.raises(ValidationError):
+            NextFunction(name="lambda-2", stack="org/downstream/dev")
+
+    def test_pipeline_chained_synchronously_by_default(self):
+        next_function = NextFunction(name="downstream", type=NextFunctionTypes.PIPELINE)
+        assert next_function.mode == ChainModes.SYNC
+        assert next_function.next_function is None
+        assert next_function.input is None
+
+    @pytest.mark.parametrize(
+        "options",
+        [{"mode": "async"}, {"next_function": "lambda-3"}, {"input": {"a": "$.a"}}],
+    )
+    def test_chaining_options_are_for_pipelines(self, options):
+        with pytest.raises(ValidationError):
+            NextFunction(name="lambda-2", **options)
+
+    def test_input_must_be_json_paths(self):
+        with pytest.raises(ValidationError):
+            NextFunction(
+                name="downstream",
+                type=NextFunctionTypes.PIPELINE,
+                input={"bucket": "bucket"},
+            )
+
+
+class TestComputeProfile:
+    def test_override(self):
+        profile = ComputeProfile(memory_size=1024, timeout=60)
+        assert profile.override(ComputeProfile(timeout=300)) == ComputeProfile(
+            memory_size=1024, timeout=300
+        )
+        assert profile.override(None) == profile
+
+    @pytest.mark.parametrize(
+        "values",
+        [
+            {"memory_size": 64},
+            {"memory_size": 10241},
+            {"ephemeral_storage": 256},
+            {"timeout": 0},
+            {"timeout": 901},
+            {"architecture": "arm32"},
+            {"reserved_concurrency": -1},
+        ],
+    )
+    def test_invalid_profile(self, values):
+        with pytest.raises(ValidationError):
+            ComputeProfile(**values)
+
+
+class TestPipelineDefinition:
+    def test_compute_profile_defaults(self):
+        definition = PipelineDefinition(
+            file_path="__main__.py", functions=[Function(name="function")]
+        )
+        assert definition.compute_profile(definition.functions[0]) == ComputeProfile(
+            memory_size=128,
+            ephemeral_storage=512,
+            timeout=600,
+            architecture=Architectures.X86_64,
+        )
+
+    def test_function_overrides_pipeline_compute_profile(self):
+        definition = PipelineDefinition(
+            file_path="__main__.py",
+            functions=[
+                Function(
+                    name="transform",
+                    next_function="load",
+                    compute=ComputeProfile(memory_size=3008),
+                ),
+                Function(name="load"),
+            ],
+            compute=ComputeProfile(memory_size=512, timeout=120),
+        )
+        assert definition.compute_profile(definition.functions[0]) == ComputeProfile(
+            memory_size=3008,
+            ephemeral_storage=512,
+            timeout=120,
+            architecture=Architectures.X86_64,
+        )
+        assert definition.compute_profile(definition.functions[1]).memory_size == 512
+
+    def test_pipeline_reserved_concurrency_applies_to_each_function(self):
+        definition = PipelineDefinition(
+            file_path="__main__.py",
+            functions=[
+                Function(
+                    name="transform",
+                    next_function="load",
+                    compute=ComputeProfile(reserved_concurrency=50),
+                ),
+                Function(name="load"),
+            ],
+            compute=ComputeProfile(reserved_concurrency=10),
+        )
+        assert [
+            definition.compute_profile(function).reserved_concurrency
+            for function in definition.functions
+        ] == [50, 10]
+
+    def test_provisioned_concurrency_within_reserved_concurrency(self):
+        with pytest.raises(ValidationError, match="only reserves 2"):
+            PipelineDefinition(
+                file_path="__main__.py",
+                functions=[
+                    Function(
+                        name="transform",
+                        provisioned_concurrency=ProvisionedConcurrency(
+                            concurrent_executions=5
+                        ),
+                    )
+                ],
+                compute=ComputeProfile(reserved_concurrency=2),
+            )
+
+    def test_max_concurrent_executions_must_be_positive(self):
+        with pytest.raises(ValidationError):
+            PipelineDefinition(
+                file_path="__main__.py", functions=[], max_concurrent_executions=0
+            )
+
+
+class TestProvisionedConcurrency:
+    def test_valid_schedule(self):
+        provisioned_concurrency = ProvisionedConcurrency(
+            concurrent_executions=5,
+            schedule=WarmSchedule(
+                start="cron(0 8 ? * MON-FRI *)", end="cron(0 18 ? * MON-FRI *)"
+            ),
+        )
+        assert provisioned_concurrency.schedule.timezone is None
+
+    def test_invalid_schedule_expression(self):
+        with pytest.raises(ValidationError):
+            WarmSchedule(start="0 8 * * *", end="cron(0 18 ? * MON-FRI *)")
+
+    def test_concurrent_executions_must_be_positive(self):
+        with pytest.raises(ValidationError):
+            ProvisionedConcurrency(concurrent_executions=0)
+
+
+class TestParallel:
+    def test_parallel_step_parsed_from_dict(self):
+        definition = PipelineDefinition.parse_obj(
+            {
+                "file_path": "__main__.py",
+                "functions": [
+                    {
+                        "name": "transforms",
+                        "branches": [[{"name": "clean"}], [{"name": "aggregate"}]],
+                        "next_function": "join",
+                    },
+                    {"name": "join"},
+                ],
+            }
+        )
+        assert isinstance(definition.functions[0], Parallel)
+        assert isinstance(definition.functions[1], Function)
+        assert [function.name for function in definition.all_functions] == [
+            "clean",
+            "aggregate",
+            "join",
+        ]
+
+    def test_branch_has_one_termination_step(self):
+        with pytest.raises(ValidationError):
+            Parallel(
+                name="transforms",
+                branches=[[Function(name="clean"), Function(name="enrich")]],
+            )
+
+    def test_branch_cannot_lead_outside_itself(self):
+        with pytest.raises(ValidationError, match="leads to join"):
+            PipelineDefinition(
+                file_path="__main__.py",
+                functions=[
+                    Parallel(
+                        name="transforms",
+                        branches=[[Function(name="clean", next_function="join")]],
+                        next_function="join",
+                    ),
+                    Function(name="join"),
+                ],
+            )
+
+    def test_branch_cannot_be_empty(self):
+        with pytest.raises(ValidationError):
+            Parallel(name="transforms", branches=[[Function(name="clean")], []])
+
+    def test_step_names_are_unique(self):
+        with pytest.raises(ValidationError, match="clean"):
+            PipelineDefinition(
+                file_path="__main__.py",
+                functions=[
+                    Function(name="clean", next_function="transforms"),
+                    Parallel(name="transforms", branches=[[Function(name="clean")]]),
+                ],
+            )
+
+
+class TestChoice:
+    def test_pipeline_with_choice(self):
+        definition = PipelineDefinition(
+            file_path="__main__.py",
+            functions=[
+                Function(name="fetch", next_function="check"),
+                Choice(
+                    name="check",
+                    choices=[
+                        ChoiceRule(
+                            variable="$.count",
+                            operator=ChoiceOperators.GREATER_THAN,
+                            value=0,
+                            next_function="process",
+                        )
+                    ],
+                ),
+                Function(name="process"),
+            ],
+        )
+        assert isinstance(definition.functions[1], Choice)
+        assert [function.name for function in definition.all_functions] == [
+            "fetch",
+            "process",
+        ]
+
+    def test_choice_branches_can_each_end_the_pipeline(self):
+        definition = PipelineDefinition(
+            file_path="__main__.py",
+            functions=[
+                Function(name="fetch", next_function="check"),
+                Choice(
+                    name="check",
+                    choices=[
+                        ChoiceRule(
+                            variable="$.complete",
+                            operator="equals",
+                            value=True,
+                            next_function="full",
+                        )
+                    ],
+                    default="partial",
+                ),
+                Function(name="full", next_function="publish"),
+                Function(name="publish"),
+                Function(name="partial"),
+            ],
+        )
+        assert [function.name for function in definition.all_functions] == [
+            "fetch",
+            "full",
+            "publish",
+            "partial",
+        ]
+
+    def test_steps_outside_the_branches_are_rejected(self):
+        with pytest.raises(ValidationError, match=r"\['archive'\] are never run"):
+            PipelineDefinition(
+                file_path="__main__.py",
+                functions=[
+                    Choice(
+                        name="check",
+                        choices=[
+                            ChoiceRule(
+                                variable="$.complete",
+                                operator="equals",
+                                value=True,
+                                next_function="full",
+                            )
+                        ],
+                        default="partial",
+                    ),
+                    Function(name="full"),
+                    Function(name="partial"),
+                    Function(name="archive"),
+                ],
+            )
+
+    def test_unknown_next_step_is_rejected(self):
+        with pytest.raises(ValidationError, match="leads to partail"):
+            PipelineDefinition(
+                file_path="__main__.py",
+                functions=[
+                    Choice(
+                        name="check",
+                        choices=[
+                            ChoiceRule(
+                                variable="$.complete",
+                                operator="equals",
+                                value=True,
+                                next_function="full",
+                            )
+                        ],
+                        default="partail",
+                    ),
+                    Function(name="full"),
+                    Function(name="partial"),
+                ],
+            )
+
+    def test_choice_needs_a_rule(self):
+        with pytest.raises(ValidationError):
+            Choice(name="check", choices=[])
+
+    def test_presence_checks_default_to_true(self):
+        rule = ChoiceRule(variable="$.keys", operator=ChoiceOperators.IS_PRESENT)
+        assert rule.value is True
+
+    def test_value_keeps_its_type(self):
+        rule = ChoiceRule(variable="$.count", operator="equals", value=1)
+        assert rule.value == 1 and not isinstance(rule.value, bool)
+
+    @pytest.mark.parametrize(
+        "variable, operator, value",
+        [
+            ("count", "equals", 0),
+            ("$.count", "equals", None),
+            ("$.count", "greater_than", True),
+            ("$.key", "matches", 1),
+            ("$.key", "is_null", "yes"),
+        ],
+    )
+    def test_invalid_rule(self, variable, operator, value):
+        with pytest.raises(ValidationError):
+            ChoiceRule(variable=variable, operator=operator, value=value)
+
+    def test_succeed_state_name_must_be_unique(self):
+        with pytest.raises(ValidationError, match="unique"):
+            PipelineDefinition(
+                file_path="__main__.py",
+                functions=[
+                    Choice(
+                        name="check",
+                        choices=[
+                            ChoiceRule(
+                                variable="$.empty",
+                                operator="equals",
+                                value=False,
+                                next_function="check-succeed",
+                            )
+                        ],
+                    ),
+                    Function(name="check-succeed"),
+                ],
+            )
+
+
+class TestMap:
+    def test_map_step_parsed_from_dict(self):
+        definition = PipelineDefinition.parse_obj(
+            {
+                "file_path": "__main__.py",
+                "functions": [
+                    {
+                        "name": "process_files",
+                        "function": {"name": "process_file"},
+                        "mode": "Distributed",
+                        "item_reader": {"bucket_name": "landing", "key_prefix": "in/"},
+                    }
+                ],
+            }
+        )
+        assert isinstance(definition.functions[0], Map)
+        assert definition.functions[0].mode == MapModes.DISTRIBUTED
+        assert [function.name for function in definition.all_functions] == [
+            "process_file"
+        ]
+
+    def test_function_cannot_have_next_function(self):
+        with pytest.raises(ValidationError):
+            Map(
+                name="process_files",
+                function=Function(name="process_file", next_function="report"),
+            )
+
+    def test_function_cannot_catch_errors(self):
+        with pytest.raises(ValidationError):
+            Map(
+                name="process_files",
+                function=Function(
+                    name="process_file",
+                    catch=[CatchPolicy(next_function="report")],
+                ),
+            )
+
+    @pytest.mark.parametrize(
+        "option",
+        [
+            {"item_reader": S3ItemReader(bucket_name="landing", key_prefix="in/")},
+            {"item_batcher": ItemBatcher(max_items_per_batch=10)},
+            {"result_writer": S3ResultWriter(bucket_name="results", key_prefix="out/")},
+        ],
+    )
+    def test_distributed_options_need_distributed_mode(self, option):
+        with pytest.raises(ValidationError, match="distributed mode"):
+            Map(name="process_files", function=Function(name="process_file"), **option)
+
+    def test_item_reader_needs_one_source(self):
+        with pytest.raises(ValidationError):
+            S3ItemReader(
+                bucket_name="landing", key_prefix="in/", manifest_key="manifest.json"
+            )
+        with pytest.raises(ValidationError):
+            S3ItemReader(bucket_name="landing")
+
+    def test_item_batcher_needs_a_limit(self):
+        with pytest.raises(ValidationError):
+            ItemBatcher()
+
+
+class TestWorkflowType:
+    def test_standard_by_default_without_logging(self):
+        definition = PipelineDefinition(
+            file_path="__main__.py", functions=[Function(name="load")]
+        )
+        assert definition.workflow_type == WorkflowTypes.STANDARD
+        assert definition.logging_configuration is None
+
+    def test_express_logs_by_default(self):
+        definition = PipelineDefinition(
+            file_path="__main__.py",
+            functions=[Function(name="load")],
+            workflow_type=WorkflowTypes.EXPRESS,
+        )
+        assert definition.logging_configuration == StateMachineLogging()
+
+    def test_express_rejects_pipeline_chaining(self):
+        with pytest.raises(ValidationError, match="waits for pipeline"):
+            PipelineDefinition(
+                file_path="__main__.py",
+                functions=[
+                    Function(
+                        name="load",
+                        next_function=NextFunction(
+                            name="report", type=NextFunctionTypes.PIPELINE
+                        ),
+                    )
+                ],
+                workflow_type=WorkflowTypes.EXPRESS,
+            )
+
+    def test_express_allows_async_pipeline_chaining(self):
+        definition = PipelineDefinition(
+            file_path="__main__.py",
+            functions=[
+                Function(
+                    name="load",
+                    next_function=NextFunction(
+                        name="report",
+                        type=NextFunctionTypes.PIPELINE,
+                        mode=ChainModes.ASYNC,
+                    ),
+                )
+            ],
+            workflow_type=WorkflowTypes.EXPRESS,
+        )
+        assert definition.workflow_type == WorkflowTypes.EXPRESS
+
+    def test_express_rejects_distributed_map(self):
+        with pytest.raises(ValidationError, match="distributed"):
+            PipelineDefinition(
+                file_path="__main__.py",
+                functions=[
+                    Map(
+                        name="process_files",
+                        function=Function(name="process_file"),
+                        mode=MapModes.DISTRIBUTED,
+                    )
+                ],
+                workflow_type=WorkflowTypes.EXPRESS,
+            )
+
+    def test_express_rejects_execution_limit(self):
+        with pytest.raises(ValidationError):
+            PipelineDefinition(
+                file_path="__main__.py",
+                functions=[Function(name="load")],
+                workflow_type=WorkflowTypes.EXPRESS,
+                max_concurrent_executions=5,
+            )
+
+    def test_invalid_log_retention(self):
+        with pytest.raises(ValidationError):
+            StateMachineLogging(retention_days=10)
+
+
+class TestTriggerBatching:
+    def test_batching_is_optional(self):
+        definition = PipelineDefinition(
+            file_path="__main__.py",
+            functions=[],
+            trigger=S3Trigger(name="landing", bucket_name="bucket", key_prefix="in/"),
+        )
+        assert definition.trigger_batching is None
+        assert not definition.is_trigger_queued
+
+    def test_batched_trigger_is_queued(self):
+        batching = TriggerBatching(batch_size=100, window_seconds=60)
+        definition = PipelineDefinition(
+            file_path="__main__.py",
+            functions=[],
+            trigger=rAPIdTrigger(domain="domain", name="name", batching=batching),
+        )
+        assert definition.trigger_batching == batching
+        assert definition.is_trigger_queued
+
+    def test_cron_trigger_is_not_batched(self):
+        definition = PipelineDefinition(
+            file_path="__main__.py",
+            functions=[],
+            trigger=CronTrigger(name="cron", cron="cron(0 8 * * ? *)"),
+        )
+        assert definition.trigger_batching is None
+
+    @pytest.mark.parametrize(
+        "values",
+        [
+            {"batch_size": 0},
+            {"batch_size": 10001, "window_seconds": 60},
+            {"batch_size": 100},
+            {"batch_size": 10, "window_seconds": 301},
+        ],
+    )
+    def test_invalid_batching(self, values):
+        with pytest.raises(ValidationError):
+            TriggerBatching(**values)
+
+
+class TestTriggerCoalescing:
+    def test_coalesced_trigger_is_queued(self):
+        definition = PipelineDefinition(
+            file_path="__main__.py",
+            functions=[],
+            trigger=S3Trigger(
+                name="landing",
+                bucket_name="bucket",
+                key_prefix="in/",
+                coalescing=TriggerCoalescing(window_seconds=30),
+            ),
+        )
+        assert definition.trigger_coalescing.key == ["bucket.name", "object.key"]
+        assert definition.is_trigger_queued
+
+    @pytest.mark.parametrize(
+        "values",
+        [
+            {"window_seconds": 0},
+            {"window_seconds": 30, "key": []},
+            {"window_seconds": 30, "key": ["object.key,etag"]},
+            {"window_seconds": 30, "key": ["object..key"]},
+        ],
+    )
+    def test_invalid_coalescing(self, values):
+        with pytest.raises(ValidationError):
+            TriggerCoalescing(**values)
@@ -0,0 +1,169 @@
+import pytest
+
+from mock import MagicMock, patch
+
+from infrastructure.core.base_image import PipelineBaseImage
+from infrastructure.core.image_builder import ImageBuild, RegistryCredentials
+from infrastructure.core.image_registry import ImageRegistry
+from tests.mock import FakeEcrClient, MockedEcrAuthentication
+from utils.constants import DEFAULT_BASE_IMAGE_DOCKERFILE
+
+BASE_REPOSITORY_URL = (
+    "123456789012.dkr.ecr.eu-west-2.amazonaws.com/test-pipelines-base-image"
+)
+
+
+class TestPipelineBaseImage:
+    @pytest.fixture
+    def config_repo(self, tmp_path, config):
+        pipeline_path = tmp_path / "src" / "layer" / "test"
+        pipeline_path.mkdir(parents=True)
+        (pipeline_path / "requirements.txt").write_text("pyarrow")
+        (tmp_path / "requirements.txt").write_text("pandas")
+        config.universal.config_repo_path = str(tmp_path)
+        return tmp_path
+
+    @pytest.fixture
+    def base_image(self, config, config_repo) -> PipelineBaseImage:
+        return PipelineBaseImage(
+            config, MagicMock(), "layer", "test", ImageRegistry(FakeEcrClient())
+        )
+
+    def test_requirement_files(self, base_image: PipelineBaseImage, config_repo):
+        assert base_image.requirement_files == [
+            str(config_repo / "requirements.txt"),
+            str(config_repo / "src" / "layer" / "test" / "requirements.txt"),
+        ]
+
+    def test_dockerfile_defaults_to_template(self, base_image: PipelineBaseImage):
+        assert base_image.dockerfile == DEFAULT_BASE_IMAGE_DOCKERFILE
+
+    def test_dockerfile_can_be_overridden(
+        self, base_image: PipelineBaseImage, config_repo
+    ):
+        (config_repo / "src" / "Dockerfile.base").write_text("FROM python")
+        assert base_image.dockerfile == str(config_repo / "src" / "Dockerfile.base")
+
+    def test_code_hash_tracks_requirements(self, config, config_repo):
+        create = lambda: PipelineBaseImage(  # noqa: E731
+            config, MagicMock(), "layer", "test", ImageRegistry(FakeEcrClient())
+        )
+        code_hash = create().code_hash("linux/amd64")
+        (config_repo / "src" / "layer" / "test" / "requirements.txt").write_text(
+            "pyarrow==14.0.0"
+        )
+        assert create().code_hash("linux/amd64") != code_hash
+
+    def test_code_hash_independent_of_dorc_location(self, config, tmp_path):
+        code_hashes = []
+        for config_repo in [tmp_path / "repo", tmp_path / "ci" / "work" / "repo"]:
+            (config_repo / "src" / "layer" / "test").mkdir(parents=True)
+            (config_repo / "requirements.txt").write_text("pandas")
+            config.universal.config_repo_path = str(config_repo)
+            base_image = PipelineBaseImage(
+                config, MagicMock(), "layer", "test", ImageRegistry(FakeEcrClient())
+            )
+            assert base_image.dockerfile == DEFAULT_BASE_IMAGE_DOCKERFILE
+            code_hashes.append(base_image.code_hash("linux/amd64"))
+
+        assert code_hashes[0] == code_hashes[1]
+
+    def test_code_hash_tracks_platform(self, base_image: PipelineBaseImage):
+        assert base_image.code_hash("linux/amd64") != base_image.code_hash(
+            "linux/arm64"
+        )
+
+    @patch("infrastructure.core.base_image.get_image_build_scheduler")
+    def test_submit_builds_base_image(
+        self,
+        mock_get_image_build_scheduler: MagicMock,
+        base_image: PipelineBaseImage,
+        config_repo,
+    ):
+        registry_info = MockedEcrAuthentication(
+            password="mock_password",  # pragma: allowlist secret
+            user_name="mock_username",  # pragma: allowlist secret
+        )
+
+        result = base_image.submit(BASE_REPOSITORY_URL, registry_info, "linux/arm64")
+
+        scheduler = mock_get_image_build_scheduler.return_value
+        assert result == scheduler.submit.return_value
+        code_hash = base_image.code_hash("linux/arm64")
+        image_name = f"{BASE_REPOSITORY_URL}:{code_hash}"
+        scheduler.submit.assert_called_once_with(
+            ImageBuild(
+                image_name=image_name,
+                dockerfile=DEFAULT_BASE_IMAGE_DOCKERFILE,
+                context=str(
+                    config_repo / ".dorc" / "contexts" / "layer-test-base-arm64"
+                ),
+                context_digest=code_hash,
+                platform="linux/arm64",
+                registry=RegistryCredentials(
+                    server="123456789012.dkr.ecr.eu-west-2.amazonaws.com",
+                    username="mock_username",
+                    password="mock_password",  # pragma: allowlist secret
+                ),
+                build_args={
+                    "PIPELINE_PATH": "src/layer/test",
+                    "BUILDKIT_INLINE_CACHE": "1",
+                },
+                cache_from=[image_name],
+            )
+        )
+        assert (
+            config_repo
+            / ".dorc"
+            / "contexts"
+            / "layer-test-base-arm64"
+            / "requirements.txt"
+        ).exists()
+
+    @patch("infrastructure.core.base_image.create_build_context", return_value="ctx")
+    @patch("infrastructure.core.base_image.get_image_build_scheduler")
+    def test_submit_builds_each_platform_once(
+        self,
+        mock_get_image_build_scheduler: MagicMock,
+        mock_create_build_context: MagicMock,
+        base_image: PipelineBaseImage,
+    ):
+        registry_info = MockedEcrAuthentication(
+            password="mock_password",  # pragma: allowlist secret
+            user_name="mock_username",  # pragma: allowlist secret
+        )
+        scheduler = mock_get_image_build_scheduler.return_value
+        scheduler.submit.side_effect = lambda build: MagicMock()
+
+        builds = [
+            base_image.submit(BASE_REPOSITORY_URL, registry_info, platform)
+            for platform in ["linux/amd64", "linux/amd64", "linux/arm64"]
+        ]
+
+        assert builds[0] is builds[1]
+        assert builds[0] is not builds[2]
+        assert scheduler.submit.call_count == 2
+        assert mock_create_build_context.call_count == 2
+
+    @patch("infrastructure.core.base_image.get_image_build_scheduler")
+    def test_submit_skips_existing_base_image(
+        self, mock_get_image_build_scheduler: MagicMock, config, config_repo
+    ):
+        base_image = PipelineBaseImage(
+            config, MagicMock(), "layer", "test", ImageRegistry(FakeEcrClient())
+        )
+        base_image.image_registry = ImageRegistry(
+            FakeEcrClient(
+                {
+                    (
+                        "test-pipelines-base-image",
+                        base_image.code_hash("linux/amd64"),
+                    ): "sha256:abcd"
+                }
+            )
+        )
+
+        assert (
+            base_image.submit(BASE_REPOSITORY_URL, MagicMock(), "linux/amd64") is None
+        )
+        mock_get_image_build_scheduler.assert_not_called()
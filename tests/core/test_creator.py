@@ -1,8 +1,16 @@
 import pytest
 
-from mock import MagicMock, patch
+from mock import MagicMock, call, patch
 from infrastructure.core.creator import CreatePipeline
-from infrastructure.core.models.definition import PipelineDefinition, rAPIdTrigger
+from infrastructure.core.models.definition import (
+    Function,
+    PackageTypes,
+    Parallel,
+    PipelineDefinition,
+    S3Trigger,
+    TriggerBatching,
+    rAPIdTrigger,
+)
 from utils.config import Config, rAPIdConfig
 from utils.exceptions import InvalidConfigDefinitionException
 from utils.constants import (
@@ -89,6 +97,52 @@ class TestCreatePipeline:
         res = pipeline_infrastructure_block.fetch_lambda_paths()
         assert res == ["layer/test/lambda1/lambda.py", "layer/test/lambda2/lambda.py"]
 
+    @pytest.mark.usefixtures("pipeline_infrastructure_block")
+    def test_apply_declares_pipeline_resources_eagerly(
+        self, pipeline_infrastructure_block: CreatePipeline
+    ):
+        lambda_outputs = [
+            MagicMock(invocation_arn="lambda1-arn"),
+            MagicMock(invocation_arn="lambda2-arn"),
+        ]
+        lambda_outputs[0].name = "lambda1"
+        lambda_outputs[1].name = "lambda2"
+        lambda_function_block = MagicMock(package_type=PackageTypes.IMAGE)
+        lambda_function_block.apply.side_effect = lambda_outputs
+        state_machine_block = MagicMock()
+        pipeline_infrastructure_block.apply_lambda_function = MagicMock(
+            return_value=lambda_function_block
+        )
+        pipeline_infrastructure_block.apply_state_machine = MagicMock(
+            return_value=state_machine_block
+        )
+        pipeline_infrastructure_block.apply_state_machine_trigger = MagicMock()
+        pipeline_infrastructure_block.image_registry = MagicMock()
+
+        pipeline_infrastructure_block.apply()
+
+        assert pipeline_infrastructure_block.apply_lambda_function.call_args_list == [
+            call("layer/test/lambda1/lambda.py", None),
+            call("layer/test/lambda2/lambda.py", None),
+        ]
+        pipeline_infrastructure_block.image_registry.prefetch.assert_called_once_with(
+            [
+                (
+                    lambda_function_block.repository_url.return_value,
+                    lambda_function_block.image_source.__getitem__.return_value,
+                )
+            ]
+            * 2
+        )
+        pipeline_infrastructure_block.apply_state_machine.assert_called_once_with(
+            {"lambda1": "lambda1-arn", "lambda2": "lambda2-arn"}
+        )
+        state_machine_block.exec.assert_called_once()
+        state_machine_block.export.assert_called_once()
+        pipeline_infrastructure_block.apply_state_machine_trigger.assert_called_once_with(
+            state_machine_block.outputs
+        )
+
     @pytest.mark.usefixtures(
         "mock_pulumi", "mock_pulumi_config", "config", "pipeline_definition"
     )
@@ -161,3 +215,93 @@ class TestCreatePipeline:
             pipeline_infrastructure_block.create_new_rapid_client_or_fetch_details()
             == "mock_return"
         )
+
+    @pytest.mark.usefixtures("pipeline_infrastructure_block")
+    def test_get_function_definition(self, pipeline_infrastructure_block):
+        function = Function(name="lambda1", cache_scope="scope")
+        pipeline_infrastructure_block.pipeline_definition.functions = [function]
+
+        assert (
+            pipeline_infrastructure_block.get_function_definition(
+                "layer/test/lambda1/lambda.py"
+            )
+            == function
+        )
+        assert (
+            pipeline_infrastructure_block.get_function_definition(
+                "layer/test/lambda2/lambda.py"
+            )
+            is None
+        )
+
+    @pytest.mark.usefixtures("pipeline_infrastructure_block")
+    def test_get_function_definition_in_parallel_branch(
+        self, pipeline_infrastructure_block
+    ):
+        function = Function(name="lambda2", cache_scope="scope")
+        pipeline_infrastructure_block.pipeline_definition.functions = [
+            Function(name="lambda1", next_function="branches"),
+            Parallel(name="branches", branches=[[function]]),
+        ]
+
+        assert (
+            pipeline_infrastructure_block.get_function_definition(
+                "layer/test/lambda2/lambda.py"
+            )
+            == function
+        )
+
+    @pytest.mark.usefixtures("pipeline_infrastructure_block")
+    @patch("infrastructure.core.creator.CreateEventBridgeTarget")
+    def test_trigger_targets_state_machine(
+        self, mock_target, pipeline_infrastructure_block: CreatePipeline
+    ):
+        pipeline_infrastructure_block.cloudevent_bridge_rule = MagicMock()
+        state_machine_outputs = MagicMock()
+
+        pipeline_infrastructure_block.apply_state_machine_trigger(state_machine_outputs)
+
+        role_arn, target_arn = mock_target.call_args.args[-2:]
+        assert role_arn == pipeline_infrastructure_block.cloudevent_trigger_role_arn
+        assert target_arn == state_machine_outputs.state_machine.arn
+
+    @pytest.mark.usefixtures("pipeline_infrastructure_block")
+    @patch("infrastructure.core.creator.CreateTriggerDispatcher")
+    @patch("infrastructure.core.creator.CreateEventBridgeTarget")
+    def test_trigger_with_execution_limit_targets_queue(
+        self, mock_target, mock_dispatcher, pipeline_infrastructure_block
+    ):
+        pipeline_infrastructure_block.pipeline_definition.max_concurrent_executions = 5
+        pipeline_infrastructure_block.cloudevent_bridge_rule = MagicMock()
+        rule = pipeline_infrastructure_block.cloudevent_bridge_rule
+        state_machine_outputs = MagicMock()
+
+        pipeline_infrastructure_block.apply_state_machine_trigger(state_machine_outputs)
+
+        dispatcher_args = mock_dispatcher.call_args.args
+        assert dispatcher_args[-3] == rule.outputs.cloudwatch_event_rule.arn
+        assert dispatcher_args[-1] == state_machine_outputs.state_machine.arn
+        mock_dispatcher.return_value.exec.assert_called_once()
+        role_arn, target_arn = mock_target.call_args.args[-2:]
+        assert role_arn is None
+        assert target_arn == mock_dispatcher.return_value.outputs.queue.arn
+
+    @pytest.mark.usefixtures("pipeline_infrastructure_block")
+    @patch("infrastructure.core.creator.CreateTriggerDispatcher")
+    @patch("infrastructure.core.creator.CreateEventBridgeTarget")
+    def test_batched_trigger_targets_queue(
+        self, mock_target, mock_dispatcher, pipeline_infrastructure_block
+    ):
+        pipeline_infrastructure_block.pipeline_definition.trigger = S3Trigger(
+            name="landing",
+            bucket_name="landing",
+            key_prefix="uploads/",
+            batching=TriggerBatching(batch_size=10),
+        )
+        pipeline_infrastructure_block.cloudevent_bridge_rule = MagicMock()
+
+        pipeline_infrastructure_block.apply_state_machine_trigger(MagicMock())
+
+        mock_dispatcher.return_value.exec.assert_called_once()
+        target_arn = mock_target.call_args.args[-1]
+        assert target_arn == mock_dispatcher.return_value.outputs.queue.arn
@@ -0,0 +1,330 @@
+import json
+import pytest
+
+from concurrent.futures import Future
+from mock import patch
+
+from infrastructure.core.image_builder import (
+    ImageBuild,
+    ImageBuildScheduler,
+    RegistryCredentials,
+    registry_cache,
+)
+from utils.exceptions import ImageBuildException
+
+
+IMAGE_INDEX = {
+    "manifests": [
+        {
+            "digest": "sha256:amd64",
+            "platform": {"architecture": "amd64", "os": "linux"},
+        },
+        {
+            "digest": "sha256:arm64",
+            "platform": {"architecture": "arm64", "os": "linux"},
+        },
+    ]
+}
+
+
+class RecordingRunner:
+    def __init__(self, fail_on: str | None = None, output: str | None = None):
+        self.commands = []
+        self.fail_on = fail_on
+        self.output = output
+
+    def __call__(self, arguments: list[str], stdin: str | None = None):
+        self.commands.append((arguments, stdin))
+        if arguments[0] == self.fail_on:
+            raise ImageBuildException(f"docker {arguments[0]} failed")
+        return self.output
+
+
+def create_image_build(image_name: str, code_path: str = "./src/test/function"):
+    return ImageBuild(
+        image_name=image_name,
+        dockerfile="./config/src/Dockerfile",
+        context="./config",
+        platform="linux/amd64",
+        registry=RegistryCredentials(
+            server="test.registry",
+            username="AWS",
+            password="password",  # pragma: allowlist secret
+        ),
+        build_args={"CODE_PATH": code_path},
+        cache_from=[image_name],
+    )
+
+
+@patch("infrastructure.core.image_builder.pulumi.log")
+class TestImageBuildScheduler:
+    def test_build_and_push(self, _):
+        runner = RecordingRunner()
+        scheduler = ImageBuildScheduler(max_workers=2, runner=runner)
+
+        result = scheduler.submit(create_image_build("test.registry/repo:abc"))
+
+        assert result.result() == "test.registry/repo:abc"
+        assert runner.commands == [
+            (
+                [
+                    "login",
+                    "--username",
+                    "AWS",
+                    "--password-stdin",
+                    "test.registry",
+                ],
+                "password",  # pragma: allowlist secret
+            ),
+            (
+                [
+                    "buildx",
+                    "build",
+                    "--platform",
+                    "linux/amd64",
+                    "--file",
+                    "./config/src/Dockerfile",
+                    "--tag",
+                    "test.registry/repo:abc",
+                    "--load",
+                    "--provenance=false",
+                    "--build-arg",
+                    "CODE_PATH=./src/test/function",
+                    "--cache-from",
+                    "test.registry/repo:abc",
+                    "./config",
+                ],
+                None,
+            ),
+            (["push", "test.registry/repo:abc"], None),
+        ]
+        assert [timing.image_name for timing in scheduler.timings] == [
+            "test.registry/repo:abc"
+        ]
+
+    def test_identical_contexts_are_built_once(self, _):
+        runner = RecordingRunner()
+        scheduler = ImageBuildScheduler(max_workers=2, runner=runner)
+
+        first = scheduler.submit(create_image_build("test.registry/repo-1:abc"))
+        second = scheduler.submit(create_image_build("test.registry/repo-2:abc"))
+        first.result()
+        second.result()
+
+        commands = [arguments[:2] for arguments, _ in runner.commands]
+        assert commands.count(["buildx", "build"]) == 1
+        assert ["tag", "test.registry/repo-1:abc"] in commands
+        assert ["push", "test.registry/repo-1:abc"] in commands
+        assert ["push", "test.registry/repo-2:abc"] in commands
+        assert sorted(
+            (timing.image_name, timing.deduplicated) for timing in scheduler.timings
+        ) == [("test.registry/repo-1:abc", False), ("test.registry/repo-2:abc", True)]
+
+    def test_same_image_is_submitted_once(self, _):
+        runner = RecordingRunner()
+        scheduler = ImageBuildScheduler(max_workers=2, runner=runner)
+
+        first = scheduler.submit(create_image_build("test.registry/repo:abc"))
+        second = scheduler.submit(create_image_build("test.registry/repo:abc"))
+
+        assert first is second
+
+    def test_different_contexts_are_built_separately(self, _):
+        runner = RecordingRunner()
+        scheduler = ImageBuildScheduler(max_workers=2, runner=runner)
+
+        first = scheduler.submit(
+            create_image_build("test.registry/repo-1:abc", "./src/one")
+        )
+        second = scheduler.submit(
+            create_image_build("test.registry/repo-2:def", "./src/two")
+        )
+        first.result()
+        second.result()
+
+        commands = [arguments[:2] for arguments, _ in runner.commands]
+        assert commands.count(["buildx", "build"]) == 2
+        assert commands.count(["login", "--username"]) == 1
+
+    def test_context_path_args_are_covered_by_context_digest(self, _):
+        first = create_image_build("test.registry/repo-1:abc", "./src/one").copy(
+            update={"context_digest": "1234", "context_path_args": ["CODE_PATH"]}
+        )
+        second = first.copy(
+            update={
+                "image_name": "test.registry/repo-2:def",
+                "context": "./other",
+                "build_args": {"CODE_PATH": "./src/two"},
+            }
+        )
+
+        assert first.deduplication_key() == second.deduplication_key()
+        assert (
+            first.deduplication_key()
+            != second.copy(update={"context_digest": "5678"}).deduplication_key()
+        )
+
+    def test_shutdown(self, _):
+        runner = RecordingRunner()
+        scheduler = ImageBuildScheduler(max_workers=2, runner=runner)
+        scheduler.submit(create_image_build("test.registry/repo:abc")).result()
+
+        scheduler.shutdown()
+
+        with pytest.raises(RuntimeError):
+            scheduler.start_build(create_image_build("test.registry/other:abc"), None)
+
+    def test_build_failure_is_raised(self, _):
+        scheduler = ImageBuildScheduler(
+            max_workers=2, runner=RecordingRunner(fail_on="buildx")
+        )
+
+        result = scheduler.submit(create_image_build("test.registry/repo:abc"))
+
+        with pytest.raises(ImageBuildException):
+            result.result()
+
+    def test_push_failure_is_raised(self, _):
+        scheduler = ImageBuildScheduler(
+            max_workers=2, runner=RecordingRunner(fail_on="push")
+        )
+
+        result = scheduler.submit(create_image_build("test.registry/repo:abc"))
+
+        with pytest.raises(ImageBuildException):
+            result.result()
+
+    def test_build_exports_cache(self, _):
+        runner = RecordingRunner()
+        scheduler = ImageBuildScheduler(max_workers=2, runner=runner)
+        cache_from, cache_to = registry_cache("test.registry/cache", "function")
+        build = create_image_build("test.registry/repo:abc").copy(
+            update={
+                "cache_from": [cache_from],
+                "cache_to": [cache_to],
+                "builder": "dorc",
+            }
+        )
+
+        scheduler.submit(build).result()
+
+        arguments = runner.commands[1][0]
+        assert arguments[:4] == ["buildx", "build", "--builder", "dorc"]
+        assert arguments[-5:] == [
+            "--cache-from",
+            "type=registry,ref=test.registry/cache:function",
+            "--cache-to",
+            "type=registry,ref=test.registry/cache:function,mode=max,"
+            "image-manifest=true,oci-mediatypes=true",
+            "./config",
+        ]
+
+    def test_multi_platform_build_is_pushed_by_builder(self, _):
+        runner = RecordingRunner()
+        scheduler = ImageBuildScheduler(max_workers=2, runner=runner)
+        build = create_image_build("test.registry/repo-1:abc").copy(
+            update={"platform": "linux/amd64,linux/arm64"}
+        )
+
+        scheduler.submit(build).result()
+        scheduler.submit(
+            build.copy(update={"image_name": "test.registry/repo-2:abc"})
+        ).result()
+
+        commands = [arguments for arguments, _ in runner.commands]
+        assert commands[1][:4] == [
+            "buildx",
+            "build",
+            "--platform",
+            "linux/amd64,linux/arm64",
+        ]
+        assert "--push" in commands[1] and "--load" not in commands[1]
+        assert [arguments[0] for arguments in commands].count("push") == 0
+        assert [
+            "buildx",
+            "imagetools",
+            "create",
+            "--tag",
+            "test.registry/repo-2:abc",
+            "test.registry/repo-1:abc",
+        ] in commands
+
+    def test_platform_image_resolved_from_index(self, _):
+        runner = RecordingRunner(output=json.dumps(IMAGE_INDEX))
+        scheduler = ImageBuildScheduler(max_workers=2, runner=runner)
+        build = create_image_build("test.registry/repo:abc").copy(
+            update={"platform": "linux/amd64,linux/arm64"}
+        )
+
+        image = scheduler.submit_platform_image(
+            scheduler.submit(build), build.registry, "linux/arm64"
+        )
+
+        assert image.result() == "test.registry/repo@sha256:arm64"
+        assert (
+            [
+                "buildx",
+                "imagetools",
+                "inspect",
+                "--raw",
+                "test.registry/repo:abc",
+            ],
+            None,
+        ) in runner.commands
+
+    def test_platform_image_of_existing_image(self, _):
+        runner = RecordingRunner(output=json.dumps(IMAGE_INDEX))
+        scheduler = ImageBuildScheduler(max_workers=2, runner=runner)
+        registry = create_image_build("test.registry/repo:abc").registry
+
+        image = scheduler.submit_platform_image(
+            "test.registry/repo@sha256:index", registry, "linux/amd64"
+        )
+
+        assert image.result() == "test.registry/repo@sha256:amd64"
+
+    def test_missing_platform_is_raised(self, _):
+        runner = RecordingRunner(output=json.dumps({"manifests": []}))
+        scheduler = ImageBuildScheduler(max_workers=2, runner=runner)
+        registry = create_image_build("test.registry/repo:abc").registry
+
+        image = scheduler.submit_platform_image(
+            "test.registry/repo:abc", registry, "linux/arm64"
+        )
+
+        with pytest.raises(ImageBuildException):
+            image.result()
+
+    def test_build_waits_for_dependency(self, _):
+        runner = RecordingRunner()
+        scheduler = ImageBuildScheduler(max_workers=2, runner=runner)
+        base_image = Future()
+
+        result = scheduler.submit(
+            create_image_build("test.registry/repo:abc"), after=base_image
+        )
+        assert not result.done()
+        assert runner.commands == []
+
+        base_image.set_result("test.registry/base:abc")
+
+        assert result.result() == "test.registry/repo:abc"
+        assert [arguments[0] for arguments, _ in runner.commands] == [
+            "login",
+            "buildx",
+            "push",
+        ]
+
+    def test_failed_dependency_is_raised(self, _):
+        runner = RecordingRunner()
+        scheduler = ImageBuildScheduler(max_workers=2, runner=runner)
+        base_image = Future()
+
+        result = scheduler.submit(
+            create_image_build("test.registry/repo:abc"), after=base_image
+        )
+        base_image.set_exception(ImageBuildException("base image failed"))
+
+        with pytest.raises(ImageBuildException):
+            result.result()
+        assert runner.commands == []
@@ -0,0 +1,145 @@
+import pulumi
+import pytest
+
+from botocore.exceptions import ClientError
+from datetime import datetime, timedelta, timezone
+from mock import MagicMock
+
+from infrastructure.core.image_registry import (
+    AuthorizationTokenCache,
+    ImageRegistry,
+    parse_repository_url,
+)
+from tests.mock import FakeEcrClient
+
+REGISTRY = "123456789012.dkr.ecr.eu-west-2.amazonaws.com"
+REPOSITORY_URL = f"{REGISTRY}/test-pipelines-repo"
+
+
+class TestImageRegistry:
+    @pytest.fixture
+    def ecr_client(self) -> FakeEcrClient:
+        return FakeEcrClient(
+            {
+                ("test-pipelines-repo", "0123"): "sha256:abcd",
+                ("test-pipelines-other", "4567"): "sha256:efgh",
+            }
+        )
+
+    def test_parse_repository_url(self):
+        assert parse_repository_url(REPOSITORY_URL) == (
+            "123456789012",
+            "eu-west-2",
+            "test-pipelines-repo",
+        )
+
+    def test_resolve_image_digest(self, ecr_client: FakeEcrClient):
+        registry = ImageRegistry(ecr_client)
+
+        assert registry.resolve_image_digest(REPOSITORY_URL, "0123") == "sha256:abcd"
+        assert ecr_client.calls == [
+            ("123456789012", "test-pipelines-repo", [{"imageTag": "0123"}])
+        ]
+
+    def test_resolve_image_digest_missing_image(self, ecr_client: FakeEcrClient):
+        registry = ImageRegistry(ecr_client)
+
+        assert registry.resolve_image_digest(REPOSITORY_URL, "missing") is None
+
+    def test_missing_repository_has_no_images(self):
+        registry = ImageRegistry(
+            FakeEcrClient(missing_repositories=["test-pipelines-repo"])
+        )
+
+        assert registry.find_existing_images(
+            [(REPOSITORY_URL, "0123"), (REPOSITORY_URL, "4567")]
+        ) == {(REPOSITORY_URL, "0123"): None, (REPOSITORY_URL, "4567"): None}
+
+    def test_other_errors_are_raised(self):
+        ecr_client = MagicMock()
+        ecr_client.batch_get_image.side_effect = ClientError(
+            {"Error": {"Code": "AccessDeniedException"}}, "BatchGetImage"
+        )
+
+        with pytest.raises(ClientError):
+            ImageRegistry(ecr_client).resolve_image_digest(REPOSITORY_URL, "0123")
+
+    def test_find_existing_images_batches_per_repository(
+        self, ecr_client: FakeEcrClient
+    ):
+        registry = ImageRegistry(ecr_client)
+        images = [
+            (REPOSITORY_URL, "0123"),
+            (REPOSITORY_URL, "missing"),
+            (f"{REGISTRY}/test-pipelines-other", "4567"),
+        ]
+
+        assert registry.find_existing_images(images) == {
+            (REPOSITORY_URL, "0123"): "sha256:abcd",
+            (REPOSITORY_URL, "missing"): None,
+            (f"{REGISTRY}/test-pipelines-other", "4567"): "sha256:efgh",
+        }
+        assert sorted(ecr_client.calls) == [
+            ("123456789012", "test-pipelines-other", [{"imageTag": "4567"}]),
+            (
+                "123456789012",
+                "test-pipelines-repo",
+                [{"imageTag": "0123"}, {"imageTag": "missing"}],
+            ),
+        ]
+
+    def test_lookups_are_cached(self, ecr_client: FakeEcrClient):
+        registry = ImageRegistry(ecr_client)
+        registry.find_existing_images([(REPOSITORY_URL, "0123")])
+
+        assert registry.resolve_image_digest(REPOSITORY_URL, "0123") == "sha256:abcd"
+        assert len(ecr_client.calls) == 1
+
+    @pytest.mark.usefixtures("mock_pulumi")
+    @pulumi.runtime.test
+    def test_prefetch(self, mock_pulumi, ecr_client: FakeEcrClient):
+        registry = ImageRegistry(ecr_client)
+
+        def check_prefetch(existing_images):
+            assert existing_images == {(REPOSITORY_URL, "0123"): "sha256:abcd"}
+            assert registry.prefetched is prefetched
+            assert len(ecr_client.calls) == 1
+
+        prefetched = registry.prefetch(
+            [(pulumi.Output.from_input(REPOSITORY_URL), "0123")]
+        )
+        return prefetched.apply(check_prefetch)
+
+
+class TestAuthorizationTokenCache:
+    def create_token(self, expires_in: timedelta):
+        expires_at = datetime.now(timezone.utc) + expires_in
+        return MagicMock(expires_at=expires_at.isoformat().replace("+00:00", "Z"))
+
+    def test_token_is_fetched_once_per_registry_and_region(self):
+        fetch = MagicMock(side_effect=lambda *_: self.create_token(timedelta(hours=12)))
+        cache = AuthorizationTokenCache(fetch)
+
+        first = cache.get("123456789012", "eu-west-2")
+        second = cache.get("123456789012", "eu-west-2")
+        other_region = cache.get("123456789012", "eu-west-1")
+
+        assert first is second
+        assert other_region is not first
+        assert fetch.call_count == 2
+
+    def test_expiring_token_is_refreshed(self):
+        fetch = MagicMock(
+            side_effect=[
+                self.create_token(timedelta(minutes=1)),
+                self.create_token(timedelta(hours=12)),
+            ]
+        )
+        cache = AuthorizationTokenCache(fetch, expiry_margin=timedelta(minutes=5))
+
+        first = cache.get("123456789012", "eu-west-2")
+        second = cache.get("123456789012", "eu-west-2")
+
+        assert first is not second
+        assert cache.get("123456789012", "eu-west-2") is second
+        assert fetch.call_count == 2
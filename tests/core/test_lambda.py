@@ -1,17 +1,35 @@
+import asyncio
+import hashlib
+import os
+import threading
+import zipfile
+
+from types import SimpleNamespace
+from concurrent.futures import Future
 from mock import MagicMock, Mock, patch
 import pytest
 import pulumi
 
-from pulumi_docker import Image
 import pulumi_aws as aws
 from pulumi_aws.cognito import UserPoolClient
 from infrastructure.core._lambda import CreatePipelineLambdaFunction
 from infrastructure.core.creator import CreatePipeline
+from infrastructure.core.image_builder import ImageBuild, RegistryCredentials
+from infrastructure.core.image_registry import ImageRegistry
 from infrastructure.core.rapid_client import CreateRapidClient
-from infrastructure.core.models.definition import rAPIdTrigger
+from infrastructure.core.zip_package import ZipPackageBuilder
+from infrastructure.core.models.definition import (
+    DEFAULT_COMPUTE_PROFILE,
+    Architectures,
+    ComputeProfile,
+    Function as FunctionDefinition,
+    ProvisionedConcurrency,
+    WarmSchedule,
+    rAPIdTrigger,
+)
 from utils.config import rAPIdConfig
 
-from tests.mock import MockedEcrAuthentication
+from tests.mock import FakeEcrClient, MockedEcrAuthentication
 
 
 class TestCreateLambda:
@@ -80,53 +98,677 @@ class TestCreateLambda:
 
         lambda_function = lambda_resource_block.create_lambda(
             aws.ec2.SecurityGroup("test-pipelines-test-test-function-sg"),
-            Image(resource_name="test-image", image_name="test-image", skip_push=True),
+            "test-image",
         )
         return pulumi.Output.all(
             lambda_function.name, lambda_function.role, lambda_function.vpc_config
         ).apply(check_lambda_function)
 
     @pytest.mark.usefixtures("lambda_resource_block")
-    @patch("infrastructure.core._lambda.dirhash")
+    @pulumi.runtime.test
+    def test_lambda_function_created_with_compute_profile(self, lambda_resource_block):
+        def check_lambda_function(args):
+            memory_size, timeout, ephemeral_storage, architectures, reserved = args
+            assert memory_size == 2048
+            assert timeout == 600
+            assert ephemeral_storage == {"size": 4096}
+            assert architectures == ["x86_64"]
+            assert reserved == 20
+
+        lambda_resource_block.compute_profile = DEFAULT_COMPUTE_PROFILE.override(
+            ComputeProfile(
+                memory_size=2048, ephemeral_storage=4096, reserved_concurrency=20
+            )
+        )
+        lambda_function = lambda_resource_block.create_lambda(
+            aws.ec2.SecurityGroup("test-pipelines-test-test-function-sg"),
+            "test-image",
+        )
+        return pulumi.Output.all(
+            lambda_function.memory_size,
+            lambda_function.timeout,
+            lambda_function.ephemeral_storage,
+            lambda_function.architectures,
+            lambda_function.reserved_concurrent_executions,
+        ).apply(check_lambda_function)
+
+    @pytest.mark.usefixtures("lambda_resource_block", "config")
+    @pulumi.runtime.test
+    def test_zip_lambda_function_created(self, lambda_resource_block, tmp_path):
+        def check_lambda_function(args):
+            package_type, runtime, handler, source_code_hash, layers = args
+            assert package_type == "Zip"
+            assert runtime == "python3.11"
+            assert handler == "lambda.handler"
+            assert source_code_hash == package.source_code_hash
+            assert layers == ["layer-arn"]
+
+        lambda_resource_block.function = FunctionDefinition(
+            name="function", package_type="Zip"
+        )
+        handler = tmp_path / "lambda.py"
+        handler.write_text("def handler(event, context): pass")
+        package = ZipPackageBuilder(str(tmp_path)).build(
+            "test-function", "abc", [(str(handler), "lambda.py")]
+        )
+
+        lambda_function = lambda_resource_block.create_lambda(
+            aws.ec2.SecurityGroup("test-pipelines-test-test-function-sg"),
+            package=package,
+            layers=["layer-arn"],
+        )
+        return pulumi.Output.all(
+            lambda_function.package_type,
+            lambda_function.runtime,
+            lambda_function.handler,
+            lambda_function.source_code_hash,
+            lambda_function.layers,
+        ).apply(check_lambda_function)
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    @pulumi.runtime.test
+    def test_alias_created(self, lambda_resource_block):
+        def check_alias(args):
+            name, function_name, function_version = args
+            assert name == "live"
+            assert function_name == "test-function"
+            assert function_version == "3"
+
+        alias = lambda_resource_block.create_alias(
+            SimpleNamespace(name="test-function", version="3")
+        )
+        return pulumi.Output.all(
+            alias.name, alias.function_name, alias.function_version
+        ).apply(check_alias)
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    @pulumi.runtime.test
+    def test_provisioned_concurrency_config_created(self, lambda_resource_block):
+        def check_config(args):
+            function_name, qualifier, provisioned_concurrent_executions = args
+            assert function_name == "test-function"
+            assert qualifier == "live"
+            assert provisioned_concurrent_executions == 5
+
+        alias = MagicMock(function_name="test-function")
+        alias.name = "live"
+        config = lambda_resource_block.create_provisioned_concurrency(
+            alias, ProvisionedConcurrency(concurrent_executions=5)
+        )
+        return pulumi.Output.all(
+            config.function_name,
+            config.qualifier,
+            config.provisioned_concurrent_executions,
+        ).apply(check_config)
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    @patch("infrastructure.core._lambda.aws.appautoscaling.ScheduledAction")
+    @pulumi.runtime.test
+    def test_scheduled_provisioned_concurrency(
+        self, mock_scheduled_action: MagicMock, lambda_resource_block
+    ):
+        def check_target(args):
+            resource_id, min_capacity, max_capacity = args
+            assert resource_id == "function:test-function:live"
+            assert min_capacity == 0
+            assert max_capacity == 5
+
+        alias = MagicMock(function_name="test-function")
+        alias.name = "live"
+        target = lambda_resource_block.create_provisioned_concurrency(
+            alias,
+            ProvisionedConcurrency(
+                concurrent_executions=5,
+                schedule=WarmSchedule(
+                    start="cron(0 8 ? * MON-FRI *)",
+                    end="cron(0 18 ? * MON-FRI *)",
+                    timezone="Europe/London",
+                ),
+            ),
+        )
+
+        actions = [kwargs for _, kwargs in mock_scheduled_action.call_args_list]
+        assert [
+            (
+                action["schedule"],
+                action["timezone"],
+                action["scalable_target_action"].min_capacity,
+                action["scalable_target_action"].max_capacity,
+            )
+            for action in actions
+        ] == [
+            ("cron(0 8 ? * MON-FRI *)", "Europe/London", 5, 5),
+            ("cron(0 18 ? * MON-FRI *)", "Europe/London", 0, 0),
+        ]
+        return pulumi.Output.all(
+            target.resource_id, target.min_capacity, target.max_capacity
+        ).apply(check_target)
+
+    def test_apply_with_provisioned_concurrency(self, lambda_resource_block):
+        lambda_resource_block.function = FunctionDefinition(
+            name="function",
+            provisioned_concurrency=ProvisionedConcurrency(concurrent_executions=2),
+        )
+        lambda_resource_block.authenticate_to_ecr_repo = Mock()
+        lambda_resource_block.create_lambda_security_group = Mock()
+        lambda_resource_block.apply_docker_image_build_and_push = Mock()
+        lambda_resource_block.repository_url = Mock()
+        function = aws.lambda_.Function(resource_name="alias-lambda", role="abcd")
+        alias = aws.lambda_.Alias(
+            resource_name="alias", function_name="alias-lambda", function_version="1"
+        )
+        lambda_resource_block.create_lambda = Mock(return_value=function)
+        lambda_resource_block.create_alias = Mock(return_value=alias)
+        lambda_resource_block.create_provisioned_concurrency = Mock()
+
+        output = lambda_resource_block.apply()
+
+        assert output.alias == alias
+        assert output.invocation_arn == alias.arn
+        lambda_resource_block.create_provisioned_concurrency.assert_called_once_with(
+            alias, lambda_resource_block.function.provisioned_concurrency
+        )
+
+    @pytest.fixture
+    def zip_config_repo(self, tmp_path, lambda_resource_block):
+        function_path = tmp_path / "src" / "test" / "function"
+        function_path.mkdir(parents=True)
+        (function_path / "lambda.py").write_text("def handler(event, context): pass")
+        (tmp_path / "src" / "test" / "requirements.txt").write_text("package")
+        (tmp_path / "src" / "Dockerfile").write_text("FROM python")
+        lambda_resource_block.config.universal.config_repo_path = str(tmp_path)
+        return tmp_path
+
+    @patch("infrastructure.core._lambda.get_zip_package_builder")
+    def test_build_zip_package(
+        self, mock_get_zip_package_builder, lambda_resource_block, zip_config_repo
+    ):
+        builder = ZipPackageBuilder(
+            str(zip_config_repo / ".dorc" / "artifacts"), MagicMock()
+        )
+        mock_get_zip_package_builder.return_value = builder
+        lambda_resource_block.function = FunctionDefinition(
+            name="function", package_type="Zip"
+        )
+
+        package, layer_package = lambda_resource_block.build_zip_package()
+
+        assert layer_package is None
+        with zipfile.ZipFile(package.path) as archive:
+            assert archive.namelist() == ["lambda.py"]
+        builder.runner.assert_called_once()
+
+    @patch("infrastructure.core._lambda.get_zip_package_builder")
+    def test_build_zip_package_with_dependency_layer(
+        self, mock_get_zip_package_builder, lambda_resource_block, zip_config_repo
+    ):
+        builder = ZipPackageBuilder(
+            str(zip_config_repo / ".dorc" / "artifacts"), MagicMock()
+        )
+        mock_get_zip_package_builder.return_value = builder
+        lambda_resource_block.function = FunctionDefinition(
+            name="function", package_type="Zip", dependency_layer=True
+        )
+
+        package, layer_package = lambda_resource_block.build_zip_package()
+        (zip_config_repo / "src" / "test" / "function" / "lambda.py").write_text(
+            "def handler(event, context): return 1"
+        )
+        (
+            changed_package,
+            unchanged_layer_package,
+        ) = lambda_resource_block.build_zip_package()
+
+        assert os.path.basename(layer_package.path).startswith(
+            "test-function-dependencies-"
+        )
+        assert unchanged_layer_package == layer_package
+        assert changed_package.code_hash != package.code_hash
+        assert builder.runner.call_count == 1
+
+    def test_zip_lambda_apply(self, lambda_resource_block):
+        lambda_resource_block.function = FunctionDefinition(
+            name="function", package_type="Zip", dependency_layer=True
+        )
+        lambda_resource_block.authenticate_to_ecr_repo = Mock()
+        lambda_resource_block.create_lambda_security_group = Mock(return_value="sg")
+        lambda_resource_block.build_zip_package = Mock(return_value=("zip", "layer"))
+        lambda_resource_block.create_dependency_layer = Mock()
+        function = aws.lambda_.Function(resource_name="zip-lambda", role="abcd")
+        lambda_resource_block.create_lambda = MagicMock(return_value=function)
+
+        assert lambda_resource_block.apply().lambda_function == function
+
+        lambda_resource_block.authenticate_to_ecr_repo.assert_not_called()
+        lambda_resource_block.create_dependency_layer.assert_called_once_with("layer")
+        lambda_resource_block.create_lambda.assert_called_once_with(
+            "sg",
+            package="zip",
+            layers=[lambda_resource_block.create_dependency_layer.return_value.arn],
+        )
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    @patch("infrastructure.core._lambda.get_image_build_scheduler")
+    @patch.object(CreatePipelineLambdaFunction, "create_function_build_context")
+    @patch.object(CreatePipelineLambdaFunction, "collect_build_context_files")
+    @patch.object(CreatePipelineLambdaFunction, "compute_code_hash")
+    @patch.object(
+        CreatePipelineLambdaFunction,
+        "compute_context_digest",
+        MagicMock(return_value="4567cdef"),
+    )
     @pulumi.runtime.test
     def test_pipeline_creator_apply_docker_image_build_and_push(
         self,
-        mock_dirhash: MagicMock,
+        mock_compute_code_hash: MagicMock,
+        mock_collect_build_context_files: MagicMock,
+        mock_create_function_build_context: MagicMock,
+        mock_get_image_build_scheduler: MagicMock,
         lambda_resource_block,
     ):
-        def check_built_docker_image(args):
-            build, image_name, registry = args
-            assert image_name == "test_url:0123abcd"
-            assert build == {
-                "cacheFrom": {"images": ["test_url:0123abcd"]},
-                "args": {
-                    "CODE_PATH": "./src/test/function",
-                    "BUILDKIT_INLINE_CACHE": "1",
-                },
-                "builderVersion": "BuilderBuildKit",
-                "platform": "linux/amd64",
-                "context": "./tests/mock_config_repo_src",
-                "dockerfile": "./tests/mock_config_repo_src/src/Dockerfile",
-            }
-            assert registry == {
-                "password": "mock_password",  # pragma: allowlist secret
-                "server": "test_url",
-                "username": "mock_username",
-            }
+        # The tag covers the platform as well as the build context
+        code_hash = hashlib.sha256(b"0123abcd\0linux/amd64").hexdigest()
+        image_name = f"test.registry/test_url:{code_hash}"
 
-        mock_dirhash.return_value = "0123abcd"
+        def check_built_docker_image(image_uri):
+            assert image_uri == image_name
+            mock_get_image_build_scheduler.assert_called_once_with(4)
+            mock_scheduler.submit.assert_called_once_with(
+                ImageBuild(
+                    image_name=image_name,
+                    dockerfile="./tests/mock_config_repo_src/src/Dockerfile",
+                    context="./tests/mock_config_repo_src/.dorc/contexts/test-function",
+                    context_digest="4567cdef",
+                    platform="linux/amd64",
+                    registry=RegistryCredentials(
+                        server="test.registry",
+                        username="mock_username",
+                        password="mock_password",  # pragma: allowlist secret
+                    ),
+                    build_args={
+                        "CODE_PATH": "./src/test/function",
+                        "BUILDKIT_INLINE_CACHE": "1",
+                    },
+                    context_path_args=["CODE_PATH"],
+                    cache_from=[image_name],
+                ),
+                after=None,
+            )
+
+        lambda_resource_block.image_registry = MagicMock(prefetched=None)
+        lambda_resource_block.image_registry.resolve_image_digest.return_value = None
+        mock_compute_code_hash.return_value = "0123abcd"
+        mock_collect_build_context_files.return_value = ["lambda.py"]
+        mock_create_function_build_context.return_value = (
+            "./tests/mock_config_repo_src/.dorc/contexts/test-function"
+        )
+        pushed_image = Future()
+        pushed_image.set_result(image_name)
+        mock_scheduler = mock_get_image_build_scheduler.return_value
+        mock_scheduler.submit.return_value = pushed_image
         mock_registry_info = MockedEcrAuthentication(
             password="mock_password",  # pragma: allowlist secret
             user_name="mock_username",  # pragma: allowlist secret
         )
 
-        image = lambda_resource_block.apply_docker_image_build_and_push(
+        image_uri = lambda_resource_block.apply_docker_image_build_and_push(
             mock_registry_info,
-            "test_url",
+            "test.registry/test_url",
+        )
+        return image_uri.apply(check_built_docker_image)
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    @patch("infrastructure.core._lambda.get_image_build_scheduler")
+    def test_schedule_image_build_promotes_existing_image(
+        self, mock_get_image_build_scheduler: MagicMock, lambda_resource_block
+    ):
+        lambda_resource_block.config.universal.promote_images = True
+        lambda_resource_block.image_registry = MagicMock()
+        lambda_resource_block.image_registry.resolve_image_digest.return_value = (
+            "sha256:abcd"
+        )
+
+        image_uri = lambda_resource_block.schedule_image_build(
+            "test.registry/test_url", MagicMock(), "0123abcd", []
+        )
+
+        assert image_uri == "test.registry/test_url@sha256:abcd"
+        lambda_resource_block.image_registry.resolve_image_digest.assert_called_once_with(
+            "test.registry/test_url", "0123abcd"
+        )
+        mock_get_image_build_scheduler.assert_not_called()
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    @patch("infrastructure.core._lambda.get_image_build_scheduler")
+    def test_schedule_image_build_skips_existing_image(
+        self, mock_get_image_build_scheduler: MagicMock, lambda_resource_block
+    ):
+        lambda_resource_block.image_registry = ImageRegistry(
+            FakeEcrClient({("test-pipelines-repo", "0123abcd"): "sha256:abcd"})
+        )
+
+        image_uri = lambda_resource_block.schedule_image_build(
+            "123456789012.dkr.ecr.eu-west-2.amazonaws.com/test-pipelines-repo",
+            MagicMock(),
+            "0123abcd",
+            [],
+        )
+
+        assert (
+            image_uri
+            == "123456789012.dkr.ecr.eu-west-2.amazonaws.com/test-pipelines-repo:0123abcd"
+        )
+        mock_get_image_build_scheduler.assert_not_called()
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    @patch("infrastructure.core._lambda.get_image_build_scheduler")
+    @patch.object(CreatePipelineLambdaFunction, "create_function_build_context")
+    def test_schedule_image_build_with_registry_cache(
+        self,
+        mock_create_function_build_context: MagicMock,
+        mock_get_image_build_scheduler: MagicMock,
+        lambda_resource_block,
+    ):
+        lambda_resource_block.image_registry = ImageRegistry(FakeEcrClient())
+        lambda_resource_block.config.universal.image_builder = "dorc"
+        mock_create_function_build_context.return_value = "context"
+        mock_get_image_build_scheduler.return_value.submit.return_value = Future()
+        url = "123456789012.dkr.ecr.eu-west-2.amazonaws.com/test-pipelines-repo"
+        cache_url = (
+            "123456789012.dkr.ecr.eu-west-2.amazonaws.com/test-pipelines-build-cache"
+        )
+
+        lambda_resource_block.schedule_image_build(
+            url,
+            MockedEcrAuthentication(
+                password="mock_password",  # pragma: allowlist secret
+                user_name="mock_username",  # pragma: allowlist secret
+            ),
+            "0123abcd",
+            [],
+            build_cache_url=cache_url,
         )
-        return pulumi.Output.all(image.build, image.image_name, image.registry).apply(
-            check_built_docker_image
+
+        build = mock_get_image_build_scheduler.return_value.submit.call_args[0][0]
+        assert build.cache_from == [
+            f"{url}:0123abcd",
+            f"type=registry,ref={cache_url}:test-function-amd64",
+        ]
+        assert build.cache_to == [
+            f"type=registry,ref={cache_url}:test-function-amd64,mode=max,"
+            "image-manifest=true,oci-mediatypes=true"
+        ]
+        assert build.builder == "dorc"
+
+    @pytest.mark.usefixtures("pipeline_infrastructure_block")
+    @patch("infrastructure.core._lambda.get_image_build_scheduler")
+    def test_identical_functions_share_a_build(
+        self, mock_get_image_build_scheduler, pipeline_infrastructure_block, tmp_path
+    ):
+        for folder, code in [("one", "print(1)"), ("two", "print(1)"), ("three", "")]:
+            (tmp_path / "src" / "test" / folder).mkdir(parents=True)
+            (tmp_path / "src" / "test" / folder / "lambda.py").write_text(code)
+        (tmp_path / "src" / "Dockerfile").write_text("FROM python")
+        (tmp_path / "requirements.txt").write_text("pandas")
+        pipeline_infrastructure_block.config.universal.config_repo_path = str(tmp_path)
+        mock_get_image_build_scheduler.return_value.submit.return_value = Future()
+
+        def schedule(folder: str) -> ImageBuild:
+            lambda_block = CreatePipelineLambdaFunction(
+                pipeline_infrastructure_block.config,
+                pipeline_infrastructure_block.aws_provider,
+                pipeline_infrastructure_block.environment,
+                pipeline_infrastructure_block.universal_stack_reference,
+                "test:lambda:role",
+                f"test-{folder}",
+                f"test/{folder}",
+                None,
+                ImageRegistry(FakeEcrClient()),
+            )
+            files, code_hash = lambda_block.image_source
+            lambda_block.schedule_image_build(
+                f"123456789012.dkr.ecr.eu-west-2.amazonaws.com/test-{folder}",
+                MockedEcrAuthentication(
+                    password="mock_password",  # pragma: allowlist secret
+                    user_name="mock_username",  # pragma: allowlist secret
+                ),
+                code_hash,
+                files,
+            )
+            return mock_get_image_build_scheduler.return_value.submit.call_args[0][0]
+
+        one, two, three = schedule("one"), schedule("two"), schedule("three")
+
+        assert one.build_args["CODE_PATH"] != two.build_args["CODE_PATH"]
+        assert one.deduplication_key() == two.deduplication_key()
+        assert one.deduplication_key() != three.deduplication_key()
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    def test_platform_follows_architecture(self, lambda_resource_block):
+        assert lambda_resource_block.platform == "linux/amd64"
+        lambda_resource_block.compute_profile = ComputeProfile(
+            architecture=Architectures.ARM64
         )
+        assert lambda_resource_block.platform == "linux/arm64"
+        assert lambda_resource_block.cache_scope == "test-function-arm64"
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    def test_multi_arch_platform(self, lambda_resource_block):
+        lambda_resource_block.config.universal.multi_arch_images = True
+        lambda_resource_block.compute_profile = ComputeProfile(
+            architecture=Architectures.ARM64
+        )
+        assert lambda_resource_block.platform == "linux/amd64,linux/arm64"
+        assert lambda_resource_block.cache_scope == "test-function-amd64-arm64"
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    @patch("infrastructure.core._lambda.get_image_build_scheduler")
+    def test_multi_arch_existing_image_deployed_by_platform_digest(
+        self, mock_get_image_build_scheduler: MagicMock, lambda_resource_block
+    ):
+        lambda_resource_block.config.universal.multi_arch_images = True
+        lambda_resource_block.compute_profile = ComputeProfile(
+            architecture=Architectures.ARM64
+        )
+        lambda_resource_block.image_registry = ImageRegistry(
+            FakeEcrClient({("test-pipelines-repo", "0123abcd"): "sha256:index"})
+        )
+        url = "123456789012.dkr.ecr.eu-west-2.amazonaws.com/test-pipelines-repo"
+        scheduler = mock_get_image_build_scheduler.return_value
+        resolved = Future()
+        resolved.set_result(f"{url}@sha256:arm64")
+        scheduler.submit_platform_image.return_value = resolved
+
+        image_uri = lambda_resource_block.schedule_image_build(
+            url,
+            MockedEcrAuthentication(
+                password="mock_password",  # pragma: allowlist secret
+                user_name="mock_username",  # pragma: allowlist secret
+            ),
+            "0123abcd",
+            [],
+        )
+
+        assert image_uri.result() == f"{url}@sha256:arm64"
+        image, registry, platform = scheduler.submit_platform_image.call_args[0]
+        assert image == f"{url}:0123abcd"
+        assert registry.server == "123456789012.dkr.ecr.eu-west-2.amazonaws.com"
+        assert platform == "linux/arm64"
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    def test_image_resolved_off_the_event_loop(self, lambda_resource_block):
+        threads = []
+        pushed = Future()
+        pushed.set_result("repo@sha256:abcd")
+
+        def schedule_image_build(*args):
+            threads.append(threading.current_thread())
+            return pushed
+
+        loop = asyncio.new_event_loop()
+        try:
+            with patch.object(
+                lambda_resource_block,
+                "schedule_image_build",
+                side_effect=schedule_image_build,
+            ):
+                image = loop.run_until_complete(
+                    lambda_resource_block.resolve_image("repo", None, "0123abcd", [])
+                )
+        finally:
+            loop.close()
+
+        assert image == "repo@sha256:abcd"
+        assert threads and threads[0] is not threading.current_thread()
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    @patch("infrastructure.core._lambda.pulumi.runtime.is_dry_run", return_value=True)
+    @patch("infrastructure.core._lambda.get_image_build_scheduler")
+    def test_multi_arch_image_not_resolved_in_preview(
+        self,
+        mock_get_image_build_scheduler: MagicMock,
+        mock_is_dry_run: MagicMock,
+        lambda_resource_block,
+    ):
+        lambda_resource_block.config.universal.multi_arch_images = True
+        lambda_resource_block.image_registry = ImageRegistry(
+            FakeEcrClient({("test-pipelines-repo", "0123abcd"): "sha256:index"})
+        )
+        url = "123456789012.dkr.ecr.eu-west-2.amazonaws.com/test-pipelines-repo"
+
+        image_uri = lambda_resource_block.schedule_image_build(
+            url,
+            MockedEcrAuthentication(
+                password="mock_password",  # pragma: allowlist secret
+                user_name="mock_username",  # pragma: allowlist secret
+            ),
+            "0123abcd",
+            [],
+        )
+
+        assert image_uri == f"{url}:0123abcd"
+        mock_get_image_build_scheduler.assert_not_called()
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    @patch.object(CreatePipelineLambdaFunction, "collect_build_context_files")
+    @patch.object(CreatePipelineLambdaFunction, "compute_code_hash")
+    def test_image_tag_includes_platform(
+        self,
+        mock_compute_code_hash: MagicMock,
+        mock_collect_build_context_files: MagicMock,
+        lambda_resource_block,
+        config,
+    ):
+        mock_compute_code_hash.return_value = "0123abcd"
+        arm64_block = CreatePipelineLambdaFunction(
+            config,
+            None,
+            "test",
+            None,
+            "test:lambda:role",
+            "test-function",
+            "test/function",
+            None,
+            compute_profile=ComputeProfile(architecture=Architectures.ARM64),
+        )
+        assert arm64_block.image_source[1] != lambda_resource_block.image_source[1]
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    def test_cache_scope_defaults_to_function_name(self, lambda_resource_block):
+        assert lambda_resource_block.cache_scope == "test-function-amd64"
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    def test_cache_scope_from_function_definition(self, lambda_resource_block):
+        lambda_resource_block.function = FunctionDefinition(
+            name="function", cache_scope="shared-transforms"
+        )
+        assert lambda_resource_block.cache_scope == "shared-transforms-amd64"
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    def test_build_cache_url_is_only_set_when_enabled(self, lambda_resource_block):
+        assert lambda_resource_block.build_cache_url() is None
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    @patch("infrastructure.core._lambda.get_image_build_scheduler")
+    @patch.object(CreatePipelineLambdaFunction, "create_function_build_context")
+    def test_schedule_image_build_on_base_image(
+        self,
+        mock_create_function_build_context: MagicMock,
+        mock_get_image_build_scheduler: MagicMock,
+        lambda_resource_block,
+    ):
+        lambda_resource_block.image_registry = ImageRegistry(FakeEcrClient())
+        lambda_resource_block.base_image = MagicMock()
+        lambda_resource_block.base_image.image_name.return_value = "base:1234"
+        mock_create_function_build_context.return_value = "context"
+        mock_get_image_build_scheduler.return_value.submit.return_value = Future()
+        registry_info = MockedEcrAuthentication(
+            password="mock_password",  # pragma: allowlist secret
+            user_name="mock_username",  # pragma: allowlist secret
+        )
+
+        lambda_resource_block.schedule_image_build(
+            "123456789012.dkr.ecr.eu-west-2.amazonaws.com/test-pipelines-repo",
+            registry_info,
+            "0123abcd",
+            [],
+            "123456789012.dkr.ecr.eu-west-2.amazonaws.com/test-pipelines-base-image",
+        )
+
+        lambda_resource_block.base_image.submit.assert_called_once_with(
+            "123456789012.dkr.ecr.eu-west-2.amazonaws.com/test-pipelines-base-image",
+            registry_info,
+            "linux/amd64",
+            None,
+        )
+        build, kwargs = mock_get_image_build_scheduler.return_value.submit.call_args
+        assert build[0].build_args["BASE_IMAGE"] == "base:1234"
+        assert kwargs == {"after": lambda_resource_block.base_image.submit.return_value}
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    def test_create_function_build_context(self, lambda_resource_block, tmp_path):
+        function_path = tmp_path / "src" / "test" / "function"
+        function_path.mkdir(parents=True)
+        (function_path / "lambda.py").write_text("print('hello')")
+        (tmp_path / "src" / "test" / "requirements.txt").write_text("pandas")
+        (tmp_path / "src" / "Dockerfile").write_text("FROM python")
+        (tmp_path / "shared").mkdir()
+        (tmp_path / "shared" / "utils.py").write_text("print('shared')")
+        (tmp_path / "tests" / "data").mkdir(parents=True)
+        (tmp_path / "tests" / "data" / "large.csv").write_text("a,b,c")
+        lambda_resource_block.config.universal.config_repo_path = str(tmp_path)
+        lambda_resource_block.config.universal.shared_build_files = ["shared"]
+
+        context = lambda_resource_block.create_function_build_context(
+            lambda_resource_block.collect_build_context_files()
+        )
+
+        assert context == str(tmp_path / ".dorc" / "contexts" / "test-function")
+        assert sorted(
+            os.path.relpath(os.path.join(current, filename), context)
+            for current, _, filenames in os.walk(context)
+            for filename in filenames
+        ) == [
+            "shared/utils.py",
+            "src/Dockerfile",
+            "src/test/function/lambda.py",
+            "src/test/requirements.txt",
+        ]
+
+    @pytest.mark.usefixtures("lambda_resource_block")
+    def test_compute_code_hash(self, lambda_resource_block, tmp_path):
+        function_path = tmp_path / "src" / "test" / "function"
+        function_path.mkdir(parents=True)
+        (function_path / "lambda.py").write_text("print('hello')")
+        (tmp_path / "src" / "Dockerfile").write_text("FROM python")
+        lambda_resource_block.config.universal.config_repo_path = str(tmp_path)
+
+        code_hash = lambda_resource_block.compute_code_hash()
+        assert code_hash == lambda_resource_block.compute_code_hash()
+        assert (tmp_path / "hash-manifest.json").exists()
+
+        (tmp_path / "requirements.txt").write_text("pandas")
+        assert lambda_resource_block.compute_code_hash() != code_hash
 
     @pytest.mark.usefixtures("lambda_resource_block")
     def test_lambda_create_apply(
@@ -147,8 +789,11 @@ class TestCreateLambda:
             return_value=security_group
         )
         lambda_resource_block.universal_stack_reference = MagicMock()
-        lambda_resource_block.universal_stack_reference.require_output.return_value.apply.return_value = (
-            "image"
+        lambda_resource_block.universal_stack_reference.require_output.return_value = (
+            "test_url"
+        )
+        lambda_resource_block.apply_docker_image_build_and_push = Mock(
+            return_value="image"
         )
         lambda_resource_block.create_lambda = MagicMock(return_value=function)
 
@@ -161,6 +806,9 @@ class TestCreateLambda:
         assert res == expected
         lambda_resource_block.authenticate_to_ecr_repo.assert_called_once()
         lambda_resource_block.create_lambda_security_group.assert_called_once()
+        lambda_resource_block.apply_docker_image_build_and_push.assert_called_once_with(
+            registry_info, "test_url"
+        )
         lambda_resource_block.create_lambda.assert_called_once_with(
             security_group, "image"
         )
@@ -222,7 +870,7 @@ class TestCreateLambda:
 
         lambda_function = lambda_resource_block.create_lambda(
             aws.ec2.SecurityGroup("test-pipelines-test-test-function-sg"),
-            Image(resource_name="test-image", image_name="test-image", skip_push=True),
+            "test-image",
         )
 
         return pulumi.Output.all(
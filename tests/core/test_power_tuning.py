@@ -0,0 +1,192 @@
+import json
+
+import pytest
+
+from infrastructure.core.power_tuning import (
+    PowerTuner,
+    PowerTuningResult,
+    TuningStrategies,
+    calculate_cost,
+    recommend,
+    tune_pipeline,
+    write_memory_recommendations,
+)
+from tests.mock import LocalLambda
+from utils.exceptions import PowerTuningException
+
+
+def cpu_bound(event, memory_size):
+    # Gets faster with memory until a full vCPU is allocated at 1769 MB
+    return 10 + event.get("work", 1000) * 128 / min(memory_size, 1769)
+
+
+def io_bound(event, memory_size):
+    return 200
+
+
+PIPELINE_DEFINITION = """from infrastructure.core.models.definition import (
+    PipelineDefinition,
+    Function,
+)
+
+pipeline_definition = PipelineDefinition(
+    file_path=__file__,
+    functions=[
+        Function(name="lambda1", next_function="lambda2"),
+        Function(name="lambda2"),
+    ],
+)
+"""
+
+
+class TestPowerTuner:
+    def test_tune_measures_each_memory_size(self):
+        local_lambda = LocalLambda({"transform": cpu_bound})
+        tuner = PowerTuner(local_lambda, invocations=2)
+
+        results = tuner.tune("transform", {"work": 100}, [128, 1024])
+
+        assert [result.memory_size for result in results] == [128, 1024]
+        assert results[0].duration_ms == 110
+        assert results[1].duration_ms == 23
+        assert results[1].cost == calculate_cost(1024, 23, "x86_64")
+        # A warm up invocation plus the measured ones per memory size
+        assert len(local_lambda.invocations) == 6
+        assert local_lambda.invocations[0][2] == {"work": 100}
+
+    def test_tune_restores_memory_size(self):
+        local_lambda = LocalLambda({"transform": cpu_bound}, memory_size=512)
+
+        PowerTuner(local_lambda, invocations=1).tune("transform", {}, [128, 2048])
+
+        assert local_lambda.memory_sizes["transform"] == 512
+
+    def test_failed_invocation_is_raised_and_memory_restored(self):
+        local_lambda = LocalLambda({"transform": cpu_bound}, memory_size=512)
+        local_lambda.failing.add("transform")
+
+        with pytest.raises(PowerTuningException):
+            PowerTuner(local_lambda).tune("transform", {}, [1024])
+        assert local_lambda.memory_sizes["transform"] == 512
+
+
+class TestRecommend:
+    @pytest.fixture
+    def results(self) -> list[PowerTuningResult]:
+        local_lambda = LocalLambda({"transform": cpu_bound})
+        return PowerTuner(local_lambda, invocations=1).tune(
+            "transform", {"work": 10000}, [128, 512, 1024, 2048, 3008]
+        )
+
+    def test_cost(self, results):
+        assert recommend(results, TuningStrategies.COST).memory_size == 128
+
+    def test_speed(self, results):
+        # Beyond one vCPU the function is no faster but costs more
+        assert recommend(results, TuningStrategies.SPEED).memory_size == 2048
+
+    def test_balanced(self, results):
+        # Cost barely changes while the function is CPU bound, so the fastest
+        # size before the plateau wins
+        assert recommend(results, TuningStrategies.BALANCED).memory_size == 2048
+
+    def test_io_bound_function_gets_least_memory(self):
+        local_lambda = LocalLambda({"load": io_bound})
+        results = PowerTuner(local_lambda, invocations=1).tune("load", {}, [128, 1024])
+        assert recommend(results, TuningStrategies.BALANCED).memory_size == 128
+
+
+class TestWriteMemoryRecommendations:
+    def write_definition(self, tmp_path, source: str) -> str:
+        path = tmp_path / "__main__.py"
+        path.write_text(source)
+        return str(path)
+
+    def test_adds_compute_profile(self, tmp_path):
+        path = self.write_definition(tmp_path, PIPELINE_DEFINITION)
+
+        updated = write_memory_recommendations(path, {"lambda1": 1024})
+
+        assert updated == ["lambda1"]
+        source = open(path).read()
+        assert (
+            'Function(name="lambda1", next_function="lambda2", '
+            "compute=ComputeProfile(memory_size=1024))"
+        ) in source
+        assert 'Function(name="lambda2")' in source
+        assert "from infrastructure.core.models.definition import ComputeProfile" in (
+            source
+        )
+        compile(source, path, "exec")
+
+    def test_updates_existing_compute_profile(self, tmp_path):
+        path = self.write_definition(
+            tmp_path,
+            PIPELINE_DEFINITION.replace(
+                'Function(name="lambda1", next_function="lambda2")',
+                'Function(\n            name="lambda1",\n            '
+                "compute=ComputeProfile(timeout=60, memory_size=128),\n        )",
+            )
+            .replace(
+                'Function(name="lambda2")',
+                'Function(name="lambda2", compute=ComputeProfile(timeout=60))',
+            )
+            .replace("    Function,\n", "    Function,\n    ComputeProfile,\n"),
+        )
+
+        updated = write_memory_recommendations(path, {"lambda1": 2048, "lambda2": 512})
+
+        source = open(path).read()
+        assert sorted(updated) == ["lambda1", "lambda2"]
+        assert "compute=ComputeProfile(timeout=60, memory_size=2048)," in source
+        assert "ComputeProfile(timeout=60, memory_size=512)" in source
+        assert source.count("ComputeProfile,") == 1
+        assert "import ComputeProfile\n" not in source
+
+    def test_skips_shared_compute_profile(self, tmp_path):
+        path = self.write_definition(
+            tmp_path,
+            PIPELINE_DEFINITION.replace(
+                'Function(name="lambda2")',
+                'Function(name="lambda2", compute=heavy)',
+            ),
+        )
+
+        assert write_memory_recommendations(path, {"lambda2": 512}) == []
+        assert open(path).read() == PIPELINE_DEFINITION.replace(
+            'Function(name="lambda2")', 'Function(name="lambda2", compute=heavy)'
+        )
+
+
+def test_tune_pipeline(tmp_path, capsys):
+    pipeline_path = tmp_path / "src" / "layer" / "test"
+    for function in ["lambda1", "lambda2"]:
+        (pipeline_path / function).mkdir(parents=True)
+        (pipeline_path / function / "lambda.py").write_text("")
+    (pipeline_path / "lambda1" / "sample_event.json").write_text(
+        json.dumps({"work": 5000})
+    )
+    local_lambda = LocalLambda(
+        {
+            "project-dev-layer-test-lambda1": cpu_bound,
+            "project-dev-layer-test-lambda2": io_bound,
+        }
+    )
+
+    recommendations = tune_pipeline(
+        PowerTuner(local_lambda, invocations=1),
+        str(pipeline_path / "__main__.py"),
+        "src",
+        "project",
+        "dev",
+        [128, 1024, 2048],
+        TuningStrategies.BALANCED,
+    )
+
+    assert {name: result.memory_size for name, result in recommendations.items()} == {
+        "lambda1": 2048,
+        "lambda2": 128,
+    }
+    assert local_lambda.invocations[0][2] == {"work": 5000}
+    assert local_lambda.invocations[-1][2] == {}
+    assert "project-dev-layer-test-lambda1" in capsys.readouterr().out
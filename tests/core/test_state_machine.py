@@ -1,18 +1,50 @@
 import boto3
 import json
-from mock import MagicMock
+from mock import MagicMock, call, patch
+import pulumi
 import pytest
 
 from infrastructure.core.state_machine import CreatePipelineStateMachine
 from infrastructure.core.creator import CreatePipeline
 from infrastructure.core.models.definition import (
+    CatchPolicy,
+    ChainModes,
+    Choice,
+    ChoiceOperators,
+    ChoiceRule,
     PipelineDefinition,
     NextFunction,
     NextFunctionTypes,
     Function,
+    ItemBatcher,
+    Map,
+    MapModes,
+    Parallel,
+    RetryPolicy,
+    S3ItemReader,
+    S3ResultWriter,
+    StateMachineLogging,
+    WorkflowTypes,
 )
+from utils.aws_clients import aws_clients
 from utils.exceptions import PipelineDoesNotExistException
 
+DEFAULT_RETRY = [
+    {
+        "ErrorEquals": [
+            "Lambda.ServiceException",
+            "Lambda.AWSLambdaException",
+            "Lambda.SdkClientException",
+            "Lambda.TooManyRequestsException",
+        ],
+        "IntervalSeconds": 2,
+        "MaxAttempts": 6,
+        "BackoffRate": 2.0,
+        "JitterStrategy": "FULL",
+        "MaxDelaySeconds": 60,
+    }
+]
+
 
 class TestCreateStateMachine:
     @pytest.mark.usefixtures(
@@ -118,16 +150,19 @@ class TestCreateStateMachine:
                 "lambda-1": {
                     "Type": "Task",
                     "Resource": "test-lambda-1-arn",
+                    "Retry": DEFAULT_RETRY,
                     "Next": "lambda-2",
                 },
                 "lambda-2": {
                     "Type": "Task",
                     "Resource": "test-lambda-2-arn",
+                    "Retry": DEFAULT_RETRY,
                     "Next": "lambda-3",
                 },
                 "lambda-3": {
                     "Type": "Task",
                     "Resource": "test-lambda-3-arn",
+                    "Retry": DEFAULT_RETRY,
                     "End": True,
                 },
             },
@@ -174,6 +209,7 @@ class TestCreateStateMachine:
                 "lambda-1": {
                     "Type": "Task",
                     "Resource": "lambda-1-arn",
+                    "Retry": DEFAULT_RETRY,
                     "Next": "lambda-2",
                 },
                 "lambda-2": {
@@ -190,8 +226,668 @@ class TestCreateStateMachine:
         )
         assert json.loads(res) == expected
 
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    def test_create_async_pipeline_next_trigger_state(
+        self, state_machine_resource_block
+    ):
+        state_map = state_machine_resource_block.create_pipeline_next_trigger_state(
+            NextFunction(
+                name="test_pipeline_test_pipeline",
+                type=NextFunctionTypes.PIPELINE,
+                mode=ChainModes.ASYNC,
+                next_function="lambda-3",
+            )
+        )
+
+        assert state_map == {
+            "Type": "Task",
+            "Resource": "arn:aws:states:::states:startExecution",
+            "Parameters": {"StateMachineArn": "test_pipeline_arn"},
+            "ResultPath": None,
+            "Next": "lambda-3",
+        }
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    def test_create_sync_pipeline_next_trigger_state_continuing(
+        self, state_machine_resource_block
+    ):
+        state_map = state_machine_resource_block.create_pipeline_next_trigger_state(
+            NextFunction(
+                name="test_pipeline_test_pipeline",
+                type=NextFunctionTypes.PIPELINE,
+                next_function="lambda-3",
+                input={"bucket": "$.bucket", "keys": "$.keys"},
+            )
+        )
+
+        assert state_map == {
+            "Type": "Task",
+            "Resource": "arn:aws:states:::states:startExecution.sync:2",
+            "Parameters": {
+                "StateMachineArn": "test_pipeline_arn",
+                "Input": {
+                    "bucket.$": "$.bucket",
+                    "keys.$": "$.keys",
+                    "AWS_STEP_FUNCTIONS_STARTED_BY_EXECUTION_ID.$": "$$.Execution.Id",
+                },
+            },
+            "OutputPath": "$.Output",
+            "Next": "lambda-3",
+        }
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    def test_create_state_machine_definition_with_task_policies(
+        self, state_machine_resource_block
+    ):
+        state_machine_resource_block.pipeline_definition = PipelineDefinition(
+            file_path=__file__,
+            functions=[
+                Function(
+                    name="call-rapid",
+                    next_function="load",
+                    retry=[
+                        RetryPolicy(
+                            errors=["States.Timeout"],
+                            interval_seconds=5,
+                            max_attempts=2,
+                            backoff_rate=1.5,
+                            max_delay_seconds=None,
+                            jitter=False,
+                        )
+                    ],
+                    catch=[CatchPolicy(next_function="report-failure")],
+                    timeout_seconds=120,
+                    heartbeat_seconds=30,
+                ),
+                Function(name="load", retry=[]),
+                Function(name="report-failure"),
+            ],
+        )
+
+        res = state_machine_resource_block.create_state_machine_definition(
+            {
+                "call-rapid": "call-rapid-arn",
+                "load": "load-arn",
+                "report-failure": "report-failure-arn",
+            }
+        )
+
+        states = json.loads(res)["States"]
+        assert states["call-rapid"] == {
+            "Type": "Task",
+            "Resource": "call-rapid-arn",
+            "Next": "load",
+            "Retry": [
+                {
+                    "ErrorEquals": ["States.Timeout"],
+                    "IntervalSeconds": 5,
+                    "MaxAttempts": 2,
+                    "BackoffRate": 1.5,
+                    "JitterStrategy": "NONE",
+                }
+            ],
+            "Catch": [
+                {
+                    "ErrorEquals": ["States.ALL"],
+                    "Next": "report-failure",
+                    "ResultPath": "$.error",
+                }
+            ],
+            "TimeoutSeconds": 120,
+            "HeartbeatSeconds": 30,
+        }
+        assert states["load"] == {
+            "Type": "Task",
+            "Resource": "load-arn",
+            "End": True,
+        }
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    def test_pipeline_next_trigger_state_has_no_default_retry(
+        self, state_machine_resource_block
+    ):
+        policies = state_machine_resource_block.create_task_policies(
+            Function(name="chain", timeout_seconds=3600), lambda_task=False
+        )
+        assert policies == {"TimeoutSeconds": 3600}
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    def test_create_state_machine_definition_with_parallel_branches(
+        self, state_machine_resource_block
+    ):
+        name_to_arn_map = {
+            "extract": "extract-arn",
+            "clean": "clean-arn",
+            "enrich": "enrich-arn",
+            "aggregate": "aggregate-arn",
+            "join": "join-arn",
+        }
+        state_machine_resource_block.pipeline_definition = PipelineDefinition(
+            file_path=__file__,
+            description="Test pipeline",
+            functions=[
+                Function(name="extract", next_function="transforms"),
+                Parallel(
+                    name="transforms",
+                    branches=[
+                        [
+                            Function(name="clean", next_function="enrich"),
+                            Function(name="enrich"),
+                        ],
+                        [Function(name="aggregate")],
+                    ],
+                    next_function="join",
+                ),
+                Function(name="join"),
+            ],
+        )
+
+        res = state_machine_resource_block.create_state_machine_definition(
+            name_to_arn_map
+        )
+
+        assert json.loads(res)["States"] == {
+            "extract": {
+                "Type": "Task",
+                "Resource": "extract-arn",
+                "Retry": DEFAULT_RETRY,
+                "Next": "transforms",
+            },
+            "transforms": {
+                "Type": "Parallel",
+                "Branches": [
+                    {
+                        "StartAt": "clean",
+                        "States": {
+                            "clean": {
+                                "Type": "Task",
+                                "Resource": "clean-arn",
+                                "Retry": DEFAULT_RETRY,
+                                "Next": "enrich",
+                            },
+                            "enrich": {
+                                "Type": "Task",
+                                "Resource": "enrich-arn",
+                                "Retry": DEFAULT_RETRY,
+                                "End": True,
+                            },
+                        },
+                    },
+                    {
+                        "StartAt": "aggregate",
+                        "States": {
+                            "aggregate": {
+                                "Type": "Task",
+                                "Resource": "aggregate-arn",
+                                "Retry": DEFAULT_RETRY,
+                                "End": True,
+                            }
+                        },
+                    },
+                ],
+                "Next": "join",
+            },
+            "join": {
+                "Type": "Task",
+                "Resource": "join-arn",
+                "Retry": DEFAULT_RETRY,
+                "End": True,
+            },
+        }
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    def test_create_state_machine_definition_with_choice(
+        self, state_machine_resource_block
+    ):
+        state_machine_resource_block.pipeline_definition = PipelineDefinition(
+            file_path=__file__,
+            description="Test pipeline",
+            functions=[
+                Function(name="fetch", next_function="check"),
+                Choice(
+                    name="check",
+                    choices=[
+                        ChoiceRule(
+                            variable="$.count",
+                            operator=ChoiceOperators.EQUALS,
+                            value=0,
+                        ),
+                        ChoiceRule(
+                            variable="$.kind",
+                            operator=ChoiceOperators.NOT_EQUALS,
+                            value="full",
+                            next_function="partial",
+                        ),
+                    ],
+                    default="process",
+                ),
+                Function(name="partial", next_function="process"),
+                Function(name="process"),
+            ],
+        )
+
+        res = state_machine_resource_block.create_state_machine_definition(
+            {"fetch": "fetch-arn", "partial": "partial-arn", "process": "process-arn"}
+        )
+
+        states = json.loads(res)["States"]
+        assert states["check"] == {
+            "Type": "Choice",
+            "Choices": [
+                {"Variable": "$.count", "NumericEquals": 0, "Next": "check-succeed"},
+                {
+                    "Not": {"Variable": "$.kind", "StringEquals": "full"},
+                    "Next": "partial",
+                },
+            ],
+            "Default": "process",
+        }
+        assert states["check-succeed"] == {"Type": "Succeed"}
+        assert states["partial"]["Next"] == "process"
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    def test_choice_without_succeed_exit(self, state_machine_resource_block):
+        states = state_machine_resource_block.create_choice_states(
+            Choice(
+                name="check",
+                choices=[
+                    ChoiceRule(
+                        variable="$.keys",
+                        operator=ChoiceOperators.IS_PRESENT,
+                        next_function="process",
+                    )
+                ],
+                default="report",
+            )
+        )
+
+        assert states == {
+            "check": {
+                "Type": "Choice",
+                "Choices": [
+                    {"Variable": "$.keys", "IsPresent": True, "Next": "process"}
+                ],
+                "Default": "report",
+            }
+        }
+
+    @pytest.mark.parametrize(
+        "operator, value, expected",
+        [
+            ("greater_than", 1.5, {"NumericGreaterThan": 1.5}),
+            ("less_than_equals", "2024", {"StringLessThanEquals": "2024"}),
+            ("equals", True, {"BooleanEquals": True}),
+            ("matches", "*.csv", {"StringMatches": "*.csv"}),
+            ("is_null", False, {"IsNull": False}),
+        ],
+    )
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    def test_create_choice_condition(
+        self, state_machine_resource_block, operator, value, expected
+    ):
+        condition = state_machine_resource_block.create_choice_condition(
+            ChoiceRule(variable="$.field", operator=operator, value=value)
+        )
+        assert condition == {"Variable": "$.field", **expected}
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    def test_create_inline_map_state(self, state_machine_resource_block):
+        state = state_machine_resource_block.create_map_state(
+            Map(
+                name="process_files",
+                function=Function(name="process_file"),
+                items_path="$.files",
+                max_concurrency=10,
+                next_function="report",
+            ),
+            {"process_file": "process-file-arn"},
+        )
+
+        assert state == {
+            "Type": "Map",
+            "ItemProcessor": {
+                "ProcessorConfig": {"Mode": "INLINE"},
+                "StartAt": "process_file",
+                "States": {
+                    "process_file": {
+                        "Type": "Task",
+                        "Resource": "process-file-arn",
+                        "Retry": DEFAULT_RETRY,
+                        "End": True,
+                    }
+                },
+            },
+            "ItemsPath": "$.files",
+            "MaxConcurrency": 10,
+            "Next": "report",
+        }
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    def test_create_distributed_map_state(self, state_machine_resource_block):
+        state = state_machine_resource_block.create_map_state(
+            Map(
+                name="process_files",
+                function=Function(name="process_file"),
+                mode=MapModes.DISTRIBUTED,
+                item_reader=S3ItemReader(
+                    bucket_name="landing", key_prefix="uploads/", max_items=5000
+                ),
+                item_batcher=ItemBatcher(max_items_per_batch=100),
+                max_concurrency=500,
+            ),
+            {"process_file": "process-file-arn"},
+        )
+
+        assert state["ItemProcessor"]["ProcessorConfig"] == {
+            "Mode": "DISTRIBUTED",
+            "ExecutionType": "STANDARD",
+        }
+        assert state["ItemReader"] == {
+            "Resource": "arn:aws:states:::s3:listObjectsV2",
+            "Parameters": {"Bucket": "landing", "Prefix": "uploads/"},
+            "ReaderConfig": {"MaxItems": 5000},
+        }
+        assert state["ItemBatcher"] == {"MaxItemsPerBatch": 100}
+        assert state["MaxConcurrency"] == 500
+        assert state["End"] is True
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    def test_distributed_map_results_kept_out_of_the_output(
+        self, state_machine_resource_block
+    ):
+        state = state_machine_resource_block.create_map_state(
+            Map(
+                name="process_files",
+                function=Function(name="process_file"),
+                mode=MapModes.DISTRIBUTED,
+                item_reader=S3ItemReader(bucket_name="landing", key_prefix="uploads/"),
+                result_writer=S3ResultWriter(bucket_name="results", key_prefix="runs/"),
+                discard_results=True,
+            ),
+            {"process_file": "process-file-arn"},
+        )
+
+        assert state["ResultWriter"] == {
+            "Resource": "arn:aws:states:::s3:putObject",
+            "Parameters": {"Bucket": "results", "Prefix": "runs/"},
+        }
+        assert state["ResultPath"] is None
+        assert "ResultPath" in state
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    def test_create_manifest_item_reader(self, state_machine_resource_block):
+        reader = state_machine_resource_block.create_item_reader(
+            S3ItemReader(bucket_name="inventory", manifest_key="landing/manifest.json")
+        )
+
+        assert reader == {
+            "Resource": "arn:aws:states:::s3:getObject",
+            "Parameters": {"Bucket": "inventory", "Key": "landing/manifest.json"},
+            "ReaderConfig": {"InputType": "MANIFEST"},
+        }
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    @pulumi.runtime.test
+    def test_distributed_maps_granted_access_to_their_objects(
+        self, state_machine_resource_block
+    ):
+        state_machine_resource_block.state_machine_role = (
+            "arn:aws:iam::123456789012:role/test-pipelines-test-state-function-role"
+        )
+        state_machine_resource_block.pipeline_definition.functions = [
+            Map(
+                name="process_uploads",
+                function=Function(name="process_upload"),
+                mode=MapModes.DISTRIBUTED,
+                item_reader=S3ItemReader(bucket_name="landing", key_prefix="uploads/"),
+                next_function="process_inventory",
+            ),
+            Map(
+                name="process_inventory",
+                function=Function(name="process_object"),
+                mode=MapModes.DISTRIBUTED,
+                item_reader=S3ItemReader(
+                    bucket_name="inventory", manifest_key="landing/manifest.json"
+                ),
+                result_writer=S3ResultWriter(bucket_name="results", key_prefix="runs/"),
+            ),
+        ]
+        state_machine_resource_block.lambda_name_to_arn_map = {
+            "process_upload": "arn",
+            "process_object": "arn",
+        }
+        outputs = state_machine_resource_block.apply()
+
+        def check_policy(args):
+            role, policy = args
+            assert role == "test-pipelines-test-state-function-role"
+            assert json.loads(policy)["Statement"] == [
+                {
+                    "Effect": "Allow",
+                    "Action": ["s3:ListBucket"],
+                    "Resource": "arn:aws:s3:::landing",
+                    "Condition": {"StringLike": {"s3:prefix": "uploads/*"}},
+                },
+                {
+                    "Effect": "Allow",
+                    "Action": [
+                        "s3:PutObject",
+                        "s3:GetObject",
+                        "s3:ListMultipartUploadParts",
+                        "s3:AbortMultipartUpload",
+                    ],
+                    "Resource": "arn:aws:s3:::results/runs/*",
+                },
+                {
+                    "Effect": "Allow",
+                    "Action": ["s3:GetObject"],
+                    "Resource": "arn:aws:s3:::inventory/*",
+                },
+            ]
+
+        return pulumi.Output.all(
+            outputs.item_access_policy.role, outputs.item_access_policy.policy
+        ).apply(check_policy)
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    @pulumi.runtime.test
+    def test_standard_state_machine_created_without_logging(
+        self, state_machine_resource_block
+    ):
+        state_machine_resource_block.pipeline_definition.functions = [
+            Function(name="lambda-1")
+        ]
+        state_machine_resource_block.lambda_name_to_arn_map = {"lambda-1": "arn"}
+        outputs = state_machine_resource_block.apply()
+
+        def check_state_machine(args):
+            name, workflow_type, logging = args
+            assert name == "test-pipelines-test-test-pipeline"
+            assert workflow_type == "STANDARD"
+            assert logging is None
+
+        assert outputs.log_group is None
+        assert outputs.item_access_policy is None
+        state_machine = outputs.state_machine
+        return pulumi.Output.all(
+            state_machine.name, state_machine.type, state_machine.logging_configuration
+        ).apply(check_state_machine)
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    @pulumi.runtime.test
+    def test_express_state_machine_logs_to_cloudwatch(
+        self, state_machine_resource_block
+    ):
+        state_machine_resource_block.pipeline_definition = PipelineDefinition(
+            file_path=__file__,
+            functions=[Function(name="lambda-1")],
+            workflow_type=WorkflowTypes.EXPRESS,
+        )
+        state_machine_resource_block.lambda_name_to_arn_map = {"lambda-1": "arn"}
+        outputs = state_machine_resource_block.apply()
+
+        def check_state_machine(args):
+            workflow_type, logging, log_group_name, retention = args
+            assert workflow_type == "EXPRESS"
+            assert logging["level"] == "ALL"
+            assert logging["include_execution_data"] is True
+            assert logging["log_destination"].endswith(":*")
+            assert log_group_name == (
+                "/aws/vendedlogs/states/test-pipelines-test-test-pipeline"
+            )
+            assert retention == 30
+
+        return pulumi.Output.all(
+            outputs.state_machine.type,
+            outputs.state_machine.logging_configuration,
+            outputs.log_group.name,
+            outputs.log_group.retention_in_days,
+        ).apply(check_state_machine)
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    @pulumi.runtime.test
+    def test_standard_state_machine_with_logging(self, state_machine_resource_block):
+        state_machine_resource_block.pipeline_definition.functions = [
+            Function(name="lambda-1")
+        ]
+        state_machine_resource_block.pipeline_definition.logging = StateMachineLogging(
+            level="ERROR", include_execution_data=False, retention_days=7
+        )
+        state_machine_resource_block.lambda_name_to_arn_map = {"lambda-1": "arn"}
+        outputs = state_machine_resource_block.apply()
+
+        def check_logging(args):
+            logging, retention = args
+            assert logging["level"] == "ERROR"
+            assert logging["include_execution_data"] is False
+            assert retention == 7
+
+        return pulumi.Output.all(
+            outputs.state_machine.logging_configuration,
+            outputs.log_group.retention_in_days,
+        ).apply(check_logging)
+
     def test_fetch_step_function_arn_from_name(self, state_machine_resource_block):
         with pytest.raises(PipelineDoesNotExistException):
             state_machine_resource_block.fetch_step_function_arn_from_name(
                 "non_existent_function"
             )
+
+    def test_fetch_step_function_arn_from_name_follows_pages(
+        self, state_machine_resource_block
+    ):
+        client = state_machine_resource_block.step_functions_client
+        client.list_state_machines.side_effect = [
+            {
+                "stateMachines": [{"name": "first", "stateMachineArn": "first-arn"}],
+                "nextToken": "page-2",
+            },
+            {"stateMachines": [{"name": "second", "stateMachineArn": "second-arn"}]},
+        ]
+
+        assert (
+            state_machine_resource_block.fetch_step_function_arn_from_name("second")
+            == "second-arn"
+        )
+        assert (
+            state_machine_resource_block.fetch_step_function_arn_from_name("first")
+            == "first-arn"
+        )
+        assert client.list_state_machines.call_args_list == [
+            call(),
+            call(nextToken="page-2"),
+        ]
+
+    @pytest.mark.usefixtures("pipeline_infrastructure_block")
+    def test_step_functions_client_from_shared_clients(
+        self, pipeline_infrastructure_block
+    ):
+        local_client = MagicMock()
+        local_client.list_state_machines.return_value = {
+            "stateMachines": [{"name": "upstream", "stateMachineArn": "upstream-arn"}]
+        }
+        state_machine_resource_block = CreatePipelineStateMachine(
+            pipeline_infrastructure_block.config,
+            pipeline_infrastructure_block.aws_provider,
+            pipeline_infrastructure_block.environment,
+            "test-pipeline",
+            pipeline_infrastructure_block.pipeline_definition,
+            {},
+            "test:state-machine:role",
+        )
+        aws_clients.register("stepfunctions", local_client, "eu-west-2")
+        try:
+            assert (
+                state_machine_resource_block.fetch_step_function_arn_from_name(
+                    "upstream"
+                )
+                == "upstream-arn"
+            )
+        finally:
+            aws_clients.clear()
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    @pulumi.runtime.test
+    def test_next_pipeline_resolved_from_its_stack(self, state_machine_resource_block):
+        state_machine_resource_block.pipeline_definition = PipelineDefinition(
+            file_path=__file__,
+            functions=[
+                Function(
+                    name="lambda-1",
+                    next_function=NextFunction(
+                        name="downstream",
+                        type=NextFunctionTypes.PIPELINE,
+                        stack="org/downstream/{environment}",
+                    ),
+                )
+            ],
+        )
+        state_machine_resource_block.lambda_name_to_arn_map = {"lambda-1": "arn"}
+        outputs = state_machine_resource_block.apply()
+
+        def check_definition(definition):
+            state = json.loads(definition)["States"]["lambda-1"]
+            assert state["Parameters"] == {"StateMachineArn": "mock:state-machine:arn"}
+            state_machine_resource_block.step_functions_client.list_state_machines.assert_not_called()
+
+        return outputs.state_machine.definition.apply(check_definition)
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    @patch("infrastructure.core.state_machine.pulumi.StackReference")
+    def test_next_pipeline_stack_keeps_other_braces(
+        self, mock_stack_reference: MagicMock, state_machine_resource_block
+    ):
+        state_machine_resource_block.pipeline_definition = PipelineDefinition(
+            file_path=__file__,
+            functions=[
+                Function(
+                    name="lambda-1",
+                    next_function=NextFunction(
+                        name="downstream",
+                        type=NextFunctionTypes.PIPELINE,
+                        stack="org/{team}/downstream/{environment}",
+                    ),
+                )
+            ],
+        )
+
+        state_machine_resource_block.fetch_pipeline_arns_from_stacks()
+
+        mock_stack_reference.assert_called_once_with(
+            f"org/{{team}}/downstream/{state_machine_resource_block.environment}"
+        )
+
+    @pytest.mark.usefixtures("state_machine_resource_block")
+    def test_state_machine_arn_exported(self, state_machine_resource_block):
+        state_machine_resource_block.pipeline_definition.functions = [
+            Function(name="lambda-1")
+        ]
+        state_machine_resource_block.lambda_name_to_arn_map = {"lambda-1": "arn"}
+
+        with patch("pulumi.export") as mock_export:
+            state_machine_resource_block.exec()
+            state_machine_resource_block.export()
+
+        mock_export.assert_called_once_with(
+            "state_machine_arn", state_machine_resource_block.outputs.state_machine.arn
+        )
@@ -0,0 +1,392 @@
+import importlib.util
+import json
+
+import pulumi
+import pytest
+
+from infrastructure.core.creator import CreatePipeline
+from infrastructure.core.models.definition import (
+    S3Trigger,
+    TriggerBatching,
+    TriggerCoalescing,
+)
+from infrastructure.core.trigger_dispatcher import CreateTriggerDispatcher
+from mock import MagicMock
+
+from tests.mock import LocalClaimStore, LocalStepFunctions
+from utils.constants import DISPATCHER_SOURCE_FILE
+
+STATE_MACHINE_ARN = "arn:aws:states:eu-west-2:123:stateMachine:test"
+
+
+def load_dispatcher():
+    spec = importlib.util.spec_from_file_location("dispatcher", DISPATCHER_SOURCE_FILE)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def create_records(count: int, key_size: int = 0) -> list[dict]:
+    return [
+        {
+            "messageId": f"message-{i}",
+            "body": json.dumps(
+                {
+                    "detail-type": "Object Created",
+                    "detail": {
+                        "bucket": {"name": "landing"},
+                        "object": {"key": f"file-{i}.csv".rjust(key_size, "0")},
+                    },
+                }
+            ),
+        }
+        for i in range(count)
+    ]
+
+
+class TestDispatcher:
+    @pytest.fixture
+    def dispatcher(self):
+        return load_dispatcher()
+
+    def test_starts_executions_below_the_limit(self, dispatcher):
+        client = LocalStepFunctions(running=1)
+
+        failures = dispatcher.dispatch(client, STATE_MACHINE_ARN, create_records(3), 5)
+
+        assert failures == []
+        assert client.executions["message-0"] == (
+            "RUNNING",
+            create_records(1)[0]["body"],
+        )
+        assert len(client.executions) == 4
+
+    def test_events_over_the_limit_stay_queued(self, dispatcher):
+        client = LocalStepFunctions(running=3)
+
+        failures = dispatcher.dispatch(client, STATE_MACHINE_ARN, create_records(4), 5)
+
+        assert failures == [
+            {"itemIdentifier": "message-2"},
+            {"itemIdentifier": "message-3"},
+        ]
+        assert "message-2" not in client.executions
+
+    def test_redelivered_event_is_not_started_twice(self, dispatcher):
+        client = LocalStepFunctions()
+        records = create_records(1)
+        dispatcher.dispatch(client, STATE_MACHINE_ARN, records, 5)
+
+        assert dispatcher.dispatch(client, STATE_MACHINE_ARN, records, 5) == []
+        assert len(client.executions) == 1
+
+    def test_batch_starts_one_execution_with_the_keys(self, dispatcher):
+        client = LocalStepFunctions()
+
+        failures = dispatcher.dispatch(
+            client, STATE_MACHINE_ARN, create_records(3), batch_events=True
+        )
+
+        assert failures == []
+        assert client.list_calls == 0
+        [(status, execution_input)] = client.executions.values()
+        assert json.loads(execution_input) == {
+            "bucket": "landing",
+            "keys": ["file-0.csv", "file-1.csv", "file-2.csv"],
+        }
+
+    def test_large_batch_is_split_to_fit_the_input_limit(self, dispatcher):
+        client = LocalStepFunctions()
+
+        dispatcher.dispatch(
+            client, STATE_MACHINE_ARN, create_records(300, 1000), batch_events=True
+        )
+
+        inputs = [json.loads(value) for _, value in client.executions.values()]
+        assert [len(execution["keys"]) for execution in inputs] == [260, 40]
+
+    def test_batch_over_the_limit_stays_queued(self, dispatcher):
+        client = LocalStepFunctions(running=2)
+
+        failures = dispatcher.dispatch(
+            client, STATE_MACHINE_ARN, create_records(3), 2, batch_events=True
+        )
+
+        assert len(failures) == 3
+        assert len(client.executions) == 2
+
+    def test_duplicate_events_are_coalesced(self, dispatcher):
+        client = LocalStepFunctions()
+        clock = MagicMock(return_value=1000)
+        coalescer = dispatcher.Coalescer(
+            LocalClaimStore(), ["bucket.name", "object.key"], 60, 30, clock
+        )
+        first, second = create_records(2)
+        duplicate = {**first, "messageId": "message-duplicate"}
+
+        failures = dispatcher.dispatch(
+            client, STATE_MACHINE_ARN, [first, duplicate, second], coalescer=coalescer
+        )
+
+        assert failures == []
+        assert sorted(client.executions) == ["message-0", "message-1"]
+
+        # Once the window has passed the key starts an execution again
+        clock.return_value = 1060
+        dispatcher.dispatch(client, STATE_MACHINE_ARN, [duplicate], coalescer=coalescer)
+        assert "message-duplicate" in client.executions
+
+    def test_coalesced_batch_drops_duplicates(self, dispatcher):
+        client = LocalStepFunctions()
+        coalescer = dispatcher.Coalescer(LocalClaimStore(), ["object.key"], 60, 30)
+        records = create_records(2)
+        records.append({**records[0], "messageId": "message-duplicate"})
+
+        dispatcher.dispatch(
+            client, STATE_MACHINE_ARN, records, batch_events=True, coalescer=coalescer
+        )
+
+        [(_, execution_input)] = client.executions.values()
+        assert json.loads(execution_input)["keys"] == ["file-0.csv", "file-1.csv"]
+
+    def test_events_over_the_limit_are_not_claimed(self, dispatcher):
+        store = LocalClaimStore()
+        coalescer = dispatcher.Coalescer(store, ["object.key"], 60, 30)
+
+        failures = dispatcher.dispatch(
+            LocalStepFunctions(running=1),
+            STATE_MACHINE_ARN,
+            create_records(1),
+            1,
+            coalescer=coalescer,
+        )
+
+        assert len(failures) == 1
+        assert store.claims == {}
+
+    def test_failed_start_releases_claims(self, dispatcher):
+        client = LocalStepFunctions()
+        client.start_execution = MagicMock(side_effect=RuntimeError("throttled"))
+        store = LocalClaimStore()
+        coalescer = dispatcher.Coalescer(store, ["object.key"], 60, 30)
+
+        with pytest.raises(RuntimeError):
+            dispatcher.dispatch(
+                client, STATE_MACHINE_ARN, create_records(1), coalescer=coalescer
+            )
+        assert store.claims == {}
+
+    def test_claims_are_extended_once_the_execution_starts(self, dispatcher):
+        store = LocalClaimStore()
+        clock = MagicMock(return_value=1000)
+        coalescer = dispatcher.Coalescer(store, ["object.key"], 60, 30, clock)
+
+        dispatcher.dispatch(
+            LocalStepFunctions(),
+            STATE_MACHINE_ARN,
+            create_records(1),
+            coalescer=coalescer,
+        )
+
+        assert list(store.claims.values()) == [1060]
+
+    def test_claim_of_a_stopped_dispatcher_expires_after_the_lease(self, dispatcher):
+        store = LocalClaimStore()
+        clock = MagicMock(return_value=1000)
+        coalescer = dispatcher.Coalescer(store, ["object.key"], 60, 30, clock)
+        [record] = create_records(1)
+        # A dispatcher killed between claiming the key and starting the execution
+        coalescer.claim(record)
+
+        client = LocalStepFunctions()
+        dispatcher.dispatch(client, STATE_MACHINE_ARN, [record], coalescer=coalescer)
+        assert client.executions == {}
+
+        clock.return_value = 1030
+        dispatcher.dispatch(client, STATE_MACHINE_ARN, [record], coalescer=coalescer)
+        assert list(client.executions) == ["message-0"]
+
+    def test_dynamodb_claim_store_writes_conditionally(self, dispatcher):
+        client = MagicMock()
+        client.exceptions.ConditionalCheckFailedException = KeyError
+        store = dispatcher.DynamoDBClaimStore(client, "claims")
+
+        assert store.claim("key", 1000, 1060)
+        client.put_item.assert_called_once_with(
+            TableName="claims",
+            Item={"pk": {"S": "key"}, "expires_at": {"N": "1060"}},
+            ConditionExpression="attribute_not_exists(pk) OR expires_at <= :now",
+            ExpressionAttributeValues={":now": {"N": "1000"}},
+        )
+
+        client.put_item.side_effect = KeyError
+        assert not store.claim("key", 1001, 1061)
+
+    def test_dynamodb_claim_store_extends_claims(self, dispatcher):
+        client = MagicMock()
+        store = dispatcher.DynamoDBClaimStore(client, "claims")
+
+        store.extend("key", 1060)
+
+        client.put_item.assert_called_once_with(
+            TableName="claims",
+            Item={"pk": {"S": "key"}, "expires_at": {"N": "1060"}},
+        )
+
+    def test_counting_stops_at_the_limit(self, dispatcher):
+        client = LocalStepFunctions(running=50, page_size=2)
+
+        assert dispatcher.count_running_executions(client, STATE_MACHINE_ARN, 5) == 6
+        assert client.list_calls == 3
+
+
+class TestCreateTriggerDispatcher:
+    @pytest.mark.usefixtures(
+        "mock_pulumi", "mock_pulumi_config", "config", "pipeline_definition"
+    )
+    @pytest.fixture
+    def trigger_dispatcher_block(
+        self, mock_pulumi, mock_pulumi_config, config, pipeline_definition
+    ) -> CreateTriggerDispatcher:
+        pipeline_definition.max_concurrent_executions = 5
+        pipeline = CreatePipeline(config, pipeline_definition)
+        return CreateTriggerDispatcher(
+            pipeline.config,
+            pipeline.aws_provider,
+            pipeline.environment,
+            "test-pipeline",
+            pipeline.pipeline_definition,
+            "test:event:rule:arn",
+            "test:dispatcher:role:arn",
+            STATE_MACHINE_ARN,
+        )
+
+    @pytest.mark.usefixtures("trigger_dispatcher_block")
+    @pulumi.runtime.test
+    def test_queue_created(self, trigger_dispatcher_block: CreateTriggerDispatcher):
+        def check_queue(args):
+            name, visibility_timeout, retention = args
+            assert name == "test-pipelines-test-test-pipeline-trigger-queue"
+            assert visibility_timeout == 60
+            assert retention == 1209600
+
+        queue = trigger_dispatcher_block.outputs.queue
+        return pulumi.Output.all(
+            queue.name,
+            queue.visibility_timeout_seconds,
+            queue.message_retention_seconds,
+        ).apply(check_queue)
+
+    @pytest.mark.usefixtures("trigger_dispatcher_block")
+    @pulumi.runtime.test
+    def test_queue_accepts_events_from_the_rule(
+        self, trigger_dispatcher_block: CreateTriggerDispatcher
+    ):
+        def check_policy(policy):
+            statement = json.loads(policy)["Statement"][0]
+            assert statement["Principal"] == {"Service": "events.amazonaws.com"}
+            assert statement["Condition"] == {
+                "ArnEquals": {"aws:SourceArn": "test:event:rule:arn"}
+            }
+
+        return trigger_dispatcher_block.outputs.queue_policy.policy.apply(check_policy)
+
+    @pytest.mark.usefixtures("trigger_dispatcher_block")
+    @pulumi.runtime.test
+    def test_dispatcher_created(
+        self, trigger_dispatcher_block: CreateTriggerDispatcher
+    ):
+        def check_dispatcher(args):
+            name, role, reserved, environment = args
+            assert name == "test-pipelines-test-test-pipeline-dispatcher"
+            assert role == "test:dispatcher:role:arn"
+            assert reserved == 1
+            assert environment == {
+                "variables": {
+                    "STATE_MACHINE_ARN": STATE_MACHINE_ARN,
+                    "MAX_CONCURRENT_EXECUTIONS": "5",
+                }
+            }
+
+        dispatcher = trigger_dispatcher_block.outputs.dispatcher
+        return pulumi.Output.all(
+            dispatcher.name,
+            dispatcher.role,
+            dispatcher.reserved_concurrent_executions,
+            dispatcher.environment,
+        ).apply(check_dispatcher)
+
+    @pytest.mark.usefixtures("trigger_dispatcher_block")
+    @pulumi.runtime.test
+    def test_batched_trigger(self, trigger_dispatcher_block: CreateTriggerDispatcher):
+        trigger_dispatcher_block.pipeline_definition.max_concurrent_executions = None
+        trigger_dispatcher_block.pipeline_definition.trigger = S3Trigger(
+            name="landing",
+            bucket_name="landing",
+            key_prefix="uploads/",
+            batching=TriggerBatching(batch_size=500, window_seconds=30),
+        )
+
+        def check_batching(args):
+            batch_size, window, visibility_timeout, reserved, environment = args
+            assert batch_size == 500
+            assert window == 30
+            assert visibility_timeout == 90
+            assert reserved is None
+            assert environment == {
+                "variables": {
+                    "STATE_MACHINE_ARN": STATE_MACHINE_ARN,
+                    "BATCH_EVENTS": "true",
+                }
+            }
+
+        outputs = trigger_dispatcher_block.outputs
+        return pulumi.Output.all(
+            outputs.event_source_mapping.batch_size,
+            outputs.event_source_mapping.maximum_batching_window_in_seconds,
+            outputs.queue.visibility_timeout_seconds,
+            outputs.dispatcher.reserved_concurrent_executions,
+            outputs.dispatcher.environment,
+        ).apply(check_batching)
+
+    @pytest.mark.usefixtures("trigger_dispatcher_block")
+    @pulumi.runtime.test
+    def test_coalesced_trigger(self, trigger_dispatcher_block: CreateTriggerDispatcher):
+        trigger_dispatcher_block.pipeline_definition.max_concurrent_executions = None
+        trigger_dispatcher_block.pipeline_definition.trigger = S3Trigger(
+            name="landing",
+            bucket_name="landing",
+            key_prefix="uploads/",
+            coalescing=TriggerCoalescing(window_seconds=120),
+        )
+
+        def check_coalescing(args):
+            table_name, ttl, environment = args
+            assert table_name == "test-pipelines-test-test-pipeline-trigger-claims"
+            assert ttl == {"attribute_name": "expires_at", "enabled": True}
+            assert environment["variables"] == {
+                "STATE_MACHINE_ARN": STATE_MACHINE_ARN,
+                "COALESCING_TABLE": table_name,
+                "COALESCING_KEY": "bucket.name,object.key",
+                "COALESCING_WINDOW": "120",
+                "COALESCING_LEASE": "30",
+            }
+
+        outputs = trigger_dispatcher_block.outputs
+        return pulumi.Output.all(
+            outputs.claims_table.name,
+            outputs.claims_table.ttl,
+            outputs.dispatcher.environment,
+        ).apply(check_coalescing)
+
+    @pytest.mark.usefixtures("trigger_dispatcher_block")
+    @pulumi.runtime.test
+    def test_event_source_mapping_reports_partial_failures(
+        self, trigger_dispatcher_block: CreateTriggerDispatcher
+    ):
+        def check_event_source_mapping(response_types):
+            assert response_types == ["ReportBatchItemFailures"]
+
+        return (
+            trigger_dispatcher_block.outputs.event_source_mapping.function_response_types
+        ).apply(check_event_source_mapping)
@@ -0,0 +1,125 @@
+import os
+import zipfile
+
+from infrastructure.core.zip_package import (
+    ZipPackageBuilder,
+    hash_package_inputs,
+    write_zip,
+)
+
+
+class RecordingPipRunner:
+    def __init__(self):
+        self.commands = []
+
+    def __call__(self, arguments: list[str]):
+        self.commands.append(arguments)
+        # Install a fake package into the target folder
+        target = arguments[arguments.index("--target") + 1]
+        os.makedirs(os.path.join(target, "package"), exist_ok=True)
+        with open(os.path.join(target, "package", "__init__.py"), "w") as file:
+            file.write("VERSION = 1")
+
+
+def create_source(tmp_path) -> tuple[str, str]:
+    handler = tmp_path / "lambda.py"
+    handler.write_text("def handler(event, context): pass")
+    requirements = tmp_path / "requirements.txt"
+    requirements.write_text("package")
+    return str(handler), str(requirements)
+
+
+class TestWriteZip:
+    def test_archive_is_reproducible(self, tmp_path):
+        handler, _ = create_source(tmp_path)
+        first, second = str(tmp_path / "first.zip"), str(tmp_path / "second.zip")
+
+        write_zip([(handler, "lambda.py")], first)
+        os.utime(handler, (0, 0))
+        write_zip([(handler, "lambda.py")], second)
+
+        with open(first, "rb") as file_1, open(second, "rb") as file_2:
+            assert file_1.read() == file_2.read()
+
+    def test_entries_are_sorted(self, tmp_path):
+        handler, requirements = create_source(tmp_path)
+        destination = str(tmp_path / "package.zip")
+
+        write_zip([(requirements, "b.txt"), (handler, "a/lambda.py")], destination)
+
+        with zipfile.ZipFile(destination) as archive:
+            assert archive.namelist() == ["a/lambda.py", "b.txt"]
+
+
+class TestZipPackageBuilder:
+    def test_build_function_package(self, tmp_path):
+        handler, requirements = create_source(tmp_path)
+        runner = RecordingPipRunner()
+        builder = ZipPackageBuilder(str(tmp_path / "artifacts"), runner)
+
+        package = builder.build(
+            "function", "abc", [(handler, "lambda.py")], [requirements], "python3.11"
+        )
+
+        assert package.path == str(tmp_path / "artifacts" / "function-abc.zip")
+        with zipfile.ZipFile(package.path) as archive:
+            assert archive.namelist() == ["lambda.py", "package/__init__.py"]
+        assert runner.commands[0][:2] == ["install", "--requirement"]
+        assert runner.commands[0][5:11] == [
+            "--platform",
+            "manylinux2014_x86_64",
+            "--implementation",
+            "cp",
+            "--python-version",
+            "3.11",
+        ]
+
+    def test_build_layer_package(self, tmp_path):
+        _, requirements = create_source(tmp_path)
+        builder = ZipPackageBuilder(str(tmp_path / "artifacts"), RecordingPipRunner())
+
+        package = builder.build(
+            "function-dependencies", "abc", [], [requirements], prefix="python/"
+        )
+
+        with zipfile.ZipFile(package.path) as archive:
+            assert archive.namelist() == ["python/package/__init__.py"]
+
+    def test_build_for_arm64(self, tmp_path):
+        _, requirements = create_source(tmp_path)
+        runner = RecordingPipRunner()
+        builder = ZipPackageBuilder(str(tmp_path / "artifacts"), runner)
+
+        builder.build("function", "abc", [], [requirements], architecture="arm64")
+
+        assert "manylinux2014_aarch64" in runner.commands[0]
+
+    def test_existing_package_is_reused(self, tmp_path):
+        handler, requirements = create_source(tmp_path)
+        runner = RecordingPipRunner()
+        builder = ZipPackageBuilder(str(tmp_path / "artifacts"), runner)
+
+        first = builder.build(
+            "function", "abc", [(handler, "lambda.py")], [requirements]
+        )
+        second = builder.build(
+            "function", "abc", [(handler, "lambda.py")], [requirements]
+        )
+
+        assert first == second
+        assert len(runner.commands) == 1
+
+    def test_source_code_hash(self, tmp_path):
+        handler, _ = create_source(tmp_path)
+        builder = ZipPackageBuilder(str(tmp_path / "artifacts"), RecordingPipRunner())
+
+        package = builder.build("function", "abc", [(handler, "lambda.py")])
+
+        assert len(package.source_code_hash) == 44
+        assert package.source_code_hash.endswith("=")
+
+
+def test_hash_package_inputs():
+    assert hash_package_inputs("python3.11", "abc") != hash_package_inputs(
+        "python3.12", "abc"
+    )
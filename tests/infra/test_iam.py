@@ -76,6 +76,21 @@ class TestCreateIamResource:
             clouevent_state_function_role.name, clouevent_state_function_role.tags
         ).apply(check_cloudevent_function_role)
 
+    @pytest.mark.usefixtures("iam_resource_block", "config")
+    @pulumi.runtime.test
+    def test_iam_trigger_dispatcher_role_created(
+        self, iam_resource_block: CreateIamResource, config
+    ):
+        def check_trigger_dispatcher_role(args):
+            name, tags = args
+            assert name == "test-pipelines-test-trigger-dispatcher-role"
+            assert tags == config.tags
+
+        trigger_dispatcher_role = iam_resource_block.outputs.trigger_dispatcher_role
+        return pulumi.Output.all(
+            trigger_dispatcher_role.name, trigger_dispatcher_role.tags
+        ).apply(check_trigger_dispatcher_role)
+
     @pytest.mark.usefixtures("iam_resource_block")
     @pulumi.runtime.test
     def test_iam_additional_lambda_role_policy_created(
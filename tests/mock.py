@@ -1,6 +1,153 @@
+import base64
+import json
+import math
+
+from botocore.exceptions import ClientError
 from pydantic import BaseModel  # pylint: disable=no-name-in-module
 
 
 class MockedEcrAuthentication(BaseModel):
     password: str
     user_name: str
+
+
+class FakeEcrClient:
+    """In-memory stand-in for the ECR image APIs used by dorc"""
+
+    def __init__(
+        self,
+        images: dict[tuple[str, str], str] | None = None,
+        missing_repositories: list[str] | None = None,
+    ):
+        # (repository name, tag) -> digest
+        self.images = images or {}
+        self.missing_repositories = missing_repositories or []
+        self.calls = []
+
+    def batch_get_image(self, registryId: str, repositoryName: str, imageIds: list):
+        self.calls.append((registryId, repositoryName, imageIds))
+        if repositoryName in self.missing_repositories:
+            raise ClientError(
+                {"Error": {"Code": "RepositoryNotFoundException"}}, "BatchGetImage"
+            )
+        images, failures = [], []
+        for image_id in imageIds:
+            digest = self.images.get((repositoryName, image_id["imageTag"]))
+            if digest is None:
+                failures.append({"imageId": image_id, "failureCode": "ImageNotFound"})
+            else:
+                images.append(
+                    {
+                        "imageId": {
+                            "imageTag": image_id["imageTag"],
+                            "imageDigest": digest,
+                        }
+                    }
+                )
+        return {"images": images, "failures": failures}
+
+
+class LocalLambda:
+    """
+    In-memory stand-in for the Lambda APIs used by the power tuner. Each function
+    is a callable returning its run time in ms for an event and memory size.
+    """
+
+    def __init__(self, functions: dict, memory_size: int = 128):
+        self.functions = functions
+        self.memory_sizes = {name: memory_size for name in functions}
+        self.invocations = []
+        self.failing = set()
+
+    def get_function_configuration(self, FunctionName: str):
+        return {
+            "FunctionName": FunctionName,
+            "MemorySize": self.memory_sizes[FunctionName],
+            "Architectures": ["x86_64"],
+            "LastUpdateStatus": "Successful",
+        }
+
+    def update_function_configuration(self, FunctionName: str, MemorySize: int):
+        self.memory_sizes[FunctionName] = MemorySize
+        return {**self.get_function_configuration(FunctionName), "State": "Active"}
+
+    def invoke(self, FunctionName: str, InvocationType: str, LogType: str, Payload):
+        event = json.loads(Payload)
+        memory_size = self.memory_sizes[FunctionName]
+        self.invocations.append((FunctionName, memory_size, event))
+        if FunctionName in self.failing:
+            return {"StatusCode": 200, "FunctionError": "Unhandled"}
+        duration = self.functions[FunctionName](event, memory_size)
+        log = (
+            f"REPORT RequestId: 1 Duration: {duration:.2f} ms "
+            f"Billed Duration: {math.ceil(duration)} ms "
+            f"Memory Size: {memory_size} MB"
+        )
+        return {
+            "StatusCode": 200,
+            "LogResult": base64.b64encode(log.encode()).decode(),
+        }
+
+
+class ExecutionAlreadyExists(Exception):
+    pass
+
+
+class LocalStepFunctions:
+    """In-memory stand-in for the Step Functions execution APIs"""
+
+    exceptions = type(
+        "Exceptions", (), {"ExecutionAlreadyExists": ExecutionAlreadyExists}
+    )
+
+    def __init__(self, running: int = 0, page_size: int = 100):
+        # execution name -> (status, input)
+        self.executions = {f"running-{i}": ("RUNNING", "{}") for i in range(running)}
+        self.page_size = page_size
+        self.list_calls = 0
+
+    def list_executions(
+        self,
+        stateMachineArn: str,
+        statusFilter: str,
+        maxResults: int = 100,
+        nextToken: str | None = None,
+    ):
+        self.list_calls += 1
+        names = [
+            name
+            for name, (status, _) in self.executions.items()
+            if status == statusFilter
+        ]
+        start = int(nextToken or 0)
+        end = start + min(maxResults, self.page_size)
+        response = {"executions": [{"name": name} for name in names[start:end]]}
+        if end < len(names):
+            response["nextToken"] = str(end)
+        return response
+
+    def start_execution(self, stateMachineArn: str, name: str, input: str):
+        if name in self.executions:
+            raise ExecutionAlreadyExists(name)
+        self.executions[name] = ("RUNNING", input)
+        return {"executionArn": f"{stateMachineArn}:{name}"}
+
+
+class LocalClaimStore:
+    """In-memory stand-in for the dispatcher's conditional-write claim store"""
+
+    def __init__(self):
+        # key -> expiry timestamp
+        self.claims = {}
+
+    def claim(self, key: str, now: int, expires_at: int) -> bool:
+        if self.claims.get(key, now) > now:
+            return False
+        self.claims[key] = expires_at
+        return True
+
+    def extend(self, key: str, expires_at: int) -> None:
+        self.claims[key] = expires_at
+
+    def release(self, key: str) -> None:
+        self.claims.pop(key, None)
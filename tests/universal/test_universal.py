@@ -20,6 +20,30 @@ class TestCreateUniversal:
         universal_block = CreateUniversal(universal_config)
         assert universal_block.repo_list == ["layer-test-lambda1", "layer-test-lambda2"]
 
+    @pytest.mark.usefixtures("mock_pulumi", "mock_pulumi_config", "universal_config")
+    def test_repo_list_includes_base_image_repo(
+        self, mock_pulumi, mock_pulumi_config, universal_config
+    ):
+        universal_config.shared_base_image = True
+        universal_block = CreateUniversal(universal_config)
+        assert universal_block.repo_list == [
+            "layer-test-lambda1",
+            "layer-test-lambda2",
+            "base-image",
+        ]
+
+    @pytest.mark.usefixtures("mock_pulumi", "mock_pulumi_config", "universal_config")
+    def test_repo_list_includes_build_cache_repo(
+        self, mock_pulumi, mock_pulumi_config, universal_config
+    ):
+        universal_config.registry_build_cache = True
+        universal_block = CreateUniversal(universal_config)
+        assert universal_block.repo_list == [
+            "layer-test-lambda1",
+            "layer-test-lambda2",
+            "build-cache",
+        ]
+
     @pytest.mark.usefixtures("mock_pulumi", "mock_pulumi_config", "universal_config")
     @patch("infrastructure.universal.creator.glob")
     def test_retrieve_repo_list_from_folders_with_custom_source_path(
@@ -0,0 +1,40 @@
+from mock import MagicMock
+
+from utils.aws_clients import AwsClients, create_client
+
+
+class TestAwsClients:
+    def test_clients_are_created_lazily_and_shared(self):
+        factory = MagicMock(side_effect=lambda service, region: (service, region))
+        clients = AwsClients(factory)
+        factory.assert_not_called()
+
+        assert clients.get("ecr", "eu-west-2") == ("ecr", "eu-west-2")
+        assert clients.get("ecr", "eu-west-2") == ("ecr", "eu-west-2")
+        assert clients.get("ecr", "us-east-1") == ("ecr", "us-east-1")
+        assert factory.call_count == 2
+
+    def test_registered_client_is_used(self):
+        factory = MagicMock()
+        clients = AwsClients(factory)
+        local_client = object()
+        clients.register("stepfunctions", local_client, "eu-west-2")
+
+        assert clients.get("stepfunctions", "eu-west-2") is local_client
+        factory.assert_not_called()
+
+    def test_clear(self):
+        factory = MagicMock(side_effect=lambda service, region: object())
+        clients = AwsClients(factory)
+        client = clients.get("lambda", "eu-west-2")
+        clients.clear()
+
+        assert clients.get("lambda", "eu-west-2") is not client
+
+    def test_create_client_configuration(self):
+        client = create_client("stepfunctions", "eu-west-2")
+
+        assert client.meta.region_name == "eu-west-2"
+        assert client.meta.config.retries["mode"] == "adaptive"
+        assert client.meta.config.retries["total_max_attempts"] == 11
+        assert client.meta.config.max_pool_connections == 16
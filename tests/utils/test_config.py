@@ -1,4 +1,5 @@
 import pytest
+from pydantic import ValidationError
 from pytest import MonkeyPatch
 
 from utils.exceptions import CannotFindEnvironmentVariableException
@@ -16,3 +17,20 @@ class TestUniversalConfig:
                 project="test-pipelines",
                 tags={"tag": "test"},
             )
+
+    def test_registry_build_cache_needs_image_builder(self, monkeypatch: MonkeyPatch):
+        monkeypatch.setenv("CONFIG_REPO_PATH", "./tests/mock_config_repo_src")
+        with pytest.raises(ValidationError, match="image_builder"):
+            UniversalConfig(
+                region="eu-west-2",
+                project="test-pipelines",
+                registry_build_cache=True,
+            )
+
+        config = UniversalConfig(
+            region="eu-west-2",
+            project="test-pipelines",
+            registry_build_cache=True,
+            image_builder="dorc",
+        )
+        assert config.image_builder == "dorc"
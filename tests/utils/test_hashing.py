@@ -0,0 +1,100 @@
+import json
+import os
+
+from mock import patch
+
+from utils.hashing import HashManifest, is_ignored, load_ignore_patterns
+
+
+def write_file(path, content: str):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as file:
+        file.write(content)
+
+
+class TestIgnorePatterns:
+    def test_load_ignore_patterns(self, tmp_path):
+        write_file(
+            tmp_path / ".dockerignore",
+            "# comment\n\n./tests/data/\n*.csv\n!keep.csv\n",
+        )
+        assert load_ignore_patterns(str(tmp_path / ".dockerignore")) == [
+            "tests/data",
+            "*.csv",
+        ]
+
+    def test_load_ignore_patterns_missing_file(self, tmp_path):
+        assert load_ignore_patterns(str(tmp_path / ".dockerignore")) == []
+
+    def test_is_ignored(self):
+        patterns = ["__pycache__", "*.pyc", "tests/data"]
+        assert is_ignored("src/layer/__pycache__/lambda.cpython-311.pyc", patterns)
+        assert is_ignored("src/layer/lambda.pyc", patterns)
+        assert is_ignored("tests/data/large.parquet", patterns)
+        assert not is_ignored("src/tests/data/large.parquet", patterns)
+        assert not is_ignored("src/layer/lambda.py", patterns)
+
+
+class TestHashManifest:
+    def test_hash_tree_ignores_junk_files(self, tmp_path):
+        function_path = tmp_path / "src" / "function"
+        write_file(function_path / "lambda.py", "print('hello')")
+        manifest = HashManifest(str(tmp_path / ".dorc" / "manifest.json"))
+        digest = manifest.hash_tree(str(tmp_path), [str(function_path)])
+
+        write_file(function_path / "__pycache__" / "lambda.pyc", "junk")
+        write_file(function_path / ".DS_Store", "junk")
+
+        assert manifest.hash_tree(str(tmp_path), [str(function_path)]) == digest
+
+    def test_hash_tree_includes_extra_files(self, tmp_path):
+        function_path = tmp_path / "src" / "function"
+        dockerfile = tmp_path / "src" / "Dockerfile"
+        write_file(function_path / "lambda.py", "print('hello')")
+        write_file(dockerfile, "FROM python")
+        manifest = HashManifest(str(tmp_path / "manifest.json"))
+
+        digest = manifest.hash_tree(
+            str(tmp_path), [str(function_path)], [str(dockerfile)]
+        )
+        write_file(dockerfile, "FROM python:3.11")
+
+        assert (
+            manifest.hash_tree(str(tmp_path), [str(function_path)], [str(dockerfile)])
+            != digest
+        )
+
+    def test_hash_tree_skips_missing_extra_files(self, tmp_path):
+        function_path = tmp_path / "src" / "function"
+        write_file(function_path / "lambda.py", "print('hello')")
+        manifest = HashManifest(str(tmp_path / "manifest.json"))
+
+        assert manifest.hash_tree(
+            str(tmp_path), [str(function_path)], [str(tmp_path / "requirements.txt")]
+        ) == manifest.hash_tree(str(tmp_path), [str(function_path)])
+
+    def test_hash_tree_persists_manifest(self, tmp_path):
+        function_path = tmp_path / "src" / "function"
+        write_file(function_path / "lambda.py", "print('hello')")
+        manifest_path = tmp_path / ".dorc" / "manifest.json"
+
+        HashManifest(str(manifest_path)).hash_tree(str(tmp_path), [str(function_path)])
+
+        with open(manifest_path) as file:
+            entries = json.load(file)
+        entry = entries[os.path.abspath(function_path / "lambda.py")]
+        assert entry["size"] == len("print('hello')")
+        assert set(entry) == {"mtime_ns", "size", "digest"}
+
+    def test_hash_tree_only_rehashes_changed_files(self, tmp_path):
+        function_path = tmp_path / "src" / "function"
+        write_file(function_path / "lambda.py", "print('hello')")
+        write_file(function_path / "utils.py", "print('utils')")
+        manifest_path = str(tmp_path / "manifest.json")
+        HashManifest(manifest_path).hash_tree(str(tmp_path), [str(function_path)])
+
+        write_file(function_path / "utils.py", "print('changed')")
+        with patch("utils.hashing.file_digest", return_value="abc") as mock_digest:
+            HashManifest(manifest_path).hash_tree(str(tmp_path), [str(function_path)])
+
+        mock_digest.assert_called_once_with(str(function_path / "utils.py"))
@@ -0,0 +1,51 @@
+import threading
+
+from typing import Callable, Optional
+
+import boto3
+
+from botocore.config import Config as BotocoreConfig
+
+from utils.constants import AWS_CLIENT_MAX_ATTEMPTS, AWS_CLIENT_MAX_POOL_CONNECTIONS
+
+
+def create_client(service_name: str, region: Optional[str]):
+    return boto3.client(
+        service_name,
+        region_name=region,
+        config=BotocoreConfig(
+            retries={"mode": "adaptive", "max_attempts": AWS_CLIENT_MAX_ATTEMPTS},
+            # Enough connections for the concurrent ECR lookups of a pipeline
+            max_pool_connections=AWS_CLIENT_MAX_POOL_CONNECTIONS,
+        ),
+    )
+
+
+class AwsClients:
+    """
+    Creates boto3 clients on first use and shares one per service and region for
+    the program run. Tests can register local stand-ins in place of real clients.
+    """
+
+    def __init__(self, factory: Callable = create_client) -> None:
+        self.factory = factory
+        self._lock = threading.Lock()
+        self._clients: dict[tuple[str, Optional[str]], object] = {}
+
+    def get(self, service_name: str, region: Optional[str] = None):
+        with self._lock:
+            key = (service_name, region)
+            if key not in self._clients:
+                self._clients[key] = self.factory(service_name, region)
+            return self._clients[key]
+
+    def register(self, service_name: str, client, region: Optional[str] = None):
+        with self._lock:
+            self._clients[(service_name, region)] = client
+
+    def clear(self) -> None:
+        with self._lock:
+            self._clients.clear()
+
+
+aws_clients = AwsClients()
@@ -1,9 +1,10 @@
 import os
 from typing import Optional
 
-from pydantic import BaseModel  # pylint: disable=no-name-in-module
+from pydantic import BaseModel, root_validator  # pylint: disable=no-name-in-module
 from pulumi import Output
 
+from utils.constants import ARTIFACT_FOLDER, BUILD_CONTEXT_FOLDER, HASH_MANIFEST_FILE
 from utils.exceptions import (
     CannotFindEnvironmentVariableException,
     InvalidConfigDefinitionException,
@@ -30,6 +31,23 @@ class UniversalConfig(BaseModel):
     source_code_folder: Optional[str] = "src"
     config_repo_path: Optional[str] = None
     rapid_layer_config: Optional[list[LayerConfig]] = None
+    image_build_workers: Optional[int] = 4
+    shared_build_files: Optional[list[str]] = []
+    promote_images: Optional[bool] = False
+    shared_base_image: Optional[bool] = False
+    registry_build_cache: Optional[bool] = False
+    image_builder: Optional[str] = None
+    multi_arch_images: Optional[bool] = False
+
+    @root_validator(skip_on_failure=True)
+    def check_build_cache_has_builder(cls, values):  # pylint: disable=no-self-argument
+        # The default docker driver cannot export a registry cache
+        if values["registry_build_cache"] and not values["image_builder"]:
+            raise ValueError(
+                "A registry build cache needs an image_builder using the "
+                "docker-container driver"
+            )
+        return values
 
     def __init__(self, **kwargs):
         super().__init__(**kwargs)
@@ -58,6 +76,18 @@ class UniversalConfig(BaseModel):
     def source_code_path(self) -> str:
         return os.path.join(self.config_repo_path, self.source_code_folder)
 
+    @property
+    def hash_manifest_path(self) -> str:
+        return os.path.join(self.config_repo_path, HASH_MANIFEST_FILE)
+
+    @property
+    def build_context_path(self) -> str:
+        return os.path.join(self.config_repo_path, BUILD_CONTEXT_FOLDER)
+
+    @property
+    def artifact_path(self) -> str:
+        return os.path.join(self.config_repo_path, ARTIFACT_FOLDER)
+
 
 class Config(BaseModel):
     universal: UniversalConfig
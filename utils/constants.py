@@ -1,7 +1,118 @@
+import os
+
 # Common Pulumi export keys
 STATE_FUNCTION_ROLE_ARN = "state_function_role_arn"
 LAMBDA_ROLE_ARN = "lambda_role_arn"
 CLOUDEVENT_STATE_MACHINE_TRIGGER_ROLE_ARN = "cloudevent_state_machine_trigger_role_arn"
+TRIGGER_DISPATCHER_ROLE_ARN = "trigger_dispatcher_role_arn"
+STATE_MACHINE_ARN = "state_machine_arn"
 
 # Lambda handler filename
 LAMBDA_HANDLER_FILE = "lambda.py"
+
+# Content hashing of function source code
+HASH_MANIFEST_FILE = ".dorc/hash-manifest.json"
+BUILD_CONTEXT_FOLDER = ".dorc/contexts"
+ARTIFACT_FOLDER = ".dorc/artifacts"
+
+# Lambda compute defaults, the timeout is raised from the AWS default of 3 seconds
+DEFAULT_LAMBDA_MEMORY_SIZE = 128
+DEFAULT_LAMBDA_EPHEMERAL_STORAGE = 512
+DEFAULT_LAMBDA_TIMEOUT = 600
+
+# Lambda service and throttling errors retried by default, with exponential
+# backoff and full jitter so throttled executions do not retry in lockstep
+DEFAULT_RETRY_ERRORS = [
+    "Lambda.ServiceException",
+    "Lambda.AWSLambdaException",
+    "Lambda.SdkClientException",
+    "Lambda.TooManyRequestsException",
+]
+DEFAULT_RETRY_INTERVAL_SECONDS = 2
+DEFAULT_RETRY_MAX_ATTEMPTS = 6
+DEFAULT_RETRY_BACKOFF_RATE = 2.0
+DEFAULT_RETRY_MAX_DELAY_SECONDS = 60
+
+# Memory power tuning, prices are the AWS list prices in USD
+DEFAULT_POWER_TUNING_MEMORY_SIZES = [128, 256, 512, 1024, 1536, 2048, 3008]
+LAMBDA_PRICE_PER_GB_SECOND = {"x86_64": 0.0000166667, "arm64": 0.0000133334}
+LAMBDA_PRICE_PER_REQUEST = 0.0000002
+SAMPLE_EVENT_FILE = "sample_event.json"
+
+# Alias published for functions with provisioned concurrency
+LAMBDA_ALIAS_NAME = "live"
+
+# Zip packaged functions
+DEFAULT_LAMBDA_RUNTIME = "python3.11"
+LAMBDA_HANDLER = "lambda.handler"
+
+# Shared per-pipeline dependency base images
+BASE_IMAGE_REPOSITORY_NAME = "base-image"
+BASE_IMAGE_DOCKERFILE = "Dockerfile.base"
+DEFAULT_BASE_IMAGE_DOCKERFILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "templates",
+    "images",
+    "base.Dockerfile",
+)
+DEFAULT_BASE_IMAGE_DOCKERFILE_NAME = "<dorc>/base.Dockerfile"
+
+# Queue and dispatcher admitting trigger events up to the execution limit. Events
+# over the limit are retried after the visibility timeout for up to 14 days.
+DISPATCHER_SOURCE_FILE = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    "templates",
+    "dispatcher",
+    "lambda.py",
+)
+DISPATCHER_TIMEOUT = 30
+TRIGGER_QUEUE_VISIBILITY_TIMEOUT = 60
+TRIGGER_QUEUE_RETENTION_PERIOD = 1209600
+
+# Retention periods accepted by CloudWatch Logs
+LOG_RETENTION_DAYS = {
+    1,
+    3,
+    5,
+    7,
+    14,
+    30,
+    60,
+    90,
+    120,
+    150,
+    180,
+    365,
+    400,
+    545,
+    731,
+    1096,
+    1827,
+    2192,
+    2557,
+    2922,
+    3288,
+    3653,
+}
+
+# Docker platforms of the Lambda architectures
+IMAGE_PLATFORMS = {"x86_64": "linux/amd64", "arm64": "linux/arm64"}
+
+# Registry-backed BuildKit layer cache
+BUILD_CACHE_REPOSITORY_NAME = "build-cache"
+
+DOCKER_IGNORE_FILE = ".dockerignore"
+DEFAULT_HASH_IGNORE_PATTERNS = [
+    ".dorc",
+    ".git",
+    "__pycache__",
+    "*.pyc",
+    "*.pyo",
+    ".DS_Store",
+    ".pytest_cache",
+    ".mypy_cache",
+]
+
+# Shared boto3 clients
+AWS_CLIENT_MAX_ATTEMPTS = 10
+AWS_CLIENT_MAX_POOL_CONNECTIONS = 16
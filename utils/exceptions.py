@@ -16,3 +16,15 @@ class PipelineDoesNotExistException(Exception):
 
 class CannotFindEnvironmentVariableException(Exception):
     pass
+
+
+class ImageBuildException(Exception):
+    pass
+
+
+class PackageBuildException(Exception):
+    pass
+
+
+class PowerTuningException(Exception):
+    pass
@@ -1,3 +1,7 @@
+import glob
+import os
+import shutil
+
 from utils.constants import LAMBDA_HANDLER_FILE
 
 
@@ -12,3 +16,27 @@ def path_to_name(path: str, seperator: str = "-") -> str:
 
 def extract_lambda_name_from_filepath(file_path: str) -> str:
     return path_to_name(file_path.replace(f"/{LAMBDA_HANDLER_FILE}", ""))
+
+
+def find_lambda_paths(pipeline_file_path: str, source_code_folder: str) -> list[str]:
+    # Function handlers relative to the source code folder, e.g.
+    # layer/pipeline/function/lambda.py
+    initial = pipeline_file_path.strip("__main__.py")
+    path_to_search = os.path.join(initial, "*", LAMBDA_HANDLER_FILE)
+    return sorted(
+        path.split(f"/{source_code_folder}/")[-1] for path in glob.glob(path_to_search)
+    )
+
+
+def create_build_context(root: str, files: list[str], destination: str) -> str:
+    # Mirror only the given files, keeping their layout relative to root. Files are
+    # hard linked where possible so regenerating the context is cheap.
+    shutil.rmtree(destination, ignore_errors=True)
+    for path in files:
+        target = os.path.join(destination, os.path.relpath(path, root))
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.link(path, target)
+        except OSError:
+            shutil.copy2(path, target)
+    return destination
@@ -0,0 +1,163 @@
+import hashlib
+import json
+import os
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from fnmatch import fnmatch
+from functools import lru_cache
+
+from utils.constants import DEFAULT_HASH_IGNORE_PATTERNS
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def load_ignore_patterns(ignore_file_path: str) -> list[str]:
+    if not os.path.isfile(ignore_file_path):
+        return []
+    with open(ignore_file_path) as file:
+        lines = [line.strip() for line in file.readlines()]
+    # Negated patterns are not supported, only plain exclusions are honoured
+    return [
+        line.removeprefix("./").strip("/")
+        for line in lines
+        if line and not line.startswith("#") and not line.startswith("!")
+    ]
+
+
+def is_ignored(relative_path: str, ignore_patterns: list[str]) -> bool:
+    parts = relative_path.replace(os.sep, "/").split("/")
+    for pattern in ignore_patterns:
+        if "/" in pattern:
+            # Anchored patterns match the path, or any parent directory, from the root
+            if any(
+                fnmatch("/".join(parts[: index + 1]), pattern)
+                for index in range(len(parts))
+            ):
+                return True
+        elif any(fnmatch(part, pattern) for part in parts):
+            return True
+    return False
+
+
+def file_digest(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class HashManifest:
+    def __init__(self, manifest_path: str, max_workers: int | None = None) -> None:
+        self.manifest_path = manifest_path
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._entries = self.load()
+
+    def load(self) -> dict:
+        try:
+            with open(self.manifest_path) as file:
+                return json.load(file)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def save(self) -> None:
+        with self._lock:
+            entries = dict(self._entries)
+        os.makedirs(os.path.dirname(os.path.abspath(self.manifest_path)), exist_ok=True)
+        temporary_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as file:
+            json.dump(entries, file, sort_keys=True)
+        os.replace(temporary_path, self.manifest_path)
+
+    def hash_file(self, path: str) -> str:
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        entry = self._entries.get(key)
+        if (
+            entry is not None
+            and entry["mtime_ns"] == stat.st_mtime_ns
+            and entry["size"] == stat.st_size
+        ):
+            return entry["digest"]
+
+        digest = file_digest(path)
+        with self._lock:
+            self._entries[key] = {
+                "mtime_ns": stat.st_mtime_ns,
+                "size": stat.st_size,
+                "digest": digest,
+            }
+        return digest
+
+    def hash_files(self, paths: list[str]) -> dict[str, str]:
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return dict(zip(paths, executor.map(self.hash_file, paths)))
+
+    def collect_files(
+        self,
+        root: str,
+        directories: list[str],
+        files: list[str] | None = None,
+        ignore_patterns: list[str] | None = None,
+    ) -> list[str]:
+        ignore_patterns = [*DEFAULT_HASH_IGNORE_PATTERNS, *(ignore_patterns or [])]
+        collected = [path for path in files or [] if os.path.isfile(path)]
+        for directory in directories:
+            for current, folders, filenames in os.walk(directory):
+                # Prune ignored folders so we never walk into them
+                folders[:] = [
+                    folder
+                    for folder in folders
+                    if not is_ignored(
+                        os.path.relpath(os.path.join(current, folder), root),
+                        ignore_patterns,
+                    )
+                ]
+                collected.extend(
+                    os.path.join(current, filename)
+                    for filename in filenames
+                    if not is_ignored(
+                        os.path.relpath(os.path.join(current, filename), root),
+                        ignore_patterns,
+                    )
+                )
+        return sorted(set(collected), key=lambda path: os.path.relpath(path, root))
+
+    def digest_files(self, root: str, paths: list[str]) -> str:
+        """
+        Digest of the given files keyed by their path relative to root. Only files
+        whose mtime or size changed since the last run are re-read, the rest are
+        served from the on-disk manifest.
+        """
+        return self.digest_entries(
+            [(path, os.path.relpath(path, root).replace(os.sep, "/")) for path in paths]
+        )
+
+    def digest_entries(self, entries: list[tuple[str, str]]) -> str:
+        # Digest of files keyed by the given names, so it only depends on where
+        # the files are on disk through the names chosen for them
+        digests = self.hash_files([path for path, _ in entries])
+        self.save()
+
+        tree_digest = hashlib.sha256()
+        for path, name in sorted(entries, key=lambda entry: entry[1]):
+            tree_digest.update(f"{name}\0{digests[path]}\n".encode())
+        return tree_digest.hexdigest()
+
+    def hash_tree(
+        self,
+        root: str,
+        directories: list[str],
+        files: list[str] | None = None,
+        ignore_patterns: list[str] | None = None,
+    ) -> str:
+        paths = self.collect_files(root, directories, files, ignore_patterns)
+        return self.digest_files(root, paths)
+
+
+@lru_cache(maxsize=None)
+def get_hash_manifest(manifest_path: str) -> HashManifest:
+    # One manifest per path for the whole program run so every function shares it
+    return HashManifest(manifest_path)